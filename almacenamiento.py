@@ -0,0 +1,512 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: Almacenamiento de los resultados de inferencia. Los sumideros agregan cada detección al final de un -----------------
+------------- archivo (CSV, JSONL, SQLite o Parquet) en tiempo constante y sincronizan con el disco periódicamente, de modo que -------------
+------------- un cierre inesperado no pierde lo ya procesado. El Excel se genera una sola vez al final desde el almacén en memoria ----------
+------------- (AlmacenDetecciones); el sumidero es la copia en disco de la que se recupera con exportar_excel_desde_sumidero. ---------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+'''
+
+import csv
+import glob
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+# Columnas del reporte, en el orden del Excel
+COLUMNAS_RESULTADOS = ["Minuto", "Segundo", "Huecos", "Grietas", "Piel de cocodrilo"]
+
+
+class SumideroResultados:
+    '''
+    Clase base de los sumideros de resultados. Cada fila se agrega al final del archivo y
+    el contenido se sincroniza con el disco (flush + fsync) cada `intervalo_filas` filas o
+    cada `intervalo_segundos` segundos, lo que ocurra primero.
+
+    Atributos:
+        ruta (str): Ruta del archivo (o carpeta) del sumidero.
+        columnas (list): Columnas de cada fila.
+        intervalo_filas (int): Filas entre sincronizaciones.
+        intervalo_segundos (float): Segundos máximos entre sincronizaciones.
+        filas (int): Filas agregadas desde que se abrió el sumidero.
+    '''
+
+    extension = ""
+
+    def __init__(self, ruta, columnas=COLUMNAS_RESULTADOS, intervalo_filas=50, intervalo_segundos=5.0,
+                 reiniciar=True):
+        '''
+        Parámetros:
+            ruta (str): Ruta del archivo del sumidero.
+            columnas (list): Columnas de cada fila.
+            intervalo_filas (int): Filas entre sincronizaciones con el disco.
+            intervalo_segundos (float): Segundos máximos entre sincronizaciones.
+            reiniciar (bool): Si True, descarta el contenido previo; si False, continúa agregando.
+        '''
+        self.ruta = ruta
+        self.columnas = list(columnas)
+        self.intervalo_filas = max(1, intervalo_filas)
+        self.intervalo_segundos = intervalo_segundos
+        self.filas = 0
+        self._pendientes = 0
+        self._ultima_sincronizacion = time.monotonic()
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(carpeta, exist_ok=True)
+        self._abrir(reiniciar)
+
+    def _abrir(self, reiniciar):
+        raise NotImplementedError
+
+    def _escribir(self, fila):
+        raise NotImplementedError
+
+    def _sincronizar(self):
+        raise NotImplementedError
+
+    def leer(self):
+        '''
+        Retorna todo el contenido del sumidero como DataFrame.
+        '''
+        raise NotImplementedError
+
+    def _cerrar(self):
+        raise NotImplementedError
+
+    def agregar(self, fila):
+        '''
+        Agrega una fila al final del sumidero.
+
+        Parámetros:
+            fila (dict): Valores por columna.
+        '''
+        self._escribir(fila)
+        self.filas += 1
+        self._pendientes += 1
+        if (self._pendientes >= self.intervalo_filas
+                or time.monotonic() - self._ultima_sincronizacion >= self.intervalo_segundos):
+            self.sincronizar()
+
+    def sincronizar(self):
+        '''
+        Lleva al disco las filas pendientes.
+        '''
+        if self._pendientes:
+            self._sincronizar()
+        self._pendientes = 0
+        self._ultima_sincronizacion = time.monotonic()
+
+    def cerrar(self):
+        '''
+        Sincroniza y cierra el sumidero. Es seguro llamarlo más de una vez.
+        '''
+        self.sincronizar()
+        self._cerrar()
+
+    def exportar_excel(self, ruta_excel):
+        '''
+        Genera el libro de Excel con todo el contenido del sumidero.
+
+        Parámetros:
+            ruta_excel (str): Ruta del archivo .xlsx.
+
+        Retorna:
+            pd.DataFrame: Datos exportados.
+        '''
+        self.sincronizar()
+        df = self.leer()
+        df.to_excel(ruta_excel, index=False)
+        return df
+
+
+class _SumideroTexto(SumideroResultados):
+    '''
+    Base de los sumideros de texto que escriben una línea por fila.
+    '''
+
+    def _abrir(self, reiniciar):
+        nuevo = reiniciar or not os.path.exists(self.ruta) or os.path.getsize(self.ruta) == 0
+        self._archivo = open(self.ruta, "w" if nuevo else "a", encoding="utf-8", newline="")
+        if nuevo:
+            self._encabezado()
+            self._archivo.flush()  # Un sumidero sin filas también se puede leer
+
+    def _encabezado(self):
+        pass
+
+    def _sincronizar(self):
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+    def _cerrar(self):
+        if not self._archivo.closed:
+            self._archivo.close()
+
+
+class SumideroCSV(_SumideroTexto):
+    '''
+    Sumidero en CSV con encabezado.
+    '''
+
+    extension = ".csv"
+
+    def _abrir(self, reiniciar):
+        super()._abrir(reiniciar)
+        self._escritor = csv.writer(self._archivo)
+
+    def _encabezado(self):
+        csv.writer(self._archivo).writerow(self.columnas)
+
+    def _escribir(self, fila):
+        self._escritor.writerow([fila[c] for c in self.columnas])
+
+    def leer(self):
+        return pd.read_csv(self.ruta)
+
+
+class SumideroJSONL(_SumideroTexto):
+    '''
+    Sumidero en JSON Lines (un objeto por línea).
+    '''
+
+    extension = ".jsonl"
+
+    def _escribir(self, fila):
+        self._archivo.write(json.dumps({c: fila[c] for c in self.columnas}, ensure_ascii=False) + "\n")
+
+    def leer(self):
+        with open(self.ruta, encoding="utf-8") as archivo:
+            filas = [json.loads(linea) for linea in archivo if linea.strip()]
+        return pd.DataFrame(filas, columns=self.columnas)
+
+
+class SumideroSQLite(SumideroResultados):
+    '''
+    Sumidero en una tabla SQLite. Cada sincronización es un commit de la transacción abierta.
+    '''
+
+    extension = ".sqlite"
+
+    def _abrir(self, reiniciar):
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        columnas = ", ".join(f'"{c}"' for c in self.columnas)
+        if reiniciar:
+            self._conexion.execute("DROP TABLE IF EXISTS resultados")
+        self._conexion.execute(f"CREATE TABLE IF NOT EXISTS resultados ({columnas})")
+        self._conexion.commit()
+        self._insertar = (
+            f"INSERT INTO resultados ({columnas}) VALUES ({', '.join('?' for _ in self.columnas)})"
+        )
+
+    def _escribir(self, fila):
+        self._conexion.execute(self._insertar, [fila[c] for c in self.columnas])
+
+    def _sincronizar(self):
+        self._conexion.commit()
+
+    def leer(self):
+        return pd.read_sql_query("SELECT * FROM resultados ORDER BY rowid", self._conexion)
+
+    def _cerrar(self):
+        self._conexion.close()
+
+
+class SumideroParquet(SumideroResultados):
+    '''
+    Sumidero en Parquet. Un archivo Parquet no admite agregar filas, así que `ruta` es una
+    carpeta y cada sincronización escribe un archivo parte-NNNNN.parquet completo con las
+    filas pendientes. Requiere pyarrow.
+    '''
+
+    extension = ".parquet"
+
+    def _abrir(self, reiniciar):
+        import pyarrow  # noqa: F401  (dependencia opcional, se valida al abrir)
+        os.makedirs(self.ruta, exist_ok=True)
+        if reiniciar:
+            for parte in glob.glob(os.path.join(self.ruta, "parte-*.parquet")):
+                os.remove(parte)
+        self._partes = len(glob.glob(os.path.join(self.ruta, "parte-*.parquet")))
+        self._buffer = []
+
+    def _escribir(self, fila):
+        self._buffer.append([fila[c] for c in self.columnas])
+
+    def _sincronizar(self):
+        ruta_parte = os.path.join(self.ruta, f"parte-{self._partes:05d}.parquet")
+        temporal = ruta_parte + ".tmp"
+        pd.DataFrame(self._buffer, columns=self.columnas).to_parquet(temporal, index=False)
+        os.replace(temporal, ruta_parte)
+        self._partes += 1
+        self._buffer = []
+
+    def leer(self):
+        partes = sorted(glob.glob(os.path.join(self.ruta, "parte-*.parquet")))
+        if not partes:
+            return pd.DataFrame(columns=self.columnas)
+        return pd.concat([pd.read_parquet(p) for p in partes], ignore_index=True)
+
+    def _cerrar(self):
+        pass
+
+
+SUMIDEROS = {
+    "csv": SumideroCSV,
+    "jsonl": SumideroJSONL,
+    "sqlite": SumideroSQLite,
+    "parquet": SumideroParquet,
+}
+
+
+def crear_sumidero(formato, ruta_base, **kwargs):
+    '''
+    Crea un sumidero de resultados.
+
+    Parámetros:
+        formato (str): "csv", "jsonl", "sqlite" o "parquet".
+        ruta_base (str): Ruta sin extensión; se agrega la del formato.
+        **kwargs: Argumentos adicionales para el sumidero (intervalo_filas, reiniciar, ...).
+
+    Retorna:
+        SumideroResultados: Sumidero abierto.
+    '''
+    if formato not in SUMIDEROS:
+        raise ValueError(f"Formato de sumidero no soportado: {formato}")
+    clase = SUMIDEROS[formato]
+    return clase(ruta_base + clase.extension, **kwargs)
+
+
+def exportar_excel_desde_sumidero(formato, ruta_base, ruta_excel):
+    '''
+    Genera el Excel a partir de un sumidero existente, p. ej. tras un cierre inesperado.
+
+    Parámetros:
+        formato (str): Formato del sumidero.
+        ruta_base (str): Ruta sin extensión del sumidero.
+        ruta_excel (str): Ruta del archivo .xlsx a generar.
+
+    Retorna:
+        pd.DataFrame: Datos exportados.
+    '''
+    sumidero = crear_sumidero(formato, ruta_base, reiniciar=False)
+    try:
+        return sumidero.exportar_excel(ruta_excel)
+    finally:
+        sumidero.cerrar()
+
+
+class _ColumnaCreciente:
+    '''
+    Arreglo de NumPy que crece duplicando su capacidad. Agregar es O(1) amortizado y los
+    datos válidos se exponen como una vista, sin copias.
+    '''
+
+    def __init__(self, dtype, ancho=None, capacidad=1024):
+        forma = (capacidad,) if ancho is None else (capacidad, ancho)
+        self.datos = np.empty(forma, dtype=dtype)
+        self.n = 0
+
+    def _reservar(self, extra):
+        requerido = self.n + extra
+        if requerido <= len(self.datos):
+            return
+        capacidad = max(1, len(self.datos))
+        while capacidad < requerido:
+            capacidad *= 2
+        nuevos = np.empty((capacidad,) + self.datos.shape[1:], dtype=self.datos.dtype)
+        nuevos[:self.n] = self.datos[:self.n]
+        self.datos = nuevos
+
+    def agregar(self, valor):
+        self._reservar(1)
+        self.datos[self.n] = valor
+        self.n += 1
+
+    def extender(self, valores):
+        valores = np.asarray(valores, dtype=self.datos.dtype)
+        self._reservar(len(valores))
+        self.datos[self.n:self.n + len(valores)] = valores
+        self.n += len(valores)
+
+    def vista(self):
+        return self.datos[:self.n]
+
+
+class AlmacenDetecciones:
+    '''
+    Almacén columnar de detecciones en memoria. Cada columna es un arreglo de NumPy que crece
+    duplicando su capacidad, de modo que agregar una muestra no crea objetos por fila y la
+    memoria queda acotada a unos pocos bytes por detección.
+
+    Columnas por muestra: frame, ms y conteo por clase (hueco, piel de cocodrilo, grieta).
+    Columnas por caja (si guardar_cajas): muestra (fila de la muestra), clase, confianza,
+    coordenadas x1, y1, x2, y2 e identificador de seguimiento (-1 si no hay seguimiento).
+    '''
+
+    CLASES = ("Huecos", "Piel de cocodrilo", "Grietas")
+
+    def __init__(self, guardar_cajas=True, capacidad=1024):
+        '''
+        Parámetros:
+            guardar_cajas (bool): Si True, también se guardan las cajas individuales.
+            capacidad (int): Capacidad inicial de cada columna.
+        '''
+        self.guardar_cajas = guardar_cajas
+        self.capacidad = capacidad
+        self.limpiar()
+
+    def limpiar(self):
+        '''
+        Descarta todas las detecciones.
+        '''
+        self._frame = _ColumnaCreciente(np.int64, capacidad=self.capacidad)
+        self._ms = _ColumnaCreciente(np.float64, capacidad=self.capacidad)
+        self._conteos = _ColumnaCreciente(np.int32, ancho=len(self.CLASES), capacidad=self.capacidad)
+        self._caja_muestra = _ColumnaCreciente(np.int64, capacidad=self.capacidad)
+        self._caja_clase = _ColumnaCreciente(np.int16, capacidad=self.capacidad)
+        self._caja_confianza = _ColumnaCreciente(np.float32, capacidad=self.capacidad)
+        self._caja_xyxy = _ColumnaCreciente(np.float32, ancho=4, capacidad=self.capacidad)
+        self._caja_id = _ColumnaCreciente(np.int64, capacidad=self.capacidad)
+
+    def __len__(self):
+        return self._frame.n
+
+    def agregar(self, frame, ms, conteos, clases=None, confianzas=None, xyxy=None, ids=None):
+        '''
+        Agrega una muestra con detecciones.
+
+        Parámetros:
+            frame (int): Índice del frame.
+            ms (float): Marca de tiempo en milisegundos.
+            conteos (sequence): Conteo por clase, en el orden de CLASES.
+            clases (np.ndarray): Clase de cada caja (opcional).
+            confianzas (np.ndarray): Confianza de cada caja (opcional).
+            xyxy (np.ndarray): Coordenadas (n, 4) de cada caja (opcional).
+            ids (np.ndarray): Identificador de seguimiento de cada caja (opcional).
+        '''
+        fila = self._frame.n
+        self._frame.agregar(frame)
+        self._ms.agregar(ms)
+        self._conteos.agregar(conteos)
+        if self.guardar_cajas and clases is not None and len(clases):
+            self._caja_muestra.extender(np.full(len(clases), fila))
+            self._caja_clase.extender(clases)
+            self._caja_confianza.extender(confianzas)
+            self._caja_xyxy.extender(np.asarray(xyxy).reshape(-1, 4))
+            self._caja_id.extender(np.full(len(clases), -1) if ids is None else ids)
+
+    @classmethod
+    def unir(cls, almacenes):
+        '''
+        Concatena varios almacenes (p. ej. los de los fragmentos de un video) en uno nuevo,
+        en el orden recibido. Las referencias de las cajas a sus muestras se desplazan.
+
+        Parámetros:
+            almacenes (list): Almacenes a unir.
+
+        Retorna:
+            AlmacenDetecciones: Almacén con todas las muestras y cajas.
+        '''
+        unido = cls(guardar_cajas=any(a.guardar_cajas for a in almacenes))
+        for almacen in almacenes:
+            desplazamiento = len(unido)
+            unido._frame.extender(almacen._frame.vista())
+            unido._ms.extender(almacen._ms.vista())
+            unido._conteos.extender(almacen._conteos.vista())
+            unido._caja_muestra.extender(almacen._caja_muestra.vista() + desplazamiento)
+            unido._caja_clase.extender(almacen._caja_clase.vista())
+            unido._caja_confianza.extender(almacen._caja_confianza.vista())
+            unido._caja_xyxy.extender(almacen._caja_xyxy.vista())
+            unido._caja_id.extender(almacen._caja_id.vista())
+        return unido
+
+    def guardar(self, archivo):
+        '''
+        Guarda el almacén en formato .npz (ruta o archivo abierto en modo binario).
+        '''
+        np.savez(
+            archivo,
+            guardar_cajas=np.array(self.guardar_cajas),
+            frame=self._frame.vista(),
+            ms=self._ms.vista(),
+            conteos=self._conteos.vista(),
+            caja_muestra=self._caja_muestra.vista(),
+            caja_clase=self._caja_clase.vista(),
+            caja_confianza=self._caja_confianza.vista(),
+            caja_xyxy=self._caja_xyxy.vista(),
+            caja_id=self._caja_id.vista(),
+        )
+
+    @classmethod
+    def cargar(cls, archivo):
+        '''
+        Lee un almacén guardado con guardar().
+        '''
+        with np.load(archivo) as datos:
+            almacen = cls(guardar_cajas=bool(datos["guardar_cajas"]), capacidad=max(1, len(datos["frame"])))
+            almacen._frame.extender(datos["frame"])
+            almacen._ms.extender(datos["ms"])
+            almacen._conteos.extender(datos["conteos"])
+            almacen._caja_muestra.extender(datos["caja_muestra"])
+            almacen._caja_clase.extender(datos["caja_clase"])
+            almacen._caja_confianza.extender(datos["caja_confianza"])
+            almacen._caja_xyxy.extender(datos["caja_xyxy"])
+            almacen._caja_id.extender(datos["caja_id"])
+        return almacen
+
+    def columnas(self):
+        '''
+        Retorna las columnas por muestra como vistas de NumPy (sin copia).
+        '''
+        conteos = self._conteos.vista()
+        datos = {"frame": self._frame.vista(), "ms": self._ms.vista()}
+        for i, nombre in enumerate(self.CLASES):
+            datos[nombre] = conteos[:, i]
+        return datos
+
+    def a_dataframe(self):
+        '''
+        DataFrame con una fila por muestra. Las columnas son vistas sobre los arreglos del
+        almacén (sin copia), así que no debe modificarse ni conservarse tras agregar más datos.
+        '''
+        return pd.DataFrame(self.columnas(), copy=False)
+
+    def cajas_dataframe(self):
+        '''
+        DataFrame con una fila por caja (muestra, frame, ms, clase, confianza, coordenadas e id).
+        '''
+        muestra = self._caja_muestra.vista()
+        xyxy = self._caja_xyxy.vista()
+        return pd.DataFrame({
+            "muestra": muestra,
+            "frame": self._frame.vista()[muestra],
+            "ms": self._ms.vista()[muestra],
+            "clase": self._caja_clase.vista(),
+            "confianza": self._caja_confianza.vista(),
+            "x1": xyxy[:, 0],
+            "y1": xyxy[:, 1],
+            "x2": xyxy[:, 2],
+            "y2": xyxy[:, 3],
+            "id": self._caja_id.vista(),
+        }, copy=False)
+
+    def a_reporte(self):
+        '''
+        DataFrame con las columnas del Excel (COLUMNAS_RESULTADOS).
+        '''
+        columnas = self.columnas()
+        tiempo_seg = (columnas["ms"] // 1000).astype(np.int64)
+        return pd.DataFrame({
+            "Minuto": tiempo_seg // 60,
+            "Segundo": tiempo_seg % 60,
+            "Huecos": columnas["Huecos"],
+            "Grietas": columnas["Grietas"],
+            "Piel de cocodrilo": columnas["Piel de cocodrilo"],
+        }, columns=COLUMNAS_RESULTADOS, copy=False)
@@ -18,34 +18,1391 @@
 '''
 
 import os
-import pandas as pd
+import sys
+import time
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from skimage import img_as_float
 from scipy.ndimage import gaussian_filter
 import atexit
+import json
+import logging
+from almacenamiento import AlmacenDetecciones, crear_sumidero
+from cache_inferencia import huella_archivo
+from puntos_control import PuntoControl, PuntoControlIncompatible, EscritorSegmentado
+from instrumentacion import MetricasEtapas, MetricasNulas
+from motores_inferencia import preparar_motor
+from eventos import FlujoEventos
+import queue
+from collections import deque
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# Diagnósticos de la biblioteca; quien la use decide qué se muestra (logging.basicConfig)
+registro = logging.getLogger(__name__)
+
+class PoolBuffers:
+    '''
+    Pool de arreglos de NumPy preasignados, indexado por forma y tipo. El ciclo principal toma
+    de aquí los frames decodificados y los buffers del preprocesado, y los devuelve al terminar
+    con cada muestra, de modo que en régimen estable no se reserva memoria nueva por frame.
+    Es seguro entre hilos.
+
+    Atributos:
+        asignaciones (int): Buffers nuevos reservados.
+        reutilizaciones (int): Préstamos atendidos con un buffer ya existente.
+        bytes_reservados (int): Memoria total reservada por el pool.
+    '''
+
+    def __init__(self):
+        self._libres = {}
+        self._prestados = set()
+        self._bloqueo = threading.Lock()
+        self.asignaciones = 0
+        self.reutilizaciones = 0
+        self.bytes_reservados = 0
+
+    def tomar(self, forma, dtype=np.uint8):
+        '''
+        Presta un buffer (sin inicializar) de la forma y tipo pedidos.
+        '''
+        clave = (tuple(forma), np.dtype(dtype).str)
+        with self._bloqueo:
+            libres = self._libres.get(clave)
+            if libres:
+                buffer = libres.pop()
+                self.reutilizaciones += 1
+            else:
+                buffer = np.empty(forma, dtype=dtype)
+                self.asignaciones += 1
+                self.bytes_reservados += buffer.nbytes
+            self._prestados.add(id(buffer))
+        return buffer
+
+    def devolver(self, buffer):
+        '''
+        Devuelve un buffer prestado. Los arreglos que no salieron del pool se ignoran.
+        '''
+        if buffer is None:
+            return
+        with self._bloqueo:
+            if id(buffer) not in self._prestados:
+                return
+            self._prestados.discard(id(buffer))
+            self._libres.setdefault((buffer.shape, buffer.dtype.str), []).append(buffer)
+
+    def estadisticas(self):
+        return {
+            "asignaciones": self.asignaciones,
+            "reutilizaciones": self.reutilizaciones,
+            "bytes_reservados": self.bytes_reservados,
+        }
+
+
+def pico_rss_mb():
+    '''
+    Memoria residente máxima del proceso en MB, o None si no se puede medir en esta plataforma.
+    '''
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 1024 ** 2 if sys.platform == "darwin" else pico / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memoria = psutil.Process().memory_info()
+        return getattr(memoria, "peak_wset", memoria.rss) / 1024 ** 2
+    except ImportError:
+        return None
+
+
+def _a_float32(image, pool=None):
+    '''
+    Convierte la imagen a float32 en [0, 1], en un buffer del pool si se indica.
+    '''
+    if image.dtype == np.uint8:
+        imagen = pool.tomar(image.shape, np.float32) if pool is not None else np.empty(image.shape, np.float32)
+        np.multiply(image, np.float32(1.0 / 255), out=imagen)
+        return imagen
+    return image.astype(np.float32, copy=False)
+
 
 # --- Función de preprocesado ---
-def imflatfield(image, sigma=40):
+def imflatfield(image, sigma=40, modo="exacto", factor=None, pool=None):
     '''
     Aplica corrección de campo plano (flat-field correction) para mejorar la uniformidad de la iluminación
     en la imagen, reduciendo la influencia de variaciones de fondo.
 
-    Parámetros:
-        image (np.ndarray): Imagen de entrada (BGR).
-        sigma (int): Parámetro de suavizado Gaussiano para estimar el fondo.
+    Parámetros:
+        image (np.ndarray): Imagen de entrada (BGR).
+        sigma (int): Parámetro de suavizado Gaussiano para estimar el fondo.
+        modo (str): "exacto" filtra cada canal a resolución completa; "rapido" estima el fondo
+            sobre una versión reducida de la imagen (ver imflatfield_rapido).
+        factor (int): Factor de reducción para el modo "rapido". None lo elige a partir de sigma.
+        pool (PoolBuffers): Pool de buffers para el modo "rapido" (opcional).
+
+    Retorna:
+        np.ndarray: Imagen corregida con valores en rango [0, 255].
+    '''
+    if modo == "rapido":
+        return imflatfield_rapido(image, sigma=sigma, factor=factor, pool=pool)
+    if modo != "exacto":
+        raise ValueError(f"Modo de flat-field no soportado: {modo}")
+
+    if image.dtype != np.float32:
+        image = img_as_float(image)
+    corrected = np.zeros_like(image)
+    for c in range(3):  # RGB
+        fondo = gaussian_filter(image[:, :, c], sigma=sigma)
+        corrected[:, :, c] = np.clip((image[:, :, c] - fondo) + np.mean(fondo), 0, 1)
+    return (corrected * 255).astype(np.uint8)
+
+
+def factor_reduccion(sigma):
+    '''
+    Factor de reducción por defecto para imflatfield_rapido. Se deja un sigma de al menos
+    5 píxeles en la imagen reducida para que el fondo siga siendo suave tras reescalar.
+    '''
+    return max(1, int(sigma // 5))
+
+
+def imflatfield_rapido(image, sigma=40, factor=None, pool=None):
+    '''
+    Versión aproximada de imflatfield. El fondo de baja frecuencia se estima sobre la imagen
+    reducida por `factor` (con sigma / factor), se reescala a la resolución original y la
+    corrección se aplica en una sola pasada float32 sobre los tres canales.
+
+    Parámetros:
+        image (np.ndarray): Imagen de entrada (BGR, uint8 o flotante en [0, 1]).
+        sigma (int): Parámetro de suavizado Gaussiano, en píxeles de la imagen original.
+        factor (int): Factor de reducción. None usa factor_reduccion(sigma).
+        pool (PoolBuffers): Si se indica, los buffers intermedios y la salida se toman del pool
+            (la salida debe devolverse con pool.devolver cuando ya no se use).
+
+    Retorna:
+        np.ndarray: Imagen corregida con valores en rango [0, 255].
+    '''
+    if factor is None:
+        factor = factor_reduccion(sigma)
+    imagen = _a_float32(image, pool)
+
+    alto, ancho = imagen.shape[:2]
+    fondo_reducido = estimar_fondo(imagen, sigma=sigma, factor=factor)
+    if pool is None:
+        fondo = cv2.resize(fondo_reducido, (ancho, alto), interpolation=cv2.INTER_LINEAR)
+        return aplicar_fondo(imagen, fondo)
+
+    fondo = pool.tomar(imagen.shape, np.float32)
+    cv2.resize(fondo_reducido, (ancho, alto), dst=fondo, interpolation=cv2.INTER_LINEAR)
+    salida = aplicar_fondo(imagen, fondo, pool=pool, en_sitio=imagen is not image)
+    pool.devolver(fondo)
+    pool.devolver(imagen)
+    return salida
+
+
+def estimar_fondo(imagen, sigma=40, factor=8):
+    '''
+    Estima el fondo de iluminación a baja resolución.
+
+    Parámetros:
+        imagen (np.ndarray): Imagen float32 en [0, 1].
+        sigma (int): Sigma del suavizado, en píxeles de la imagen original.
+        factor (int): Factor de reducción.
+
+    Retorna:
+        np.ndarray: Fondo float32 con tamaño (alto // factor, ancho // factor).
+    '''
+    alto, ancho = imagen.shape[:2]
+    if factor > 1:
+        reducida = cv2.resize(
+            imagen, (max(1, ancho // factor), max(1, alto // factor)), interpolation=cv2.INTER_AREA
+        )
+    else:
+        reducida = imagen
+    # BORDER_REFLECT equivale al modo "reflect" de scipy.ndimage
+    return cv2.GaussianBlur(reducida, (0, 0), sigma / factor, borderType=cv2.BORDER_REFLECT)
+
+
+def aplicar_fondo(imagen, fondo, media=None, pool=None, en_sitio=False):
+    '''
+    Resta el fondo, suma su media por canal y convierte a uint8 en una sola pasada vectorizada.
+
+    Parámetros:
+        imagen (np.ndarray): Imagen float32 en [0, 1].
+        fondo (np.ndarray): Fondo float32 con la misma forma que la imagen.
+        media (np.ndarray): Media por canal del fondo. None la calcula.
+        pool (PoolBuffers): Si se indica, la salida uint8 se toma del pool.
+        en_sitio (bool): Si True, `imagen` se usa como buffer de trabajo (se sobrescribe).
+
+    Retorna:
+        np.ndarray: Imagen corregida con valores en rango [0, 255].
+    '''
+    if media is None:
+        media = fondo.mean(axis=(0, 1), dtype=np.float64).astype(np.float32)
+    corregida = np.subtract(imagen, fondo, out=imagen if en_sitio else None)
+    corregida += media
+    np.clip(corregida, 0, 1, out=corregida)
+    corregida *= 255
+    if pool is None:
+        return corregida.astype(np.uint8)
+    salida = pool.tomar(corregida.shape, np.uint8)
+    np.copyto(salida, corregida, casting="unsafe")
+    return salida
+
+
+class FlatFieldIncremental:
+    '''
+    Corrección de campo plano con reutilización temporal del fondo entre frames muestreados.
+
+    El fondo se mantiene a baja resolución y se actualiza con un promedio exponencial cada
+    `intervalo_actualizacion` frames. Solo se recalcula por completo cuando una miniatura del
+    frame muestra un cambio de iluminación (brillo global o histograma), p. ej. al entrar a
+    un túnel o a una sombra. Mientras tanto se reutiliza el fondo ya reescalado.
+
+    Atributos:
+        recalculos (int): Número de estimaciones completas del fondo.
+        actualizaciones (int): Número de actualizaciones por promedio exponencial.
+        reutilizaciones (int): Número de frames corregidos con el fondo en caché.
+    '''
+
+    def __init__(self, sigma=40, factor=None, alpha=0.3, intervalo_actualizacion=5,
+                 umbral_brillo=0.06, umbral_histograma=0.2, bins=16, tamano_miniatura=(64, 36), pool=None):
+        '''
+        Parámetros:
+            sigma (int): Parámetro de suavizado Gaussiano, en píxeles de la imagen original.
+            factor (int): Factor de reducción para estimar el fondo. None usa factor_reduccion(sigma).
+            alpha (float): Peso del fondo nuevo en el promedio exponencial.
+            intervalo_actualizacion (int): Cada cuántos frames se actualiza el promedio. 0 lo desactiva.
+            umbral_brillo (float): Cambio de brillo medio (en [0, 1]) que fuerza un recálculo.
+            umbral_histograma (float): Distancia de variación total entre histogramas que fuerza un recálculo.
+            bins (int): Número de bins del histograma de luminancia.
+            tamano_miniatura (tuple): Tamaño (ancho, alto) de la miniatura usada para detectar cambios.
+            pool (PoolBuffers): Pool de buffers para la conversión y la salida (opcional).
+        '''
+        self.sigma = sigma
+        self.factor = factor_reduccion(sigma) if factor is None else factor
+        self.alpha = alpha
+        self.intervalo_actualizacion = intervalo_actualizacion
+        self.umbral_brillo = umbral_brillo
+        self.umbral_histograma = umbral_histograma
+        self.bins = bins
+        self.tamano_miniatura = tamano_miniatura
+        self.pool = pool
+        self.reiniciar()
+
+    def reiniciar(self):
+        '''
+        Descarta el fondo acumulado (p. ej. al empezar un video nuevo).
+        '''
+        self.fondo_reducido = None
+        self.fondo = None
+        self.media = None
+        self.brillo_referencia = None
+        self.histograma_referencia = None
+        self.frames_desde_actualizacion = 0
+        self.recalculos = 0
+        self.actualizaciones = 0
+        self.reutilizaciones = 0
+
+    def _firma(self, image):
+        '''
+        Brillo medio e histograma normalizado de luminancia sobre una miniatura del frame.
+        '''
+        miniatura = cv2.resize(image, self.tamano_miniatura, interpolation=cv2.INTER_AREA)
+        if miniatura.ndim == 3:
+            miniatura = cv2.cvtColor(miniatura, cv2.COLOR_BGR2GRAY)
+        if miniatura.dtype == np.uint8:
+            miniatura = miniatura.astype(np.float32) * (1.0 / 255)
+        histograma, _ = np.histogram(miniatura, bins=self.bins, range=(0.0, 1.0))
+        return float(miniatura.mean()), histograma / max(1, histograma.sum())
+
+    def hay_cambio_iluminacion(self, brillo, histograma):
+        '''
+        Indica si la firma del frame se aleja de la del último recálculo completo.
+        '''
+        if self.brillo_referencia is None:
+            return True
+        if abs(brillo - self.brillo_referencia) > self.umbral_brillo:
+            return True
+        return 0.5 * np.abs(histograma - self.histograma_referencia).sum() > self.umbral_histograma
+
+    def _actualizar_fondo(self, fondo_reducido, forma):
+        self.fondo_reducido = fondo_reducido
+        destino = self.fondo if self.fondo is not None and self.fondo.shape == forma else None
+        self.fondo = cv2.resize(fondo_reducido, (forma[1], forma[0]), dst=destino, interpolation=cv2.INTER_LINEAR)
+        self.media = self.fondo.mean(axis=(0, 1), dtype=np.float64).astype(np.float32)
+
+    def __call__(self, image):
+        '''
+        Corrige el frame reutilizando el fondo cuando la iluminación no ha cambiado.
+
+        Parámetros:
+            image (np.ndarray): Frame BGR (uint8 o flotante en [0, 1]).
+
+        Retorna:
+            np.ndarray: Imagen corregida con valores en rango [0, 255].
+        '''
+        brillo, histograma = self._firma(image)
+        imagen = _a_float32(image, self.pool)
+
+        if self.fondo is None or self.fondo.shape != imagen.shape or self.hay_cambio_iluminacion(brillo, histograma):
+            self._actualizar_fondo(estimar_fondo(imagen, sigma=self.sigma, factor=self.factor), imagen.shape)
+            self.brillo_referencia = brillo
+            self.histograma_referencia = histograma
+            self.frames_desde_actualizacion = 0
+            self.recalculos += 1
+        else:
+            self.frames_desde_actualizacion += 1
+            if self.intervalo_actualizacion and self.frames_desde_actualizacion >= self.intervalo_actualizacion:
+                nuevo = estimar_fondo(imagen, sigma=self.sigma, factor=self.factor)
+                self._actualizar_fondo((1 - self.alpha) * self.fondo_reducido + self.alpha * nuevo, imagen.shape)
+                self.frames_desde_actualizacion = 0
+                self.actualizaciones += 1
+            else:
+                self.reutilizaciones += 1
+
+        salida = aplicar_fondo(imagen, self.fondo, self.media, pool=self.pool, en_sitio=imagen is not image)
+        if self.pool is not None:
+            self.pool.devolver(imagen)
+        return salida
+
+    def aplicar(self, image):
+        '''
+        Corrige un frame que solo se muestra (no se infiere) con el fondo vigente, sin
+        actualizarlo ni contar el frame, de modo que las muestras siguientes se corrigen igual que
+        si este frame no se hubiera visto. Sin fondo vigente para su tamaño, estima uno solo para él.
+        '''
+        imagen = _a_float32(image, self.pool)
+        if self.fondo is not None and self.fondo.shape == imagen.shape:
+            fondo, media = self.fondo, self.media
+        else:
+            reducido = estimar_fondo(imagen, sigma=self.sigma, factor=self.factor)
+            fondo = cv2.resize(reducido, (imagen.shape[1], imagen.shape[0]), interpolation=cv2.INTER_LINEAR)
+            media = None
+        salida = aplicar_fondo(imagen, fondo, media, pool=self.pool, en_sitio=imagen is not image)
+        if self.pool is not None:
+            self.pool.devolver(imagen)
+        return salida
+
+
+def error_flatfield(image, sigma=40, factor=None):
+    '''
+    Error máximo (en niveles de gris) de imflatfield_rapido frente a la implementación exacta.
+
+    Parámetros:
+        image (np.ndarray): Imagen de entrada (BGR).
+        sigma (int): Parámetro de suavizado Gaussiano.
+        factor (int): Factor de reducción del modo rápido.
+
+    Retorna:
+        int: Máxima diferencia absoluta entre ambas salidas.
+    '''
+    exacta = imflatfield(image, sigma=sigma, modo="exacto")
+    rapida = imflatfield_rapido(image, sigma=sigma, factor=factor)
+    return int(np.abs(exacta.astype(np.int16) - rapida.astype(np.int16)).max())
+
+
+def calcular_intervalo(cap, inicio_min=0, fin_min=0, todo=True):
+    '''
+    Convierte el intervalo en minutos de la interfaz a un rango de frames [inicio, fin).
+
+    Parámetros:
+        cap (cv2.VideoCapture): Captura abierta.
+        inicio_min (int): Minuto de inicio de análisis.
+        fin_min (int): Minuto final de análisis.
+        todo (bool): Si True, el rango cubre todo el video.
+
+    Retorna:
+        tuple: (inicio, fin) en frames.
+    '''
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    if todo:
+        return 0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    return int(inicio_min * 60 * fps), int(fin_min * 60 * fps)
+
+
+class Muestra:
+    '''
+    Frame muestreado por LectorMuestreado.
+
+    Atributos:
+        indice (int): Índice absoluto del frame en el video.
+        ms (float): Marca de tiempo del frame en milisegundos.
+        frame (np.ndarray): Frame BGR decodificado.
+        repeticiones (int): Frames del video de salida que ocupa esta muestra (ella misma y los
+            frames omitidos hasta la siguiente muestra o el final del intervalo). El lector lo
+            incrementa después de entregar la muestra; queda completo cuando entrega la siguiente.
+        frame_proc (np.ndarray): Frame preprocesado, una vez calculado (None si no hace falta).
+        cajas (tuple): (clases, confianzas, xyxy) de la muestra, una vez inferida o leída de la caché.
+        t_captura (float): Instante de captura (time.perf_counter) en el modo en vivo, o None.
+    '''
+
+    def __init__(self, indice, ms, frame, repeticiones=1):
+        self.indice = indice
+        self.ms = ms
+        self.frame = frame
+        self.repeticiones = repeticiones
+        self.frame_proc = None
+        self.cajas = None
+        self.t_captura = None
+
+
+class MuestreadorFijo:
+    '''
+    Muestrea un frame de cada `paso`, contando la fase desde `origen`.
+    '''
+
+    necesita_pixeles = False
+
+    def __init__(self, paso=20):
+        self.paso = max(1, int(paso))
+        self.origen = 0
+
+    def parametros(self):
+        return {"tipo": "fijo", "paso": self.paso}
+
+    def estado(self):
+        return {}
+
+    def restaurar(self, estado):
+        pass
+
+    def reiniciar(self, origen, fps):
+        self.origen = origen
+
+    def debe_muestrear(self, indice, frame=None):
+        return (indice - self.origen + 1) % self.paso == 0
+
+    def notificar(self, indice, hubo_deteccion):
+        pass
+
+
+class MuestreadorAdaptativo:
+    '''
+    Muestreo adaptativo según el contenido. Para cada frame se calcula una miniatura en
+    escala de grises y su diferencia media con la miniatura de la última muestra:
+
+        - Si el cambio es menor que `umbral_duplicado` (vehículo detenido, escena repetida),
+          el frame se omite aunque se haya superado paso_max.
+        - Si el cambio supera `umbral_cambio` o ya pasaron paso_max frames, se muestrea.
+        - Durante `ventana_deteccion` frames después de una muestra con detecciones se
+          muestrea cada paso_min frames.
+
+    Nunca se muestrea a menos de paso_min frames de la muestra anterior, y todas las muestras
+    consumen del presupuesto de inferencia (cubeta de fichas que se llena a `presupuesto_fps`
+    muestras por segundo de video), que admite ráfagas cortas tras una detección.
+
+    Atributos:
+        muestras (int): Frames muestreados.
+        duplicados (int): Frames omitidos por ser casi idénticos a la última muestra.
+        sin_presupuesto (int): Frames que se habrían muestreado pero no había presupuesto.
+    '''
+
+    necesita_pixeles = True
+
+    def __init__(self, paso_min=5, paso_max=40, umbral_cambio=0.08, umbral_duplicado=0.01,
+                 ventana_deteccion=30, presupuesto_fps=None, rafaga_s=2.0, tamano_miniatura=(64, 36)):
+        '''
+        Parámetros:
+            paso_min (int): Distancia mínima en frames entre muestras.
+            paso_max (int): Distancia máxima en frames entre muestras (salvo frames duplicados).
+            umbral_cambio (float): Diferencia media (en [0, 1]) con la última muestra que dispara una muestra.
+            umbral_duplicado (float): Diferencia media por debajo de la cual el frame se considera repetido.
+            ventana_deteccion (int): Frames tras una detección en los que se muestrea cada paso_min.
+            presupuesto_fps (float): Muestras por segundo de video como máximo en promedio. None no limita.
+            rafaga_s (float): Segundos de presupuesto que se pueden acumular para ráfagas.
+            tamano_miniatura (tuple): Tamaño (ancho, alto) de la miniatura de comparación.
+        '''
+        self.paso_min = max(1, int(paso_min))
+        self.paso_max = max(self.paso_min, int(paso_max))
+        self.umbral_cambio = umbral_cambio
+        self.umbral_duplicado = umbral_duplicado
+        self.ventana_deteccion = ventana_deteccion
+        self.presupuesto_fps = presupuesto_fps
+        self.rafaga_s = rafaga_s
+        self.tamano_miniatura = tamano_miniatura
+        self.reiniciar(0, 30.0)
+
+    def parametros(self):
+        return {
+            "tipo": "adaptativo", "paso_min": self.paso_min, "paso_max": self.paso_max,
+            "umbral_cambio": self.umbral_cambio, "umbral_duplicado": self.umbral_duplicado,
+            "ventana_deteccion": self.ventana_deteccion, "presupuesto_fps": self.presupuesto_fps,
+            "rafaga_s": self.rafaga_s, "tamano_miniatura": list(self.tamano_miniatura),
+        }
+
+    def estado(self):
+        '''
+        Estado que se conserva en un punto de control. La miniatura de la última muestra no se
+        guarda: al reanudar, el primer frame (que fue muestra) se vuelve a muestrear.
+        '''
+        return {
+            "densificar_hasta": int(self.densificar_hasta),
+            "fichas": float(self.fichas) if self.presupuesto_fps else None,
+        }
+
+    def restaurar(self, estado):
+        self.densificar_hasta = estado["densificar_hasta"]
+        if self.presupuesto_fps and estado["fichas"] is not None:
+            self.fichas = estado["fichas"]
+
+    def reiniciar(self, origen, fps):
+        self.fps = fps or 30.0
+        self.ultima_muestra = origen - self.paso_max
+        self.miniatura_muestra = None
+        self.densificar_hasta = -1
+        if self.presupuesto_fps:
+            self.fichas_max = max(1.0, self.presupuesto_fps * self.rafaga_s)
+            self.fichas = self.fichas_max
+        self.muestras = 0
+        self.duplicados = 0
+        self.sin_presupuesto = 0
+
+    def _miniatura(self, frame):
+        miniatura = cv2.resize(frame, self.tamano_miniatura, interpolation=cv2.INTER_AREA)
+        if miniatura.ndim == 3:
+            miniatura = cv2.cvtColor(miniatura, cv2.COLOR_BGR2GRAY)
+        return miniatura.astype(np.float32) * (1.0 / 255)
+
+    def debe_muestrear(self, indice, frame=None):
+        if self.presupuesto_fps:
+            self.fichas = min(self.fichas_max, self.fichas + self.presupuesto_fps / self.fps)
+        desde = indice - self.ultima_muestra
+        if desde < self.paso_min:
+            return False
+
+        miniatura = self._miniatura(frame)
+        if self.miniatura_muestra is None:
+            cambio = float("inf")
+        else:
+            cambio = float(np.abs(miniatura - self.miniatura_muestra).mean())
+            if cambio < self.umbral_duplicado:
+                self.duplicados += 1
+                return False
+
+        if not (cambio >= self.umbral_cambio or desde >= self.paso_max or indice <= self.densificar_hasta):
+            return False
+        if self.presupuesto_fps:
+            if self.fichas < 1.0:
+                self.sin_presupuesto += 1
+                return False
+            self.fichas -= 1.0
+
+        self.ultima_muestra = indice
+        self.miniatura_muestra = miniatura
+        self.muestras += 1
+        return True
+
+    def notificar(self, indice, hubo_deteccion):
+        if hubo_deteccion:
+            self.densificar_hasta = max(self.densificar_hasta, indice + self.ventana_deteccion)
+
+
+class LectorMuestreado:
+    '''
+    Recorre un intervalo de un video entregando solo los frames que elige el muestreador.
+
+    Con un muestreador que no necesita píxeles (MuestreadorFijo), los frames omitidos se
+    avanzan con cap.grab() sin recuperarlos; solo las muestras pasan por cap.retrieve(). El
+    índice de frame se lleva localmente en lugar de consultar CAP_PROP_POS_FRAMES en cada
+    iteración. Cada muestra se entrega en cuanto se lee y su campo repeticiones se completa
+    a medida que se avanza hasta la siguiente.
+
+    Atributos:
+        cap (cv2.VideoCapture): Captura abierta.
+        inicio (int): Primer frame del intervalo.
+        fin (int): Frame final (excluido) del intervalo.
+        muestreador: MuestreadorFijo, MuestreadorAdaptativo u objeto con la misma interfaz.
+        origen (int): Frame desde el que se cuenta la fase del muestreo (por defecto, inicio).
+        alinear_keyframe (bool): Si True, se usa el seek del contenedor (que salta al keyframe
+            anterior) y se toma la posición que este reporta; si False, se avanza con grab()
+            desde la posición actual.
+        fps (float): Cuadros por segundo del video, usado para las marcas de tiempo.
+        pool (PoolBuffers): Si se indica, los frames se decodifican sobre buffers del pool; quien
+            los recibe debe devolverlos al terminar con ellos.
+    '''
+
+    def __init__(self, cap, inicio, fin, paso=20, alinear_keyframe=True, origen=None, muestreador=None,
+                 pool=None):
+        self.cap = cap
+        self.inicio = inicio
+        self.origen = inicio if origen is None else origen
+        self.fin = fin
+        self.muestreador = MuestreadorFijo(paso) if muestreador is None else muestreador
+        self.alinear_keyframe = alinear_keyframe
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.muestreador.reiniciar(self.origen, self.fps)
+        self.pool = pool
+        self.forma = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+
+    def _decodificar(self, leer):
+        '''
+        Llama a cap.retrieve o cap.read sobre un buffer del pool (si hay pool).
+        '''
+        if self.pool is None:
+            return leer()
+        buffer = self.pool.tomar(self.forma)
+        ret, frame = leer(buffer)
+        if frame is not buffer:
+            self.pool.devolver(buffer)
+        return ret, frame
+
+    def buscar(self, frame):
+        '''
+        Posiciona la captura en `frame` y retorna el índice del siguiente frame a leer.
+        '''
+        if frame <= 0:
+            return 0
+        if self.alinear_keyframe:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+            posicion = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        else:
+            posicion = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        # Si el contenedor quedó antes del frame pedido, se completa sin recuperar píxeles
+        while posicion < frame and self.cap.grab():
+            posicion += 1
+        return posicion
+
+    def recorrer_todos(self):
+        '''
+        Recorre todos los frames del intervalo, decodificados, indicando cuáles son muestras.
+
+        Retorna:
+            generator: Tuplas (indice, ms, frame, es_muestra).
+        '''
+        indice = self.buscar(self.inicio)
+        while indice < self.fin:
+            ret, frame = self._decodificar(self.cap.read)
+            if not ret:
+                break
+            yield indice, indice * 1000.0 / self.fps, frame, self.muestreador.debe_muestrear(indice, frame)
+            indice += 1
+
+    def __iter__(self):
+        indice = self.buscar(self.inicio)
+        actual = None
+        necesita_pixeles = self.muestreador.necesita_pixeles
+        while indice < self.fin:
+            if not self.cap.grab():
+                break
+            frame = None
+            if necesita_pixeles:
+                ret, frame = self._decodificar(self.cap.retrieve)
+                if not ret:
+                    break
+            if self.muestreador.debe_muestrear(indice, frame):
+                if frame is None:
+                    ret, frame = self._decodificar(self.cap.retrieve)
+                    if not ret:
+                        break
+                actual = Muestra(indice, indice * 1000.0 / self.fps, frame)
+                yield actual
+            else:
+                if frame is not None and self.pool is not None:
+                    self.pool.devolver(frame)
+                if actual is not None:
+                    actual.repeticiones += 1
+            indice += 1
+
+
+class CapturaEnVivo:
+    '''
+    Lee una fuente sin fin conocido (cámara, tubería con nombre o URL) en un hilo propio y deja
+    los frames en una cola acotada. Si la cola está llena, se descarta el frame más antiguo: la
+    captura nunca espera a la inferencia, igual que una cámara que sigue grabando.
+
+    Con un archivo y ritmo_nativo=True, los frames se entregan al ritmo de su fps, de modo que
+    un video grabado sirve como sustituto local de la cámara.
+
+    Atributos:
+        cap (cv2.VideoCapture): Captura abierta.
+        fps (float): Cuadros por segundo de la fuente (30 si no lo reporta).
+        tamano_cola (int): Frames que caben en la cola.
+        ritmo_nativo (bool): Espera entre lecturas para no leer más rápido que fps.
+        muestreador (MuestreadorFijo): Muestreo de paso 1; la inferencia toma lo que alcance.
+        capturados (int): Frames leídos de la fuente.
+        descartados (int): Frames desplazados de la cola por otros más recientes.
+        terminado (bool): True cuando la fuente se agotó o se detuvo la captura.
+    '''
+
+    def __init__(self, cap, tamano_cola=2, ritmo_nativo=False, pool=None):
+        self.cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.tamano_cola = max(1, tamano_cola)
+        self.ritmo_nativo = ritmo_nativo
+        self.pool = pool
+        self.muestreador = MuestreadorFijo(1)
+        self.capturados = 0
+        self.descartados = 0
+        self.terminado = False
+        self._cola = deque()
+        self._condicion = threading.Condition()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._capturar, daemon=True)
+
+    def iniciar(self):
+        self.t0 = time.perf_counter()
+        self._hilo.start()
+        return self
+
+    def _capturar(self):
+        forma = None
+        indice = 0
+        try:
+            while not self._detener.is_set():
+                if self.ritmo_nativo:
+                    espera = self.t0 + indice / self.fps - time.perf_counter()
+                    if espera > 0 and self._detener.wait(espera):
+                        break
+                # La forma solo se conoce con el primer frame (las tuberías no la reportan)
+                buffer = self.pool.tomar(forma) if self.pool is not None and forma else None
+                ret, frame = self.cap.read() if buffer is None else self.cap.read(buffer)
+                if buffer is not None and frame is not buffer:
+                    self.pool.devolver(buffer)
+                if not ret:
+                    break
+                forma = frame.shape
+                ahora = time.perf_counter()
+                muestra = Muestra(indice, (ahora - self.t0) * 1000.0, frame)
+                muestra.t_captura = ahora
+                with self._condicion:
+                    if len(self._cola) >= self.tamano_cola:
+                        self._descartar(self._cola.popleft())
+                        self.descartados += 1
+                    self._cola.append(muestra)
+                    self.capturados += 1
+                    self._condicion.notify()
+                indice += 1
+        finally:
+            with self._condicion:
+                self.terminado = True
+                self._condicion.notify_all()
+
+    def _descartar(self, muestra):
+        if self.pool is not None:
+            self.pool.devolver(muestra.frame)
+
+    def siguiente(self, timeout=0.1):
+        '''
+        Toma el frame más antiguo de la cola.
+
+        Retorna:
+            tuple: (muestra o None si no llegó ninguna en `timeout`, frames que quedan en la cola).
+        '''
+        with self._condicion:
+            if not self._cola and not self.terminado:
+                self._condicion.wait(timeout)
+            if not self._cola:
+                return None, 0
+            return self._cola.popleft(), len(self._cola)
+
+    def detener(self):
+        '''
+        Detiene la captura y descarta los frames que quedaron en la cola.
+        '''
+        self._detener.set()
+        self._hilo.join(timeout=5)
+        with self._condicion:
+            while self._cola:
+                self._descartar(self._cola.popleft())
+
+
+def extraer_cajas(result):
+    '''
+    Extrae las cajas de un resultado de Ultralytics como arreglos de NumPy.
+
+    Parámetros:
+        result: Resultado de Ultralytics (con atributo boxes).
+
+    Retorna:
+        tuple: (clases int64 (n,), confianzas float32 (n,), xyxy float32 (n, 4)).
+    '''
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.empty(0, np.int64), np.empty(0, np.float32), np.empty((0, 4), np.float32)
+    return (
+        boxes.cls.cpu().numpy().astype(np.int64),
+        boxes.conf.cpu().numpy().astype(np.float32),
+        boxes.xyxy.cpu().numpy().astype(np.float32),
+    )
+
+
+# Nombres y colores (BGR) de las clases del modelo
+NOMBRES_CLASES = {0: "hueco", 1: "piel de cocodrilo", 2: "grieta"}
+COLORES_CLASES = {0: (0, 0, 255), 1: (0, 165, 255), 2: (255, 0, 0)}
+
+
+class RenderizadorDetecciones:
+    '''
+    Dibujo de detecciones específico para las tres clases de pavimento, pensado para el ciclo
+    principal en lugar de result.plot(). Dibuja en el propio frame (sin copiarlo): los bordes de
+    las cajas se pintan con asignaciones por rebanadas de NumPy y las etiquetas se copian desde
+    glifos prerenderizados que se guardan en caché (uno por clase y uno por identificador).
+
+    Atributos:
+        grosor (int): Grosor en píxeles del borde de las cajas.
+        escala_fuente (float): Escala de la fuente de las etiquetas.
+    '''
+
+    def __init__(self, nombres=NOMBRES_CLASES, colores=COLORES_CLASES, grosor=2, escala_fuente=0.5,
+                 max_glifos=1024):
+        '''
+        Parámetros:
+            nombres (dict): Nombre de cada clase.
+            colores (dict): Color BGR de cada clase.
+            grosor (int): Grosor del borde de las cajas.
+            escala_fuente (float): Escala de la fuente de las etiquetas.
+            max_glifos (int): Tamaño máximo de la caché de glifos de identificadores.
+        '''
+        self.nombres = nombres
+        self.colores = {c: np.array(color, np.uint8) for c, color in colores.items()}
+        self.grosor = grosor
+        self.escala_fuente = escala_fuente
+        self.max_glifos = max_glifos
+        self._glifos = {}
+
+    def _glifo(self, texto, clase):
+        clave = (texto, clase)
+        glifo = self._glifos.get(clave)
+        if glifo is None:
+            if len(self._glifos) >= self.max_glifos:
+                self._glifos.clear()
+            (ancho, alto), base = cv2.getTextSize(texto, cv2.FONT_HERSHEY_SIMPLEX, self.escala_fuente, 1)
+            glifo = np.empty((alto + base + 4, ancho + 4, 3), np.uint8)
+            glifo[:] = self._color(clase)
+            cv2.putText(glifo, texto, (2, alto + 2), cv2.FONT_HERSHEY_SIMPLEX, self.escala_fuente,
+                        (255, 255, 255), 1, cv2.LINE_AA)
+            self._glifos[clave] = glifo
+        return glifo
+
+    def _color(self, clase):
+        color = self.colores.get(clase)
+        return np.array((0, 255, 0), np.uint8) if color is None else color
+
+    @staticmethod
+    def _pegar(frame, glifo, x, y):
+        alto_f, ancho_f = frame.shape[:2]
+        alto, ancho = glifo.shape[:2]
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(ancho_f, x + ancho), min(alto_f, y + alto)
+        if x1 > x0 and y1 > y0:
+            frame[y0:y1, x0:x1] = glifo[y0 - y:y1 - y, x0 - x:x1 - x]
+        return x + ancho
+
+    def dibujar(self, frame, xyxy, clases, ids=None):
+        '''
+        Dibuja las cajas y etiquetas directamente sobre `frame`.
+
+        Parámetros:
+            frame (np.ndarray): Frame BGR (se modifica).
+            xyxy (np.ndarray): Coordenadas (n, 4).
+            clases (np.ndarray): Clase de cada caja.
+            ids (np.ndarray): Identificador de seguimiento de cada caja (opcional).
+
+        Retorna:
+            np.ndarray: El mismo frame.
+        '''
+        if not len(xyxy):
+            return frame
+        alto, ancho = frame.shape[:2]
+        cajas = np.rint(np.asarray(xyxy)).astype(np.int64)
+        cajas[:, [0, 2]] = np.clip(cajas[:, [0, 2]], 0, ancho - 1)
+        cajas[:, [1, 3]] = np.clip(cajas[:, [1, 3]], 0, alto - 1)
+        t = self.grosor
+        for i, ((x1, y1, x2, y2), clase) in enumerate(zip(cajas, np.asarray(clases, np.int64))):
+            clase = int(clase)
+            color = self._color(clase)
+            frame[y1:y1 + t, x1:x2 + 1] = color
+            frame[max(y1, y2 - t + 1):y2 + 1, x1:x2 + 1] = color
+            frame[y1:y2 + 1, x1:x1 + t] = color
+            frame[y1:y2 + 1, max(x1, x2 - t + 1):x2 + 1] = color
+
+            glifo = self._glifo(self.nombres.get(clase, str(clase)), clase)
+            y = y1 - glifo.shape[0] if y1 >= glifo.shape[0] else y1
+            x = self._pegar(frame, glifo, x1, y)
+            if ids is not None:
+                self._pegar(frame, self._glifo(f"#{ids[i]}", clase), x, y)
+        return frame
+
+
+def comparar_renderizado(resoluciones=((1280, 720), (1920, 1080)), cajas=10, repeticiones=50):
+    '''
+    Microbenchmark de RenderizadorDetecciones frente a result.plot() de Ultralytics.
+
+    Parámetros:
+        resoluciones (tuple): Pares (ancho, alto) a medir.
+        cajas (int): Número de detecciones sintéticas por frame.
+        repeticiones (int): Repeticiones por medición.
+
+    Retorna:
+        dict: {"ANCHOxALTO": {"plot_ms": ..., "renderizador_ms": ...}}.
+    '''
+    import torch
+    from ultralytics.engine.results import Results
+
+    rng = np.random.default_rng(0)
+    renderizador = RenderizadorDetecciones()
+    tiempos = {}
+    for ancho, alto in resoluciones:
+        frame = rng.integers(0, 256, (alto, ancho, 3), dtype=np.uint8)
+        x1 = rng.uniform(0, ancho * 0.8, cajas)
+        y1 = rng.uniform(0, alto * 0.8, cajas)
+        xyxy = np.stack([x1, y1, x1 + ancho * 0.1, y1 + alto * 0.1], axis=1).astype(np.float32)
+        clases = rng.integers(0, 3, cajas)
+        datos = np.concatenate([xyxy, rng.uniform(0.3, 1, (cajas, 1)), clases[:, None]], axis=1)
+        result = Results(frame, path="", names=NOMBRES_CLASES, boxes=torch.tensor(datos, dtype=torch.float32))
+
+        t0 = time.perf_counter()
+        for _ in range(repeticiones):
+            result.plot()
+        plot_ms = (time.perf_counter() - t0) / repeticiones * 1000
+
+        destino = frame.copy()
+        t0 = time.perf_counter()
+        for _ in range(repeticiones):
+            np.copyto(destino, frame)
+            renderizador.dibujar(destino, xyxy, clases)
+        renderizador_ms = (time.perf_counter() - t0) / repeticiones * 1000
+
+        tiempos[f"{ancho}x{alto}"] = {"plot_ms": plot_ms, "renderizador_ms": renderizador_ms}
+        registro.info("%dx%d: result.plot() %.2f ms, renderizador %.2f ms", ancho, alto, plot_ms, renderizador_ms)
+    return tiempos
+
+
+def matriz_iou(a, b):
+    '''
+    IoU entre cada caja de `a` (n, 4) y cada caja de `b` (m, 4), en formato xyxy.
+    '''
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    interseccion = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return interseccion / np.maximum(area_a[:, None] + area_b[None, :] - interseccion, 1e-6)
+
+
+def estimar_horizonte(frame, ancho_analisis=160, banda=(0.15, 0.7)):
+    '''
+    Estima la fila del horizonte en un frame de cámara vehicular.
+
+    Se busca, dentro de una banda de filas, el mayor descenso de brillo medio por fila (cielo
+    claro arriba, calzada más oscura abajo) sobre una miniatura en escala de grises. Es una
+    estimación aproximada; para una región exacta se usa un polígono en RegionInteres.
+
+    Parámetros:
+        frame (np.ndarray): Frame BGR.
+        ancho_analisis (int): Ancho de la miniatura sobre la que se calcula el perfil.
+        banda (tuple): Fracciones (mínima, máxima) del alto donde puede estar el horizonte.
+
+    Retorna:
+        int: Fila del horizonte en píxeles del frame original.
+    '''
+    alto, ancho = frame.shape[:2]
+    escala = min(1.0, ancho_analisis / ancho)
+    miniatura = cv2.resize(frame, (max(1, int(ancho * escala)), max(1, int(alto * escala))), interpolation=cv2.INTER_AREA)
+    gris = cv2.cvtColor(miniatura, cv2.COLOR_BGR2GRAY) if miniatura.ndim == 3 else miniatura
+    perfil = cv2.GaussianBlur(gris.mean(axis=1, dtype=np.float32).reshape(-1, 1), (1, 9), 0).ravel()
+    desde = int(len(perfil) * banda[0])
+    hasta = max(desde + 1, int(len(perfil) * banda[1]))
+    descenso = perfil[desde:hasta - 1] - perfil[desde + 1:hasta]
+    if len(descenso) == 0:
+        return int(alto * banda[0])
+    return int((desde + int(np.argmax(descenso)) + 1) / escala)
+
+
+class RegionInteres:
+    '''
+    Región de la calzada que se preprocesa y se envía al modelo.
+
+    La región es el rectángulo que contiene un polígono fijo o, en modo automático (sin polígono),
+    la franja entre el horizonte estimado y el capó del vehículo. Con polígono, las cajas cuyo
+    centro queda fuera de él se descartan. El rectángulo se calcula con la primera muestra del
+    video y se reutiliza en los demás frames.
+
+    Atributos:
+        poligono (np.ndarray): Vértices (n, 2) del polígono, o None para estimar el horizonte.
+        normalizado (bool): Si True, los vértices son fracciones del ancho y el alto del frame.
+        recorte_inferior (float): Fracción inferior del frame (capó) que se descarta en modo automático.
+        margen_horizonte (float): Fracción del alto que se conserva por encima del horizonte estimado.
+        rectangulo (tuple): (x0, y0, x1, y1) en píxeles una vez resuelto, o None.
+        mascara (np.ndarray): Máscara uint8 del polígono dentro del rectángulo (solo con polígono).
+    '''
+
+    def __init__(self, poligono=None, normalizado=True, recorte_inferior=0.0, margen_horizonte=0.05):
+        self.poligono = None if poligono is None else np.asarray(poligono, dtype=np.float32).reshape(-1, 2)
+        self.normalizado = normalizado
+        self.recorte_inferior = recorte_inferior
+        self.margen_horizonte = margen_horizonte
+        self.reiniciar()
+
+    def parametros(self):
+        return {
+            "poligono": None if self.poligono is None else self.poligono.tolist(),
+            "normalizado": self.normalizado,
+            "recorte_inferior": self.recorte_inferior,
+            "margen_horizonte": self.margen_horizonte,
+        }
+
+    def reiniciar(self):
+        '''
+        Olvida el rectángulo calculado (al empezar un video nuevo).
+        '''
+        self.rectangulo = None
+        self.mascara = None
+        self._forma = None
+
+    def resolver(self, frame):
+        '''
+        Calcula el rectángulo de la región para frames con la forma de `frame` (o devuelve el ya calculado).
+
+        Retorna:
+            tuple: (x0, y0, x1, y1) en píxeles.
+        '''
+        alto, ancho = frame.shape[:2]
+        if self.rectangulo is not None and self._forma == (alto, ancho):
+            return self.rectangulo
+        mascara = None
+        if self.poligono is not None:
+            puntos = self.poligono * (ancho, alto) if self.normalizado else self.poligono
+            puntos = np.round(puntos).astype(np.int32)
+            x0, y0 = np.clip(puntos.min(axis=0), 0, (ancho - 1, alto - 1))
+            x1, y1 = np.clip(puntos.max(axis=0) + 1, (x0 + 1, y0 + 1), (ancho, alto))
+            mascara = np.zeros((y1 - y0, x1 - x0), np.uint8)
+            cv2.fillPoly(mascara, [puntos - (x0, y0)], 1)
+        else:
+            x0, x1 = 0, ancho
+            y1 = max(1, int(round(alto * (1 - self.recorte_inferior))))
+            y0 = min(max(0, estimar_horizonte(frame) - int(alto * self.margen_horizonte)), y1 - 1)
+        self.mascara = mascara
+        self._forma = (alto, ancho)
+        self.rectangulo = (int(x0), int(y0), int(x1), int(y1))
+        return self.rectangulo
+
+    def filtrar(self, clases, confianzas, xyxy):
+        '''
+        Descarta las cajas (en coordenadas del frame completo) cuyo centro queda fuera del polígono.
+        '''
+        if self.mascara is None or len(xyxy) == 0:
+            return clases, confianzas, xyxy
+        x0, y0 = self.rectangulo[:2]
+        alto, ancho = self.mascara.shape
+        cx = np.clip(((xyxy[:, 0] + xyxy[:, 2]) / 2).astype(np.int64) - x0, 0, ancho - 1)
+        cy = np.clip(((xyxy[:, 1] + xyxy[:, 3]) / 2).astype(np.int64) - y0, 0, alto - 1)
+        dentro = self.mascara[cy, cx].astype(bool)
+        return clases[dentro], confianzas[dentro], xyxy[dentro]
+
+
+def dividir_mosaico(alto, ancho, tamano=1280, solape=0.2):
+    '''
+    Divide una imagen en teselas cuadradas de `tamano` píxeles que se solapan una fracción
+    `solape`; la última tesela de cada eje se alinea con el borde.
+
+    Retorna:
+        list: Rectángulos (x0, y0, x1, y1) de las teselas.
+    '''
+    def posiciones(longitud):
+        if longitud <= tamano:
+            return [(0, longitud)]
+        paso = max(1, int(tamano * (1 - solape)))
+        inicios = list(range(0, longitud - tamano, paso)) + [longitud - tamano]
+        return [(inicio, inicio + tamano) for inicio in inicios]
+
+    return [(x0, y0, x1, y1) for y0, y1 in posiciones(alto) for x0, x1 in posiciones(ancho)]
+
+
+def supresion_no_maximos(clases, confianzas, xyxy, umbral_iou=0.5):
+    '''
+    Supresión de no máximos por clase, para unir las detecciones repetidas en teselas solapadas.
+
+    Retorna:
+        tuple: (clases, confianzas, xyxy) conservados, ordenados por confianza.
+    '''
+    if len(xyxy) < 2:
+        return clases, confianzas, xyxy
+    orden = np.argsort(-confianzas, kind="stable")
+    # Desplazar cada clase a una zona distinta para que solo se supriman cajas de la misma clase
+    cajas = xyxy[orden].astype(np.float64) + clases[orden, None] * 1e6
+    iou = matriz_iou(cajas, cajas)
+    conservar = np.ones(len(orden), dtype=bool)
+    for i in range(len(orden)):
+        if conservar[i]:
+            conservar[i + 1:] &= iou[i, i + 1:] <= umbral_iou
+    orden = orden[conservar]
+    return clases[orden], confianzas[orden], xyxy[orden]
+
+
+class SeguidorDetecciones:
+    '''
+    Seguimiento ligero de detecciones entre keyframes.
+
+    En los frames intermedios, las cajas se desplazan con flujo óptico disperso (Lucas-Kanade)
+    calculado sobre una rejilla de puntos dentro de cada caja, a resolución reducida. En cada
+    keyframe, las detecciones del modelo se asocian a las pistas existentes por IoU (misma
+    clase, asignación voraz); las que no se asocian abren una pista con un identificador nuevo,
+    de modo que cada imperfección se cuenta una sola vez.
+
+    Atributos:
+        cajas (np.ndarray): Cajas (n, 4) de las pistas activas, en píxeles del frame original.
+        clases (np.ndarray): Clase de cada pista.
+        ids (np.ndarray): Identificador persistente de cada pista.
+        conteo_unico (np.ndarray): Imperfecciones distintas vistas por clase.
+    '''
+
+    def __init__(self, umbral_iou=0.3, max_perdidos=1, ancho_flujo=480, puntos_por_lado=3):
+        '''
+        Parámetros:
+            umbral_iou (float): IoU mínimo para asociar una detección a una pista.
+            max_perdidos (int): Keyframes seguidos sin detección tras los que se descarta una pista.
+            ancho_flujo (int): Ancho en píxeles al que se reduce el frame para el flujo óptico.
+            puntos_por_lado (int): Puntos de la rejilla por lado dentro de cada caja.
+        '''
+        self.umbral_iou = umbral_iou
+        self.max_perdidos = max_perdidos
+        self.ancho_flujo = ancho_flujo
+        self.puntos_por_lado = puntos_por_lado
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.cajas = np.empty((0, 4), np.float32)
+        self.clases = np.empty(0, np.int64)
+        self.ids = np.empty(0, np.int64)
+        self.perdidos = np.empty(0, np.int64)
+        self.siguiente_id = 1
+        self.conteo_unico = np.zeros(len(NOMBRES_CLASES), np.int64)
+        self._gris_anterior = None
+        self._escala = 1.0
 
-    Retorna:
-        np.ndarray: Imagen corregida con valores en rango [0, 255].
+    def estado(self):
+        '''
+        Pistas activas y contadores, serializables en JSON (para los puntos de control).
+        '''
+        return {
+            "cajas": self.cajas.tolist(),
+            "clases": self.clases.tolist(),
+            "ids": self.ids.tolist(),
+            "perdidos": self.perdidos.tolist(),
+            "siguiente_id": int(self.siguiente_id),
+            "conteo_unico": self.conteo_unico.tolist(),
+        }
+
+    def restaurar(self, estado, frame_anterior=None):
+        '''
+        Restaura las pistas de estado(). `frame_anterior` es el frame previo al punto de control:
+        sin él, el primer frame tras reanudar no desplaza las cajas con el flujo óptico.
+        '''
+        self.cajas = np.asarray(estado["cajas"], np.float32).reshape(-1, 4)
+        self.clases = np.asarray(estado["clases"], np.int64)
+        self.ids = np.asarray(estado["ids"], np.int64)
+        self.perdidos = np.asarray(estado["perdidos"], np.int64)
+        self.siguiente_id = estado["siguiente_id"]
+        self.conteo_unico = np.asarray(estado["conteo_unico"], np.int64)
+        self._gris_anterior = None if frame_anterior is None else self._gris(frame_anterior)
+
+    def _gris(self, frame):
+        alto, ancho = frame.shape[:2]
+        self._escala = min(1.0, self.ancho_flujo / ancho)
+        if self._escala < 1.0:
+            frame = cv2.resize(
+                frame, (int(ancho * self._escala), int(alto * self._escala)), interpolation=cv2.INTER_AREA
+            )
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    def propagar(self, frame):
+        '''
+        Desplaza las cajas activas hasta `frame` con flujo óptico.
+        '''
+        gris = self._gris(frame)
+        anterior, self._gris_anterior = self._gris_anterior, gris
+        if anterior is None or not len(self.cajas):
+            return
+
+        k = self.puntos_por_lado
+        t = (np.arange(k, dtype=np.float32) + 0.5) / k
+        cajas = self.cajas * self._escala
+        ancho = (cajas[:, 2] - cajas[:, 0])[:, None]
+        alto = (cajas[:, 3] - cajas[:, 1])[:, None]
+        xs = cajas[:, 0:1] + ancho * t[None, :]
+        ys = cajas[:, 1:2] + alto * t[None, :]
+        puntos = np.stack([
+            np.repeat(xs, k, axis=1), np.tile(ys, (1, k))
+        ], axis=2).reshape(-1, 1, 2).astype(np.float32)
+
+        nuevos, estado, _ = cv2.calcOpticalFlowPyrLK(
+            anterior, gris, puntos, None, winSize=(15, 15), maxLevel=2
+        )
+        desplazamiento = (nuevos - puntos).reshape(len(cajas), k * k, 2)
+        validos = estado.reshape(len(cajas), k * k).astype(bool)
+        for i in range(len(cajas)):
+            if validos[i].any():
+                dx, dy = np.median(desplazamiento[i][validos[i]], axis=0) / self._escala
+                self.cajas[i] += (dx, dy, dx, dy)
+
+        # Se descartan las pistas que salieron del cuadro
+        alto_f, ancho_f = frame.shape[:2]
+        dentro = (self.cajas[:, 2] > 0) & (self.cajas[:, 3] > 0) & (self.cajas[:, 0] < ancho_f) & (self.cajas[:, 1] < alto_f)
+        self._filtrar(dentro)
+
+    def _filtrar(self, mascara):
+        self.cajas = self.cajas[mascara]
+        self.clases = self.clases[mascara]
+        self.ids = self.ids[mascara]
+        self.perdidos = self.perdidos[mascara]
+
+    def actualizar(self, frame, xyxy, clases):
+        '''
+        Asocia las detecciones de un keyframe a las pistas.
+
+        Parámetros:
+            frame (np.ndarray): Keyframe BGR.
+            xyxy (np.ndarray): Cajas detectadas (n, 4).
+            clases (np.ndarray): Clase de cada detección.
+
+        Retorna:
+            tuple: (ids de cada detección, imperfecciones nuevas por clase).
+        '''
+        self.propagar(frame)
+        xyxy = np.asarray(xyxy, np.float32).reshape(-1, 4)
+        clases = np.asarray(clases, np.int64)
+        iou = matriz_iou(self.cajas, xyxy)
+        iou[self.clases[:, None] != clases[None, :]] = 0
+
+        ids = np.zeros(len(xyxy), np.int64)
+        asociada = np.zeros(len(self.cajas), bool)
+        for idx in np.argsort(-iou, axis=None):
+            p, d = np.unravel_index(idx, iou.shape)
+            if iou[p, d] < self.umbral_iou:
+                break
+            if asociada[p] or ids[d]:
+                continue
+            asociada[p] = True
+            ids[d] = self.ids[p]
+            self.cajas[p] = xyxy[d]
+            self.perdidos[p] = 0
+
+        self.perdidos[~asociada] += 1
+        self._filtrar(self.perdidos <= self.max_perdidos)
+
+        nuevas = np.flatnonzero(ids == 0)
+        ids[nuevas] = np.arange(self.siguiente_id, self.siguiente_id + len(nuevas))
+        self.siguiente_id += len(nuevas)
+        self.cajas = np.concatenate([self.cajas, xyxy[nuevas]])
+        self.clases = np.concatenate([self.clases, clases[nuevas]])
+        self.ids = np.concatenate([self.ids, ids[nuevas]])
+        self.perdidos = np.concatenate([self.perdidos, np.zeros(len(nuevas), np.int64)])
+
+        clases_nuevas = clases[nuevas]
+        nuevos = np.bincount(clases_nuevas[(clases_nuevas >= 0) & (clases_nuevas < len(NOMBRES_CLASES))],
+                             minlength=len(NOMBRES_CLASES))
+        self.conteo_unico += nuevos
+        return ids, nuevos
+
+
+class RegistroModelos:
     '''
-    if image.dtype != np.float32:
-        image = img_as_float(image)
-    corrected = np.zeros_like(image)
-    for c in range(3):  # RGB
-        fondo = gaussian_filter(image[:, :, c], sigma=sigma)
-        corrected[:, :, c] = np.clip((image[:, :, c] - fondo) + np.mean(fondo), 0, 1)
-    return (corrected * 255).astype(np.uint8)
+    Registro de modelos YOLO a nivel de proceso. Cada archivo de pesos se carga una sola vez
+    (opcionalmente con una inferencia de calentamiento) y el mismo modelo se comparte entre
+    ejecuciones y entre instancias de PavementProcessor. Como el predictor de Ultralytics no
+    es seguro entre hilos, cada modelo tiene un candado que se toma al inferir.
+
+    Atributos:
+        latencias (dict): Por ruta de pesos, segundos de carga y de calentamiento del arranque en frío.
+    '''
+
+    _modelos = {}
+    _bloqueo = threading.Lock()
+    latencias = {}
+
+    @classmethod
+    def obtener(cls, model_path, calentar=True):
+        '''
+        Retorna el modelo registrado para `model_path`, cargándolo si es necesario.
+
+        Parámetros:
+            model_path (str): Ruta al archivo del modelo YOLO entrenado.
+            calentar (bool): Si True, ejecuta una inferencia sobre un frame vacío al cargar.
+
+        Retorna:
+            tuple: (modelo, candado del modelo, True si fue un arranque en frío).
+        '''
+        clave = os.path.abspath(model_path)
+        with cls._bloqueo:
+            if clave in cls._modelos:
+                modelo, bloqueo = cls._modelos[clave]
+                return modelo, bloqueo, False
+
+            from ultralytics import YOLO
+
+            t0 = time.perf_counter()
+            modelo = YOLO(model_path, task="detect")
+            carga = time.perf_counter() - t0
+            calentamiento = 0.0
+            if calentar:
+                t0 = time.perf_counter()
+                modelo(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+                calentamiento = time.perf_counter() - t0
+            cls.latencias[clave] = {"carga_s": carga, "calentamiento_s": calentamiento}
+            cls._modelos[clave] = (modelo, threading.Lock())
+            return modelo, cls._modelos[clave][1], True
+
+    @classmethod
+    def registrar(cls, model_path, modelo):
+        '''
+        Registra un modelo ya construido bajo `model_path`, de modo que los PavementProcessor
+        creados con esa ruta lo usen sin cargar pesos (p. ej. el detector simulado de benchmark.py).
+        Cualquier objeto invocable como el modelo de Ultralytics sirve (ver extraer_cajas).
+        '''
+        clave = os.path.abspath(model_path)
+        with cls._bloqueo:
+            cls.latencias[clave] = {"carga_s": 0.0, "calentamiento_s": 0.0}
+            cls._modelos[clave] = (modelo, threading.Lock())
+
+    @classmethod
+    def precargar(cls, model_path, calentar=True):
+        '''
+        Carga el modelo en un hilo en segundo plano (p. ej. al abrir la interfaz).
+
+        Retorna:
+            threading.Thread: Hilo de carga.
+        '''
+        hilo = threading.Thread(target=cls.obtener, args=(model_path, calentar), daemon=True)
+        hilo.start()
+        return hilo
+
+    @classmethod
+    def liberar(cls, model_path=None):
+        '''
+        Quita del registro un modelo (o todos si model_path es None).
+        '''
+        with cls._bloqueo:
+            if model_path is None:
+                cls._modelos.clear()
+            else:
+                cls._modelos.pop(os.path.abspath(model_path), None)
+
+
+# Ruta por defecto de los pesos entrenados
+RUTA_MODELO = r"C:\Users\jose1\OneDrive\Documentos\interfaz_mejoradas\best.pt"
+
+# Procesadores vivos; un único manejador de atexit guarda sus resultados al cerrar
+_PROCESADORES = weakref.WeakSet()
+
+
+def _guardar_al_salir():
+    for procesador in list(_PROCESADORES):
+        procesador.guardar_resultados_excel()
+
+
+atexit.register(_guardar_al_salir)
+
+
+# Marca de fin de flujo entre las etapas del pipeline
+_FIN_PIPELINE = object()
 
 
 class PavementProcessor:
@@ -54,181 +1411,1158 @@ class PavementProcessor:
     y guardar los resultados en un archivo Excel y un video de salida.
 
     Atributos:
-        model (YOLO): Modelo cargado de YOLOv8.
-        resultados_inferencia (list): Lista que almacena resultados detectados (minuto, segundo, conteo).
+        model (YOLO): Modelo cargado de YOLOv8, compartido a través de RegistroModelos.
+        motor (str): Motor de inferencia ("pytorch", "onnx" u "onnx_int8", ver motores_inferencia).
+        model_path (str): Archivo del modelo que usa el motor (best.pt, best.onnx o best_int8.onnx).
+        latencias_arranque (dict): Tipo de arranque (frío/caliente), tiempo para obtener el modelo
+            y tiempo hasta el primer frame procesado de la última ejecución.
+        detecciones (AlmacenDetecciones): Almacén columnar de las muestras con detecciones (y sus cajas)
+            de la última ejecución; cada ejecución sin reanudar empieza con uno vacío.
         ruta_excel (str): Ruta del archivo Excel donde se guardarán los resultados.
-        df_writer (pd.DataFrame): DataFrame que mantiene resultados acumulados en memoria.
-        excel_writer: Escritor de Excel (pandas) para exportar datos.
+        formato_sumidero (str): Formato del sumidero donde se agrega cada detección (ver almacenamiento).
+        sumidero (SumideroResultados): Sumidero de la ejecución en curso (se abre en la primera detección), o None.
+        modo_flatfield (str): Modo de preprocesado ("exacto", "rapido" o "incremental").
+        tolerancia_flatfield (int): Error máximo admitido (niveles de gris) del modo rápido.
+        pool (PoolBuffers): Buffers reutilizados por la decodificación y el preprocesado.
+        roi (RegionInteres): Región de la calzada que se preprocesa e infiere, o None (frame completo).
+        tamano_mosaico (int): Lado de las teselas de inferencia en píxeles, o None (sin mosaico).
+        solape_mosaico (float): Fracción de solape entre teselas.
+        estadisticas_memoria (dict): Pico de memoria residente y uso del pool de la última ejecución.
+        cache (CacheInferencia): Caché en disco de las detecciones por frame, o None.
+        estadisticas_cache (dict): Frames servidos desde la caché y frames inferidos en la última ejecución.
+        metricas (MetricasEtapas): Tiempos por etapa de la ejecución en curso (MetricasNulas si no se instrumenta).
+        reporte_metricas (dict): Resumen de las métricas de la última ejecución instrumentada.
+        estadisticas_en_vivo (dict): Frames capturados, procesados y descartados, y latencias de
+            la última ejecución de procesar_en_vivo.
+        emisor (FlujoEventos): Destino de los eventos de la ejecución en curso (ver eventos()), o None.
+        base_detecciones (BaseDetecciones): Base donde se guardan las detecciones de cada video procesado, o None.
     '''
 
-    def __init__(self, model_path=r"C:\Users\jose1\OneDrive\Documentos\interfaz_mejoradas\best.pt"):
+    def __init__(self, model_path=RUTA_MODELO,
+                 modo_flatfield="exacto", tolerancia_flatfield=2, formato_sumidero="csv",
+                 guardar_cajas=True, calentar=True, ruta_excel=None, roi=None, tamano_mosaico=None,
+                 solape_mosaico=0.2, cache=None, instrumentar=False, motor="pytorch",
+                 base_detecciones=None):
         '''
         Constructor de la clase PavementProcessor.
 
         Parámetros:
             model_path (str): Ruta al archivo del modelo YOLO entrenado.
+            modo_flatfield (str): "exacto" (implementación original), "rapido" (fondo estimado a
+                baja resolución) o "incremental" (fondo reutilizado entre frames muestreados, ver
+                FlatFieldIncremental). Los dos últimos son opcionales y se validan contra el exacto.
+            tolerancia_flatfield (int): Error máximo frente a la implementación exacta. Se verifica
+                sobre el primer frame muestreado de cada video y, si se supera, ese video se procesa
+                en modo exacto. None desactiva la verificación.
+            formato_sumidero (str): "csv", "jsonl", "sqlite" o "parquet". Las detecciones se agregan
+                a este archivo durante el procesamiento (copia en disco que sobrevive a un cierre
+                inesperado, ver exportar_excel_desde_sumidero); el Excel se genera al final desde el
+                almacén en memoria, con las mismas filas.
+            guardar_cajas (bool): Si True, el almacén en memoria conserva coordenadas y confianza de cada caja.
+            calentar (bool): Si el modelo aún no está en RegistroModelos, ejecuta una inferencia de
+                calentamiento al cargarlo.
+            ruta_excel (str): Ruta del Excel de resultados. None usa resultados_de_inferencia.xlsx
+                en el directorio actual.
+            roi (RegionInteres): Solo esta región se preprocesa y se envía al modelo; las cajas se
+                devuelven en coordenadas del frame completo. "horizonte" equivale a RegionInteres()
+                (franja bajo el horizonte estimado). None procesa el frame completo.
+            tamano_mosaico (int): Si se indica, la región se divide en teselas de este lado (en
+                píxeles del video) que se infieren en un mismo lote y se unen con supresión de no
+                máximos. Para fuentes 4K, permite detectar grietas finas sin reducir todo el frame
+                al tamaño de entrada del modelo.
+            solape_mosaico (float): Fracción de solape entre teselas vecinas.
+            cache (CacheInferencia): Si se indica, procesar_video lee de ella las detecciones de los
+                frames ya inferidos con el mismo video, pesos y parámetros (ver _parametros_cache)
+                y guarda las nuevas.
+            instrumentar (bool): Mide el tiempo de cada etapa (decodificación, preprocesado,
+                inferencia, dibujo, escritura, registro, interfaz), la profundidad de las colas del
+                pipeline y los frames por segundo. El callback recibe además metricas=self.metricas
+                y, al terminar, el resumen se guarda en <ruta_excel sin extensión>_metricas.json.
+                Desactivado, cada etapa cuesta dos llamadas vacías.
+            motor (str): "pytorch" usa model_path directamente; "onnx" lo exporta a ONNX (si hace
+                falta) y lo ejecuta con ONNX Runtime en CPU; "onnx_int8" usa la versión cuantizada,
+                que debe haberse generado antes con preparar_motor (requiere frames de calibración).
+            base_detecciones (BaseDetecciones): Si se indica, al terminar procesar_video (sin
+                cancelar) las cajas y conteos del intervalo procesado se guardan en ella,
+                reemplazando los de una ejecución anterior del mismo intervalo.
         '''
-        self.model = YOLO(model_path)
-        self.resultados_inferencia = []  # Mantener los resultados en memoria
-        self.ruta_excel = os.path.join(os.getcwd(), "resultados_de_inferencia.xlsx")  # Usar el directorio actual
-        self.df_writer = None  # El escritor de pandas para Excel
-        self.excel_writer = None  # El writer para pandas, que se mantiene abierto
-        # Registrar función de cierre para guardar los resultados si el programa se cierra inesperadamente
-        atexit.register(self.guardar_resultados_excel)
+        t0 = time.perf_counter()
+        model_path = preparar_motor(model_path, motor)
+        self.model, self._bloqueo_modelo, arranque_frio = RegistroModelos.obtener(model_path, calentar=calentar)
+        self.motor = motor
+        self.model_path = model_path
+        # Latencias de arranque: modelo_s es lo que tardó obtener el modelo en este constructor
+        # y primer_frame_s (en procesar_video) el tiempo hasta publicar la primera muestra.
+        self.latencias_arranque = {
+            "arranque": "frio" if arranque_frio else "caliente",
+            "modelo_s": time.perf_counter() - t0,
+            "primer_frame_s": None,
+        }
+        self.modo_flatfield = modo_flatfield
+        self._modo_flatfield_configurado = modo_flatfield
+        self.tolerancia_flatfield = tolerancia_flatfield
+        self._flatfield_verificado = False
+        self.pool = PoolBuffers()
+        self.estadisticas_memoria = {}
+        self.flatfield_incremental = FlatFieldIncremental(pool=self.pool)
+        self._bloqueo_flatfield = threading.Lock()
+        self.seguidor = SeguidorDetecciones()
+        self.renderizador = RenderizadorDetecciones()
+        self.roi = RegionInteres() if roi == "horizonte" else roi
+        self.tamano_mosaico = tamano_mosaico
+        self.solape_mosaico = solape_mosaico
+        self.cache = cache
+        self.estadisticas_cache = {}
+        self.base_detecciones = base_detecciones
+        self.metricas = MetricasEtapas() if instrumentar else MetricasNulas()
+        self.reporte_metricas = None
+        self.estadisticas_en_vivo = {}
+        self.emisor = None
+        self._clave_cache = None
+        self._cajas_cache = {}
+        self._cancelado = threading.Event()
+        self._ejecucion_programada = False
+        self.detecciones = AlmacenDetecciones(guardar_cajas=guardar_cajas)  # Resultados en memoria
+        if ruta_excel is None:
+            ruta_excel = os.path.join(os.getcwd(), "resultados_de_inferencia.xlsx")  # Usar el directorio actual
+        self.ruta_excel = ruta_excel
+        self.formato_sumidero = formato_sumidero
+        self.sumidero = None  # Se abre con la primera detección de cada ejecución y se cierra al terminar
+        # Guardar los resultados si el programa se cierra inesperadamente (ver _guardar_al_salir)
+        _PROCESADORES.add(self)
 
-    def procesar_video(self, video_path, output_path, inicio_min=0, fin_min=0, todo=True, callback=None):
+    def procesar_video(self, video_path, output_path, inicio_min=0, fin_min=0, todo=True, callback=None,
+                       paso=20, alinear_keyframe=True, tamano_lote=1, paralelo=False, hilos_preprocesado=2,
+                       tamano_cola=8, inicio_frame=None, fin_frame=None, origen_frame=None,
+                       muestreador=None, seguimiento=False, dibujar_cada_frame=False, punto_control=None,
+                       intervalo_punto_control=60.0, reanudar=False):
         """
         Procesa un video con YOLOv8 y guarda los resultados en video y Excel.
 
         Parámetros:
             video_path (str): Ruta del video de entrada.
-            output_path (str): Ruta del video de salida con inferencias dibujadas.
+            output_path (str): Ruta del video de salida con inferencias dibujadas. None genera solo el reporte.
             inicio_min (int): Minuto de inicio de análisis.
             fin_min (int): Minuto final de análisis.
             todo (bool): Si True, procesa todo el video. Si False, procesa solo el intervalo.
             callback (function): Función de retorno para actualizar interfaz (frame, progreso, conteos).
+                Los frames que recibe pertenecen al pool de buffers y solo son válidos durante la
+                llamada; si se guardan para después, deben copiarse. Con instrumentación, recibe
+                también el argumento metricas (MetricasEtapas).
+            paso (int): Se infiere un frame de cada `paso` (si no se pasa un muestreador).
+            alinear_keyframe (bool): Busca el inicio del intervalo con el seek del contenedor (ver LectorMuestreado).
+            tamano_lote (int): Número de frames muestreados que se envían juntos al modelo.
+            paralelo (bool): Ejecuta decodificación, preprocesado, inferencia y escritura como etapas
+                concurrentes (ver _procesar_en_pipeline).
+            hilos_preprocesado (int): Hilos de la etapa de preprocesado en modo paralelo.
+            tamano_cola (int): Capacidad de las colas entre etapas en modo paralelo.
+            inicio_frame (int): Primer frame a procesar. Si se indica, reemplaza a inicio_min/fin_min/todo.
+            fin_frame (int): Frame final (excluido) cuando se usa inicio_frame.
+            origen_frame (int): Frame desde el que se cuenta la fase del muestreo. None usa el inicio;
+                los fragmentos de un mismo video comparten el origen del intervalo completo.
+            muestreador: Política de muestreo (MuestreadorFijo o MuestreadorAdaptativo). None usa
+                MuestreadorFijo(paso). Con procesamiento por lotes o en pipeline, el muestreador
+                adaptativo recibe las detecciones con el retraso de las muestras en vuelo.
+            seguimiento (bool): Infiere solo en las muestras (keyframes) y propaga las cajas a los
+                frames intermedios con SeguidorDetecciones. Cada imperfección se cuenta una vez y el
+                video de salida se dibuja sobre cada frame. Se ejecuta en serie (ignora tamano_lote
+                y paralelo).
+            dibujar_cada_frame (bool): Decodifica todos los frames y dibuja las últimas detecciones
+                sobre cada uno, en lugar de repetir el último frame inferido. Se ejecuta en serie.
+            punto_control (str): Ruta del JSON de puntos de control. Si se indica, cada
+                intervalo_punto_control segundos se guardan el frame hasta el que está todo escrito,
+                las detecciones y el estado del muestreador (y del seguidor), y el video de salida se
+                escribe en segmentos (carpeta <salida>_segmentos) que se cierran en cada punto. Al
+                terminar, los segmentos se unen en output_path y el punto de control se elimina.
+            intervalo_punto_control (float): Segundos entre puntos de control.
+            reanudar (bool): Si existe el punto de control, continúa desde él: busca el frame
+                guardado, recupera detecciones y estado, y escribe a partir de un segmento nuevo.
+                El punto de control debe corresponder al mismo video, intervalo y muestreo; si no,
+                se lanza PuntoControlIncompatible antes de abrir la salida.
 
         Retorna:
             str: Ruta del video de salida generado.
         """
+        self._iniciar_ejecucion()
+        self.flatfield_incremental.reiniciar()
+        if self.roi is not None:
+            self.roi.reiniciar()
+        self._t_inicio = time.perf_counter()
+        self.latencias_arranque["primer_frame_s"] = None
+        self.metricas.reiniciar()
+        # El modo configurado se vuelve a verificar en cada video (la iluminación cambia entre videos)
+        self.modo_flatfield, self._flatfield_verificado = self._modo_flatfield_configurado, False
+
         cap = cv2.VideoCapture(video_path)
         fps = int(cap.get(cv2.CAP_PROP_FPS))
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
+        # Intervalo de tiempo
+        if inicio_frame is not None:
+            inicio, fin = inicio_frame, fin_frame
+        else:
+            inicio, fin = calcular_intervalo(cap, inicio_min, fin_min, todo)
+        origen = inicio if origen_frame is None else origen_frame
+        total_frames = max(1, fin - inicio)
+        inicio_progreso = inicio
+        if muestreador is None:
+            muestreador = MuestreadorFijo(paso)
+
+        # Punto de control: el trabajo (video, intervalo, muestreo y modo) debe coincidir para reanudar
+        self._punto_control, reanudado = None, None
+        if punto_control:
+            self._punto_control = PuntoControl(punto_control, intervalo_punto_control)
+            self._trabajo = json.loads(json.dumps({
+                "video": huella_archivo(video_path, completo=False),
+                "inicio": inicio, "fin": fin, "origen": origen,
+                "muestreo": muestreador.parametros(),
+                "seguimiento": bool(seguimiento), "dibujar_cada_frame": bool(dibujar_cada_frame),
+                "video_salida": bool(output_path),
+            }))
+            if reanudar:
+                reanudado = self._punto_control.cargar()
+        if reanudado is not None:
+            estado, detecciones = reanudado
+            if estado["trabajo"] != self._trabajo:
+                cap.release()
+                raise PuntoControlIncompatible(
+                    f"El punto de control {punto_control} corresponde a otro video o configuración"
+                )
+            self.detecciones = detecciones
+            inicio = estado["siguiente"]
+            self.modo_flatfield = estado["modo_flatfield"]
+            self._flatfield_verificado = True
+            self._reiniciar_sumidero()
+            registro.info("Reanudando desde el frame %d (%d muestras con detecciones)", inicio, len(self.detecciones))
+        else:
+            self._reiniciar_resultados()
+
         # Salida del video
-        out = cv2.VideoWriter(
-            output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height)
+        out = None
+        if output_path and self._punto_control is not None:
+            out = EscritorSegmentado(
+                os.path.splitext(output_path)[0] + "_segmentos", fps, (width, height),
+                segmentos=estado["segmentos"] if reanudado is not None else None,
+            )
+        elif output_path:
+            out = cv2.VideoWriter(
+                output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height)
+            )
+
+        lector = LectorMuestreado(
+            cap, inicio, fin, paso=paso, alinear_keyframe=alinear_keyframe, origen=origen,
+            muestreador=muestreador, pool=self.pool,
         )
+        self._estado_seguidor = None
+        if reanudado is not None:
+            lector.muestreador.restaurar(estado["muestreador"])
+            if estado["seguidor"] is not None:
+                # El flujo óptico hasta el primer frame reanudado parte del frame anterior
+                self._estado_seguidor = (estado["seguidor"], self._leer_frame(video_path, inicio - 1))
+        self._seguimiento = seguimiento
+        self.lector = lector
+        self._escritura_pendiente = None
+        # Sin video de salida ni interfaz, las muestras que están en la caché no se preprocesan
+        # (el modo incremental sí, porque cada fondo depende de los frames anteriores)
+        self._necesita_imagen = out is not None or self._quiere_frames(callback) or self.modo_flatfield == "incremental"
+        self._clave_cache, self._cajas_cache = None, {}
+        self.estadisticas_cache = {"aciertos": 0, "inferidos": 0}
+        if self.cache is not None:
+            # La verificación del flat-field puede pasar al modo exacto; se hace antes de construir
+            # la clave para que las detecciones se guarden con el modo que realmente se usa
+            self._verificar_flatfield_en(video_path, inicio)
+            self._clave_cache, descripcion = self.cache.clave(
+                video_path, self.model_path, self._parametros_cache(lector.muestreador)
+            )
+            self._cajas_cache = self.cache.cargar(self._clave_cache, inicio, fin, descripcion)
 
-        # Intervalo de tiempo
-        if todo:
-            inicio = 0
-            fin = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Solo se decodifican los frames muestreados; el video de salida repite el último
+        # frame inferido hasta la siguiente muestra, igual que antes.
+        try:
+            if seguimiento or dibujar_cada_frame:
+                self._procesar_cuadro_a_cuadro(lector, inicio_progreso, total_frames, callback, out, seguimiento)
+            elif paralelo:
+                self._procesar_en_pipeline(
+                    lector, inicio_progreso, total_frames, callback, out, tamano_lote, hilos_preprocesado,
+                    tamano_cola,
+                )
+            else:
+                lote = []
+                t = self.metricas.tiempo()
+                for muestra in lector:
+                    self.metricas.registrar("decodificacion", t)
+                    if self._cancelado.is_set():
+                        break
+                    muestra.cajas = self._cajas_cache.get(muestra.indice)
+                    if muestra.cajas is None or self._necesita_imagen:
+                        muestra.frame_proc = self.preprocesar(muestra.frame)
+                    lote.append(muestra)
+                    if len(lote) >= tamano_lote:
+                        self._procesar_lote(lote, inicio_progreso, total_frames, callback, out)
+                        lote = []
+                    t = self.metricas.tiempo()
+                if lote and not self._cancelado.is_set():
+                    self._procesar_lote(lote, inicio_progreso, total_frames, callback, out)
+            self._escribir_pendiente(out)
+        finally:
+            cap.release()
+            if out is not None:
+                out.release()
+            self.estadisticas_memoria = {"pico_rss_mb": pico_rss_mb(), **self.pool.estadisticas()}
+            self._cerrar_sumidero()
+            if self.cache is not None:
+                self.cache.recortar(conservar=self._clave_cache)
+
+        # Al finalizar, guardar los resultados si no se ha cerrado el programa inesperadamente
+        if len(self.detecciones):
+            self.guardar_resultados_excel()
+
+        # Si terminó (sin cancelar), unir los segmentos y descartar el punto de control;
+        # tras una cancelación se conserva para poder reanudar
+        if self._punto_control is not None and not self._cancelado.is_set():
+            if isinstance(out, EscritorSegmentado):
+                out.unir(output_path)
+            self._punto_control.eliminar()
+
+        if self.base_detecciones is not None and not self._cancelado.is_set():
+            self.base_detecciones.ingresar(video_path, self.detecciones, inicio_progreso, fin, modelo=self.model_path)
+
+        self.metricas.terminar()
+        if self.metricas.activo:
+            self.reporte_metricas = self.metricas.resumen()
+            self.metricas.guardar_json(os.path.splitext(self.ruta_excel)[0] + "_metricas.json")
+            registro.info("Tiempos por etapa:\n%s", self.metricas.tabla())
+
+        return output_path
+
+    def procesar_en_vivo(self, fuente, output_path=None, callback=None, latencia_maxima=0.5, tamano_cola=2,
+                         ritmo_nativo=None, duracion_maxima=None):
+        """
+        Procesa una fuente en vivo (cámara del vehículo, tubería con nombre o URL) sin conocer su
+        duración. Un hilo captura los frames en una cola acotada (ver CapturaEnVivo) y este hilo
+        infiere el más antiguo que todavía puede publicarse dentro de `latencia_maxima`; los más
+        viejos se descartan en lugar de acumular retraso. El frame más reciente siempre se
+        procesa, aunque su latencia supere el límite (se cuenta como excedido).
+
+        Las marcas de tiempo del reporte son el tiempo transcurrido desde el inicio de la captura.
+        Termina al agotarse la fuente, al pasar duracion_maxima o con cancelar().
+
+        Parámetros:
+            fuente (int | str): Índice o ruta del dispositivo, tubería con nombre, URL o archivo.
+            output_path (str): Video de salida con las detecciones (cada frame inferido se repite
+                hasta el siguiente, así que dura lo mismo que la captura). None no lo genera.
+            callback (function): Igual que en procesar_video; el progreso es 0 (o la fracción de
+                duracion_maxima transcurrida, si se indica).
+            latencia_maxima (float): Segundos máximos entre la captura de un frame y la publicación
+                de sus detecciones.
+            tamano_cola (int): Frames en espera entre la captura y la inferencia.
+            ritmo_nativo (bool): Lee la fuente al ritmo de su fps. None lo activa para archivos
+                regulares (sustituto local de la cámara); los dispositivos y tuberías ya entregan
+                los frames a su ritmo.
+            duracion_maxima (float): Segundos de captura tras los que se detiene, o None.
+
+        Retorna:
+            dict: estadisticas_en_vivo (frames capturados, procesados, descartados en la cola y
+            por latencia, publicaciones que excedieron la latencia y latencias p50/p95/máxima en ms).
+        """
+        self._iniciar_ejecucion()
+        self._t_inicio = time.perf_counter()
+        self.latencias_arranque["primer_frame_s"] = None
+        self.metricas.reiniciar()
+        # Como en procesar_video, el modo configurado se verifica de nuevo en cada ejecución
+        self.modo_flatfield, self._flatfield_verificado = self._modo_flatfield_configurado, False
+        if ritmo_nativo is None:
+            ritmo_nativo = isinstance(fuente, str) and os.path.isfile(fuente)
+
+        cap = cv2.VideoCapture(fuente)
+        if not cap.isOpened():
+            raise ValueError(f"No se pudo abrir la fuente {fuente}")
+        captura = CapturaEnVivo(cap, tamano_cola, ritmo_nativo, pool=self.pool)
+        total_frames = int(duracion_maxima * captura.fps) if duracion_maxima else None
+
+        self._reiniciar_resultados()
+        self._punto_control = None
+        self._seguimiento = False
+        self._estado_seguidor = None
+        self.lector = captura
+        self._escritura_pendiente = None
+        self._clave_cache, self._cajas_cache = None, {}
+        self.estadisticas_cache = {"aciertos": 0, "inferidos": 0}
+        latencias = deque(maxlen=10000)  # Ventana para los percentiles en capturas sin fin
+        descartados_latencia = excedidos = procesados = 0
+        latencia_max = 0.0
+        duracion_proceso = 0.0  # Promedio móvil del tiempo de preprocesado + inferencia + publicación
+
+        out = None
+        captura.iniciar()
+        try:
+            while not self._cancelado.is_set():
+                if duracion_maxima and time.perf_counter() - captura.t0 >= duracion_maxima:
+                    break
+                muestra, en_cola = captura.siguiente()
+                if muestra is None:
+                    if captura.terminado:
+                        break
+                    continue
+                # Si hay frames más recientes y este ya no alcanza a publicarse a tiempo, se descarta
+                if en_cola and time.perf_counter() - muestra.t_captura + duracion_proceso > latencia_maxima:
+                    self.pool.devolver(muestra.frame)
+                    descartados_latencia += 1
+                    continue
+
+                t0 = time.perf_counter()
+                if output_path and out is None:
+                    alto, ancho = muestra.frame.shape[:2]
+                    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), captura.fps, (ancho, alto))
+                muestra.frame_proc = self.preprocesar(muestra.frame)
+                cajas = self.detectar_muestras([muestra])[0]
+                if self._escritura_pendiente is not None:
+                    anterior = self._escritura_pendiente[1]
+                    anterior.repeticiones = muestra.indice - anterior.indice
+                self._publicar_resultado(muestra, cajas, 0, total_frames, callback, out)
+
+                ahora = time.perf_counter()
+                latencia = ahora - muestra.t_captura
+                self.metricas.registrar("latencia", muestra.t_captura)
+                latencias.append(latencia)
+                latencia_max = max(latencia_max, latencia)
+                excedidos += latencia > latencia_maxima
+                procesados += 1
+                duracion_proceso = ahora - t0 if procesados == 1 else 0.8 * duracion_proceso + 0.2 * (ahora - t0)
+            if self._escritura_pendiente is not None:
+                anterior = self._escritura_pendiente[1]
+                anterior.repeticiones = max(1, captura.capturados - anterior.indice)
+            self._escribir_pendiente(out)
+        finally:
+            captura.detener()
+            cap.release()
+            if out is not None:
+                out.release()
+            self.estadisticas_memoria = {"pico_rss_mb": pico_rss_mb(), **self.pool.estadisticas()}
+            self._cerrar_sumidero()
+
+        if len(self.detecciones):
+            self.guardar_resultados_excel()
+
+        ventana = np.asarray(latencias, dtype=np.float64) * 1000.0
+        self.estadisticas_en_vivo = {
+            "capturados": captura.capturados,
+            "procesados": procesados,
+            "descartados_cola": captura.descartados,
+            "descartados_latencia": descartados_latencia,
+            "latencia_excedida": excedidos,
+            "latencia_p50_ms": float(np.percentile(ventana, 50)) if len(ventana) else None,
+            "latencia_p95_ms": float(np.percentile(ventana, 95)) if len(ventana) else None,
+            "latencia_max_ms": latencia_max * 1000.0,
+        }
+        registro.info(
+            "En vivo: %d de %d frames procesados, %d descartados, latencia p95 %.0f ms (máxima %.0f ms)",
+            procesados, captura.capturados, captura.descartados + descartados_latencia,
+            self.estadisticas_en_vivo["latencia_p95_ms"] or 0, latencia_max * 1000,
+        )
+
+        self.metricas.terminar()
+        if self.metricas.activo:
+            self.reporte_metricas = dict(self.metricas.resumen(), en_vivo=self.estadisticas_en_vivo)
+            with open(os.path.splitext(self.ruta_excel)[0] + "_metricas.json", "w", encoding="utf-8") as f:
+                json.dump(self.reporte_metricas, f, indent=2, ensure_ascii=False)
+            registro.info("Tiempos por etapa:\n%s", self.metricas.tabla())
+        return self.estadisticas_en_vivo
+
+    def eventos(self, *args, tipos=None, politica="bloquear", capacidad=64, **kwargs):
+        """
+        Ejecuta procesar_video en un hilo y retorna una suscripción a sus eventos, que se
+        recorre con for o con async for (ver eventos.Suscripcion). Dejar de iterar cancela el
+        procesamiento. Para varias suscripciones con políticas distintas, usar FlujoEventos.
+
+        Parámetros:
+            *args, **kwargs: Argumentos de procesar_video (sin callback). en_vivo=True usa
+                procesar_en_vivo; tamano_vista y fps_vista configuran la vista previa.
+            tipos (tuple): Tipos de evento ("deteccion", "progreso", "vista_previa",
+                "finalizado"). None recibe todos.
+            politica (str): "bloquear", "descartar_antiguos", "descartar_nuevos" o "ultimo".
+            capacidad (int): Eventos que caben en el buffer de la suscripción.
+
+        Retorna:
+            Suscripcion: Eventos tipados (EventoDeteccion, EventoProgreso, EventoVistaPrevia, EventoFinalizado).
+        """
+        flujo = FlujoEventos(self, *args, **kwargs)
+        suscripcion = flujo.suscribir(tipos, politica, capacidad)
+        flujo.iniciar()
+        return suscripcion
+
+    def inferir(self, frames):
+        """
+        Ejecuta el modelo sobre una lista de frames preprocesados en una sola llamada.
+
+        Parámetros:
+            frames (list): Frames preprocesados (np.ndarray).
+
+        Retorna:
+            list: Un resultado de Ultralytics por frame, en el mismo orden.
+        """
+        with self._bloqueo_modelo:
+            if len(frames) == 1:
+                return self.model(frames[0])
+            return self.model(frames)
+
+    def _parametros_cache(self, muestreador):
+        """
+        Parámetros que determinan las detecciones de un frame, para la clave de la caché.
+        El muestreo solo se incluye en el modo incremental, donde el fondo de cada frame depende
+        de las muestras anteriores; en los demás modos, intervalos y pasos distintos comparten
+        los frames comunes.
+        """
+        parametros = {
+            "modo_flatfield": self.modo_flatfield,
+            "tolerancia_flatfield": self.tolerancia_flatfield,
+            "roi": None if self.roi is None else self.roi.parametros(),
+            "tamano_mosaico": self.tamano_mosaico,
+            "solape_mosaico": self.solape_mosaico if self.tamano_mosaico else None,
+        }
+        if self.modo_flatfield == "incremental":
+            parametros["muestreo"] = muestreador.parametros()
+        return parametros
+
+    def detectar_muestras(self, muestras):
+        """
+        Completa las cajas de las muestras que no estaban en la caché con una sola llamada a
+        detectar y guarda las nuevas en la caché.
+
+        Parámetros:
+            muestras (list): Muestras con cajas (leídas de la caché) o con frame_proc.
+
+        Retorna:
+            list: Las cajas de cada muestra, en orden.
+        """
+        pendientes = [muestra for muestra in muestras if muestra.cajas is None]
+        if pendientes:
+            for muestra, cajas in zip(pendientes, self.detectar([muestra.frame_proc for muestra in pendientes])):
+                muestra.cajas = cajas
+                if self._clave_cache is not None:
+                    self.cache.guardar(self._clave_cache, muestra.indice, cajas)
+        self.estadisticas_cache["aciertos"] += len(muestras) - len(pendientes)
+        self.estadisticas_cache["inferidos"] += len(pendientes)
+        return [muestra.cajas for muestra in muestras]
+
+    def _entradas_modelo(self, frame_proc):
+        """
+        Recorta de un frame preprocesado las imágenes que se envían al modelo: la región de
+        interés completa o sus teselas.
+
+        Retorna:
+            list: Pares (imagen, (dx, dy)) con el desplazamiento de cada imagen en el frame.
+        """
+        if self.roi is None:
+            x0, y0, region = 0, 0, frame_proc
         else:
-            inicio = int(inicio_min * 60 * fps)
-            fin = int(fin_min * 60 * fps)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, inicio)
+            x0, y0, x1, y1 = self.roi.rectangulo
+            region = frame_proc[y0:y1, x0:x1]
+        if not self.tamano_mosaico:
+            return [(region, (x0, y0))]
+        return [
+            (region[ty0:ty1, tx0:tx1], (x0 + tx0, y0 + ty0))
+            for tx0, ty0, tx1, ty1 in dividir_mosaico(
+                region.shape[0], region.shape[1], self.tamano_mosaico, self.solape_mosaico
+            )
+        ]
 
-        procesados = 0
-        total_frames = max(1, fin - inicio)
-        frame_count = 0
+    def detectar(self, frames_proc):
+        """
+        Infiere una lista de frames preprocesados (con su región de interés y teselas, si las hay)
+        en una sola llamada al modelo y devuelve las cajas de cada frame en coordenadas del frame
+        completo.
+
+        Parámetros:
+            frames_proc (list): Frames preprocesados (ver preprocesar).
+
+        Retorna:
+            list: Una tupla (clases, confianzas, xyxy) por frame, como extraer_cajas.
+        """
+        t = self.metricas.tiempo()
+        entradas = [self._entradas_modelo(frame_proc) for frame_proc in frames_proc]
+        results = iter(self.inferir([imagen for grupo in entradas for imagen, _ in grupo]))
+        detecciones = []
+        for grupo in entradas:
+            partes = []
+            for _, (dx, dy) in grupo:
+                clases, confianzas, xyxy = extraer_cajas(next(results))
+                if dx or dy:
+                    xyxy = xyxy + np.array([dx, dy, dx, dy], dtype=np.float32)
+                partes.append((clases, confianzas, xyxy))
+            if len(partes) == 1:
+                cajas = partes[0]
+            else:
+                cajas = supresion_no_maximos(*(np.concatenate(columna) for columna in zip(*partes)))
+            if self.roi is not None:
+                cajas = self.roi.filtrar(*cajas)
+            detecciones.append(cajas)
+        self.metricas.registrar("inferencia", t)
+        return detecciones
+
+    def _procesar_lote(self, lote, inicio, total_frames, callback, out):
+        """
+        Infiere un lote de muestras y reparte los resultados en orden (conteos, callback,
+        Excel y video de salida).
+
+        Parámetros:
+            lote (list): Muestras con frame_proc o con cajas de la caché.
+            inicio (int): Primer frame del intervalo, para el progreso.
+            total_frames (int): Frames del intervalo, para el progreso.
+            callback (function): Función de retorno de la interfaz.
+            out (cv2.VideoWriter): Escritor del video de salida o None.
+        """
+        for muestra, cajas in zip(lote, self.detectar_muestras(lote)):
+            self._publicar_resultado(muestra, cajas, inicio, total_frames, callback, out)
+
+    def _publicar_resultado(self, muestra, cajas, inicio, total_frames, callback, out):
+        """
+        Cuenta las clases de un resultado, lo dibuja, actualiza la interfaz, registra la
+        detección y escribe el frame en el video de salida.
+
+        Parámetros:
+            muestra (Muestra): Muestra a la que corresponde el resultado (con frame_proc).
+            cajas (tuple): (clases, confianzas, xyxy) de la muestra en coordenadas del frame (ver detectar).
+            inicio (int): Primer frame del intervalo, para el progreso.
+            total_frames (int): Frames del intervalo, para el progreso (None en vivo: progreso 0).
+            callback (function): Función de retorno de la interfaz.
+            out (cv2.VideoWriter): Escritor del video de salida o None.
+        """
+        frame = muestra.frame
+
+        # El resultado anterior se escribe en el video hasta esta muestra; cuántos frames ocupa
+        # solo se sabe cuando el lector llega a ella (o al final del intervalo). Después, todo lo
+        # anterior a esta muestra está escrito y registrado: es el momento de un punto de control.
+        self._escribir_pendiente(out)
+        self._tal_vez_punto_control(muestra.indice, out)
+
+        # --- Contar clases ---
+        clases, confianzas, xyxy = cajas
+        conteos = np.bincount(clases[(clases >= 0) & (clases < 3)], minlength=3)
+        counts = {0: int(conteos[0]), 1: int(conteos[1]), 2: int(conteos[2])}  # Pothole, cocodrile skin, crack
+
+        # Dibujar resultados sobre el frame preprocesado (como result.plot(), pero sin copiarlo).
+        # Sin video ni interfaz (o sin frame_proc, si la muestra vino de la caché) no se dibuja.
         ultimo_frame_inferido = None
-        counts = {0: 0, 1: 0, 2: 0}  # Inicial para callback en caso de que no infiera aún
+        if muestra.frame_proc is not None and (out is not None or self._quiere_frames(callback)):
+            t = self.metricas.tiempo()
+            ultimo_frame_inferido = self.renderizador.dibujar(muestra.frame_proc, xyxy, clases)
+            self.metricas.registrar("dibujo", t)
+        if self.latencias_arranque["primer_frame_s"] is None:
+            self.latencias_arranque["primer_frame_s"] = time.perf_counter() - self._t_inicio
+        self.metricas.frames = muestra.indice + 1 - inicio
+        self.metricas.muestras += 1
+
+        # Actualizar interfaz
+        progreso = min(100.0, (muestra.indice + 1 - inicio) / total_frames * 100) if total_frames else 0.0
+        if callback:
+            self._llamar_callback(callback, ultimo_frame_inferido, frame, progreso, counts)  # Pasar también el frame original
+        if self.emisor is not None:
+            self.emisor.publicar(muestra.indice, muestra.ms, progreso, counts, counts, cajas, ultimo_frame_inferido, frame)
+
+        if conteos.any():  # Solo guardar si hay alguna detección
+            t = self.metricas.tiempo()
+            self.detecciones.agregar(muestra.indice, muestra.ms, conteos, clases, confianzas, xyxy)
+            tiempo_seg = int(muestra.ms / 1000)
+            minuto = tiempo_seg // 60
+            segundo = tiempo_seg % 60
+
+            # Agregar la detección al sumidero (el Excel se genera al final desde el almacén)
+            self.registrar_resultado(minuto, segundo, counts)
+            self.metricas.registrar("registro", t)
+
+        self.lector.muestreador.notificar(muestra.indice, bool(conteos.any()))
+        self._escritura_pendiente = (ultimo_frame_inferido, muestra)
+
+    def _quiere_frames(self, callback):
+        """
+        True si alguien va a ver los frames de cada muestra: el callback o una suscripción a
+        la vista previa. Si no, no se dibuja ni se copia nada para la interfaz.
+        """
+        return bool(callback) or (self.emisor is not None and self.emisor.quiere_vista)
+
+    def _llamar_callback(self, callback, frame_inferido, frame, progreso, counts):
+        """
+        Llama al callback de la interfaz; con instrumentación le pasa también las métricas.
+        """
+        t = self.metricas.tiempo()
+        if self.metricas.activo:
+            callback(frame_inferido, frame, progreso, counts, metricas=self.metricas)
+        else:
+            callback(frame_inferido, frame, progreso, counts)
+        self.metricas.registrar("interfaz", t)
+
+    def _procesar_cuadro_a_cuadro(self, lector, inicio, total_frames, callback, out, seguimiento):
+        """
+        Procesa todos los frames del intervalo y dibuja las detecciones sobre cada frame nuevo
+        del video de salida en lugar de repetir el último frame inferido. El modelo solo corre
+        en los keyframes que elige el muestreador. Como en el modo muestreado, las cajas se
+        dibujan sobre el frame preprocesado, así que con video de salida cada frame intermedio
+        también pasa por el flat-field.
+
+        Con seguimiento, las cajas se propagan a los frames intermedios con el seguidor y cada
+        keyframe registra en el Excel y en el almacén solo las imperfecciones nuevas
+        (identificadores que aparecen por primera vez). Sin seguimiento, los frames intermedios
+        muestran las cajas del último keyframe y el registro es el mismo que en el modo normal.
+        El callback recibe los conteos visibles en el keyframe.
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret or cap.get(cv2.CAP_PROP_POS_FRAMES) > fin:
+        Parámetros:
+            lector (LectorMuestreado): Lector del intervalo a procesar.
+            inicio (int): Primer frame del intervalo, para el progreso.
+            total_frames (int): Frames del intervalo, para el progreso.
+            callback (function): Función de retorno de la interfaz.
+            out (cv2.VideoWriter): Escritor del video de salida o None.
+            seguimiento (bool): Si True, usa SeguidorDetecciones entre keyframes.
+        """
+        seguidor = self.seguidor
+        seguidor.reiniciar()
+        if self._estado_seguidor is not None:
+            seguidor.restaurar(*self._estado_seguidor)
+        cajas, clases_cajas, ids_cajas = np.empty((0, 4), np.float32), np.empty(0, np.int64), None
+        metricas = self.metricas
+        t = metricas.tiempo()
+        for indice, ms, frame, es_muestra in lector.recorrer_todos():
+            metricas.registrar("decodificacion", t)
+            metricas.frames = indice + 1 - inicio
+            if self._cancelado.is_set():
                 break
+            if not es_muestra:
+                if seguimiento:
+                    t = metricas.tiempo()
+                    seguidor.propagar(frame)
+                    metricas.registrar("seguimiento", t)
+                    cajas, clases_cajas, ids_cajas = seguidor.cajas, seguidor.clases, seguidor.ids
+                if out is not None:
+                    vista = self.preprocesar(frame, vista=True)
+                    t = metricas.tiempo()
+                    dibujado = self.renderizador.dibujar(vista, cajas, clases_cajas, ids_cajas)
+                    metricas.registrar("dibujo", t)
+                    t = metricas.tiempo()
+                    out.write(dibujado)
+                    metricas.registrar("escritura", t)
+                    self.pool.devolver(vista)
+                self.pool.devolver(frame)
+                t = metricas.tiempo()
+                continue
+            metricas.muestras += 1
 
-            frame_count += 1
+            # Los frames anteriores a este keyframe ya están escritos y registrados
+            self._tal_vez_punto_control(indice, out)
+            muestra = Muestra(indice, ms, frame)
+            muestra.cajas = self._cajas_cache.get(indice)
+            dibujar = out is not None or self._quiere_frames(callback)
+            if muestra.cajas is None or self.modo_flatfield == "incremental" or dibujar:
+                muestra.frame_proc = self.preprocesar(frame)
+            clases, confianzas, xyxy = self.detectar_muestras([muestra])[0]
+            visibles = np.bincount(clases[(clases >= 0) & (clases < 3)], minlength=3)
+            counts = {0: int(visibles[0]), 1: int(visibles[1]), 2: int(visibles[2])}
+            if seguimiento:
+                t = metricas.tiempo()
+                ids, registrar = seguidor.actualizar(frame, xyxy, clases)
+                metricas.registrar("seguimiento", t)
+                cajas, clases_cajas, ids_cajas = seguidor.cajas, seguidor.clases, seguidor.ids
+            else:
+                ids, registrar = None, visibles
+                cajas, clases_cajas = xyxy, clases
 
-            # Inferencia cada 20 frames
-            if frame_count % 20 == 0:
-                frame_proc = imflatfield(frame)
-                results = self.model(frame_proc)
-                result = results[0]
+            # Se dibuja sobre el frame preprocesado, como en el modo muestreado; el callback
+            # recibe además el original sin dibujar. Sin video ni interfaz no se dibuja.
+            frame_inferido = None
+            if dibujar:
+                t = metricas.tiempo()
+                frame_inferido = self.renderizador.dibujar(muestra.frame_proc, cajas, clases_cajas, ids_cajas)
+                metricas.registrar("dibujo", t)
+            if self.latencias_arranque["primer_frame_s"] is None:
+                self.latencias_arranque["primer_frame_s"] = time.perf_counter() - self._t_inicio
 
-                # --- Contar clases ---
-                counts = {0: 0, 1: 0, 2: 0}  # Pothole, cocodrile skin, crack
-                if result.boxes is not None:
-                    for cls_id in result.boxes.cls:
-                        cls_int = int(cls_id)
-                        if cls_int in counts:
-                            counts[cls_int] += 1
+            progreso = min(100.0, (indice + 1 - inicio) / total_frames * 100)
+            if callback:
+                self._llamar_callback(callback, frame_inferido, frame, progreso, counts)
+            if self.emisor is not None:
+                self.emisor.publicar(
+                    indice, ms, progreso, counts,
+                    {0: int(registrar[0]), 1: int(registrar[1]), 2: int(registrar[2])},
+                    (clases, confianzas, xyxy), frame_inferido, frame,
+                )
 
-                # Dibujar resultados
-                ultimo_frame_inferido = result.plot()
+            if registrar.any():
+                t = metricas.tiempo()
+                self.detecciones.agregar(indice, ms, registrar, clases, confianzas, xyxy, ids=ids)
+                tiempo_seg = int(ms / 1000)
+                self.registrar_resultado(
+                    tiempo_seg // 60, tiempo_seg % 60,
+                    {0: int(registrar[0]), 1: int(registrar[1]), 2: int(registrar[2])},
+                )
+                metricas.registrar("registro", t)
+            lector.muestreador.notificar(indice, bool(visibles.any()))
 
-                # Actualizar interfaz
-                procesados += 1
-                progreso = (procesados / total_frames) * 100
-                if callback:
-                    callback(ultimo_frame_inferido, frame, progreso, counts)  # Pasar también el frame original
-
-                if sum(counts.values()) > 0:  # Solo guardar si hay alguna detección
-                    tiempo_seg = int(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
-                    minuto = tiempo_seg // 60
-                    segundo = tiempo_seg % 60
-                    self.resultados_inferencia.append({
-                        "Minuto": minuto,
-                        "Segundo": segundo,
-                        "Huecos": counts[0],
-                        "Grietas": counts[2],
-                        "Piel de cocodrilo": counts[1],
-                    })
-
-                    # Escribir los resultados directamente en el archivo Excel
-                    self.escribir_resultado_excel(minuto, segundo, counts)
-
-            # Si hay resultado, se escribe en el video
-            if ultimo_frame_inferido is not None:
-                out.write(ultimo_frame_inferido)
+            if out is not None:
+                t = metricas.tiempo()
+                out.write(frame_inferido)
+                metricas.registrar("escritura", t)
+            # devolver ignora los buffers repetidos o ajenos al pool
+            for buffer in (frame_inferido, muestra.frame_proc, frame):
+                self.pool.devolver(buffer)
+            t = metricas.tiempo()
 
-        cap.release()
-        out.release()
+    def _escribir_pendiente(self, out):
+        """
+        Escribe en el video de salida el último frame inferido tantas veces como frames ocupa su
+        muestra y devuelve al pool los buffers de la muestra.
+        """
+        if self._escritura_pendiente is None:
+            return
+        frame_inferido, muestra = self._escritura_pendiente
+        if out is not None:
+            t = self.metricas.tiempo()
+            for _ in range(muestra.repeticiones):
+                out.write(frame_inferido)
+            self.metricas.registrar("escritura", t)
+        for buffer in (frame_inferido, muestra.frame_proc, muestra.frame):
+            self.pool.devolver(buffer)
+        self._escritura_pendiente = None
 
-        # Al finalizar, guardar los resultados si no se ha cerrado el programa inesperadamente
-        if self.resultados_inferencia:
-            self.guardar_resultados_excel()
+    def _tal_vez_punto_control(self, siguiente, out):
+        """
+        Guarda un punto de control si está activado y pasó su intervalo. Se llama cuando todos
+        los frames anteriores a `siguiente` están escritos y sus detecciones registradas; el
+        segmento de video en curso se cierra para que quede completo en disco.
+        """
+        if self._punto_control is None or not self._punto_control.vencido():
+            return
+        t = self.metricas.tiempo()
+        segmentos = out.cortar() if isinstance(out, EscritorSegmentado) else []
+        if self.sumidero is not None:
+            self.sumidero.sincronizar()
+        self._punto_control.guardar({
+            "trabajo": self._trabajo,
+            "siguiente": int(siguiente),
+            "segmentos": segmentos,
+            "muestreador": self.lector.muestreador.estado(),
+            "seguidor": self.seguidor.estado() if self._seguimiento else None,
+            "modo_flatfield": self.modo_flatfield,
+        }, self.detecciones)
+        self.metricas.registrar("punto_control", t)
 
-        return output_path
+    def _reiniciar_sumidero(self):
+        """
+        Reescribe el sumidero con las detecciones del almacén, al reanudar desde un punto de
+        control (descarta las filas agregadas después del punto).
+        """
+        self._cerrar_sumidero()
+        self.sumidero = crear_sumidero(self.formato_sumidero, os.path.splitext(self.ruta_excel)[0])
+        for fila in self.detecciones.a_reporte().to_dict("records"):
+            self.sumidero.agregar(fila)
+
+    def _reiniciar_resultados(self):
+        """
+        Descarta las detecciones y el sumidero de la ejecución anterior al empezar una nueva (sin
+        reanudar), para que el reporte y la base de detecciones solo contengan las de esta.
+        """
+        self.detecciones = AlmacenDetecciones(guardar_cajas=self.detecciones.guardar_cajas)
+        self._cerrar_sumidero()
 
-    def escribir_resultado_excel(self, minuto, segundo, counts):
+    def _cerrar_sumidero(self):
         """
-        Escribe un nuevo resultado en el archivo Excel de manera eficiente,
-        sin cerrar el archivo repetidamente.
+        Sincroniza y cierra el sumidero al terminar una ejecución, para no dejar el archivo
+        abierto (en Windows quedaría bloqueado). La siguiente ejecución abre uno nuevo.
+        """
+        if self.sumidero is not None:
+            self.sumidero.cerrar()
+            self.sumidero = None
+
+    def cancelar(self):
+        """
+        Solicita detener el procesamiento en curso. procesar_video termina tras la muestra
+        actual y libera la captura y el video de salida.
+        """
+        self._cancelado.set()
+
+    def _programar_ejecucion(self):
+        """
+        Prepara una ejecución que otro hilo va a iniciar (FlujoEventos): olvida la cancelación
+        anterior ahora, de modo que un cancelar() emitido antes de que el hilo empiece a
+        procesar detiene esta ejecución.
+        """
+        self._cancelado.clear()
+        self._ejecucion_programada = True
+
+    def _iniciar_ejecucion(self):
+        """
+        Al empezar procesar_video o procesar_en_vivo, olvida la cancelación de una ejecución
+        anterior, salvo que la ejecución se haya programado con _programar_ejecucion.
+        """
+        if not self._ejecucion_programada:
+            self._cancelado.clear()
+        self._ejecucion_programada = False
+
+    def _procesar_en_pipeline(self, lector, inicio, total_frames, callback, out, tamano_lote,
+                              hilos_preprocesado, tamano_cola):
+        """
+        Ejecuta el procesamiento como un pipeline de etapas concurrentes:
+        decodificación -> preprocesado -> inferencia -> dibujo/escritura.
+
+        Las etapas se conectan con colas acotadas, de modo que una etapa lenta frena a las
+        anteriores en lugar de acumular frames en memoria. El preprocesado usa un pool de
+        hilos cuyos futuros se encolan en orden; la última etapa corre en el hilo que llama,
+        así que el callback, el Excel y el video se producen en el mismo orden que en modo
+        serial. Un error en cualquier etapa o una cancelación detiene todas las demás y el
+        error se relanza aquí.
+
+        Parámetros:
+            lector (LectorMuestreado): Lector del intervalo a procesar.
+            inicio (int): Primer frame del intervalo, para el progreso.
+            total_frames (int): Frames del intervalo, para el progreso.
+            callback (function): Función de retorno de la interfaz.
+            out (cv2.VideoWriter): Escritor del video de salida o None.
+            tamano_lote (int): Tamaño de lote de la etapa de inferencia.
+            hilos_preprocesado (int): Hilos del pool de preprocesado.
+            tamano_cola (int): Capacidad de cada cola entre etapas.
+        """
+        # El modo incremental depende del frame anterior: se preprocesa en un solo hilo
+        if self.modo_flatfield == "incremental":
+            hilos_preprocesado = 1
+        detener = threading.Event()
+        errores = []
+        cola_preprocesado = queue.Queue(maxsize=tamano_cola)
+        cola_resultados = queue.Queue(maxsize=tamano_cola)
+
+        def poner(cola, item):
+            while not detener.is_set():
+                try:
+                    cola.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def tomar(cola):
+            while not detener.is_set():
+                try:
+                    return cola.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return _FIN_PIPELINE
+
+        def etapa(funcion):
+            def ejecutar():
+                try:
+                    funcion()
+                except BaseException as e:
+                    errores.append(e)
+                    detener.set()
+            return ejecutar
+
+        def decodificar(pool):
+            t = self.metricas.tiempo()
+            for muestra in lector:
+                self.metricas.registrar("decodificacion", t)
+                if self._cancelado.is_set():
+                    break
+                muestra.cajas = self._cajas_cache.get(muestra.indice)
+                futuro = None
+                if muestra.cajas is None or self._necesita_imagen:
+                    futuro = pool.submit(self.preprocesar, muestra.frame)
+                if not poner(cola_preprocesado, (muestra, futuro)):
+                    return
+                t = self.metricas.tiempo()
+            poner(cola_preprocesado, _FIN_PIPELINE)
+
+        def inferir():
+            lote = []
+            while True:
+                item = tomar(cola_preprocesado)
+                if item is not _FIN_PIPELINE:
+                    muestra, futuro = item
+                    if futuro is not None:
+                        muestra.frame_proc = futuro.result()
+                    lote.append(muestra)
+                if lote and (item is _FIN_PIPELINE or len(lote) >= tamano_lote):
+                    for muestra, cajas in zip(lote, self.detectar_muestras(lote)):
+                        if not poner(cola_resultados, (muestra, cajas)):
+                            return
+                    lote = []
+                if item is _FIN_PIPELINE:
+                    poner(cola_resultados, _FIN_PIPELINE)
+                    return
+
+        with ThreadPoolExecutor(max_workers=max(1, hilos_preprocesado)) as pool:
+            hilos = [
+                threading.Thread(target=etapa(lambda: decodificar(pool)), daemon=True),
+                threading.Thread(target=etapa(inferir), daemon=True),
+            ]
+            for hilo in hilos:
+                hilo.start()
+            try:
+                while True:
+                    item = tomar(cola_resultados)
+                    if item is _FIN_PIPELINE:
+                        break
+                    if self._cancelado.is_set():
+                        detener.set()
+                        break
+                    muestra, cajas = item
+                    self.metricas.profundidad("preprocesado", cola_preprocesado.qsize())
+                    self.metricas.profundidad("resultados", cola_resultados.qsize())
+                    self._publicar_resultado(muestra, cajas, inicio, total_frames, callback, out)
+            finally:
+                detener.set()
+                for hilo in hilos:
+                    hilo.join()
+        if errores:
+            raise errores[0]
+
+    def comparar_tamanos_lote(self, frames, tamanos=(1, 4, 8, 16), repeticiones=3):
+        """
+        Mide el rendimiento de inferencia (frames/s) para distintos tamaños de lote.
+
+        Parámetros:
+            frames (list): Frames BGR de prueba; se preprocesan una sola vez antes de medir.
+            tamanos (tuple): Tamaños de lote a comparar.
+            repeticiones (int): Pasadas completas sobre `frames` por tamaño (se toma la mejor).
+
+        Retorna:
+            dict: {tamano_lote: frames por segundo}.
+        """
+        frames_proc = [self.preprocesar(frame) for frame in frames]
+        self.detectar(frames_proc[:1])  # Calentamiento
+        rendimiento = {}
+        for tamano in tamanos:
+            mejor = float("inf")
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                for i in range(0, len(frames_proc), tamano):
+                    self.detectar(frames_proc[i:i + tamano])
+                mejor = min(mejor, time.perf_counter() - t0)
+            rendimiento[tamano] = len(frames_proc) / mejor
+            registro.info("Lote %3d: %.1f frames/s", tamano, rendimiento[tamano])
+        return rendimiento
+
+    def preprocesar(self, frame, vista=False):
+        """
+        Aplica imflatfield al frame con el modo configurado. En los modos rápido e incremental,
+        el primer frame se compara contra la implementación exacta para respetar tolerancia_flatfield.
+        Con región de interés, solo se corrige la región; el resto del frame se copia sin cambios.
+
+        Parámetros:
+            frame (np.ndarray): Frame BGR del video.
+            vista (bool): El frame solo se dibuja en el video de salida (frames intermedios de
+                dibujar_cada_frame). En modo incremental se corrige con el fondo vigente sin
+                actualizarlo (ver FlatFieldIncremental.aplicar).
+
+        Retorna:
+            np.ndarray: Frame corregido (uint8).
+        """
+        t = self.metricas.tiempo()
+        if self.roi is None:
+            salida = self._corregir(frame, vista)
+        else:
+            if self.roi.rectangulo is None:
+                with self._bloqueo_flatfield:
+                    self.roi.resolver(frame)
+            x0, y0, x1, y1 = self.roi.rectangulo
+            salida = self.pool.tomar(frame.shape)
+            np.copyto(salida, frame)
+            corregido = self._corregir(frame[y0:y1, x0:x1], vista)
+            salida[y0:y1, x0:x1] = corregido
+            self.pool.devolver(corregido)
+        self.metricas.registrar("preprocesado", t)
+        return salida
+
+    def _corregir(self, frame, vista=False):
+        """
+        Aplica el flat-field del modo configurado (ver preprocesar).
+        """
+        self._verificar_flatfield(frame)
+        if self.modo_flatfield == "incremental":
+            return self.flatfield_incremental.aplicar(frame) if vista else self.flatfield_incremental(frame)
+        return imflatfield(frame, modo=self.modo_flatfield, pool=self.pool)
+
+    def _verificar_flatfield(self, frame):
+        """
+        En los modos rápido e incremental, compara una sola vez el resultado con la
+        implementación exacta sobre `frame` (la región que se corrige) y pasa al modo exacto si
+        el error supera tolerancia_flatfield.
+        """
+        if self.modo_flatfield in ("rapido", "incremental") and not self._flatfield_verificado:
+            with self._bloqueo_flatfield:
+                if not self._flatfield_verificado and self.tolerancia_flatfield is not None:
+                    error = error_flatfield(frame)
+                    if error > self.tolerancia_flatfield:
+                        registro.warning(
+                            "Flat-field rápido fuera de tolerancia (error %d), se usa el modo exacto", error
+                        )
+                        self.modo_flatfield = "exacto"
+                self._flatfield_verificado = True
+
+    def _verificar_flatfield_en(self, video_path, indice):
+        """
+        Hace la verificación de _verificar_flatfield sobre el frame `indice` del video, antes de
+        empezar a procesarlo. Si la región de interés aún no está resuelta, se resuelve solo
+        para recortar este frame y se olvida (el procesamiento la resuelve como siempre).
+        """
+        if self.modo_flatfield not in ("rapido", "incremental") or self._flatfield_verificado:
+            return
+        frame = self._leer_frame(video_path, indice)
+        if frame is None:
+            return
+        if self.roi is not None:
+            resuelta = self.roi.rectangulo is not None
+            if not resuelta:
+                self.roi.resolver(frame)
+            x0, y0, x1, y1 = self.roi.rectangulo
+            frame = frame[y0:y1, x0:x1]
+            if not resuelta:
+                self.roi.reiniciar()
+        self._verificar_flatfield(frame)
+
+    @staticmethod
+    def _leer_frame(video_path, indice):
+        """
+        Lee el frame `indice` del video con una captura aparte (la del procesamiento no se mueve).
+
+        Retorna:
+            np.ndarray: Frame BGR, o None si no se puede leer.
+        """
+        cap = cv2.VideoCapture(video_path)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, indice)
+        ret, frame = cap.read()
+        cap.release()
+        return frame if ret else None
+
+    def registrar_resultado(self, minuto, segundo, counts):
+        """
+        Agrega una detección al final del sumidero de resultados en tiempo constante.
+        El sumidero sincroniza con el disco periódicamente.
 
         Parámetros:
             minuto (int): Minuto en el que ocurre la detección.
             segundo (int): Segundo en el que ocurre la detección.
             counts (dict): Diccionario con los conteos de cada clase detectada.
         """
-        # Si el DataFrame no está inicializado, crearlo
-        if self.df_writer is None:
-            self.iniciar_excel_writer()
+        if self.sumidero is None:
+            self.sumidero = crear_sumidero(self.formato_sumidero, os.path.splitext(self.ruta_excel)[0])
 
-        # Crear un DataFrame para la nueva fila
-        nueva_fila = pd.DataFrame([{
+        self.sumidero.agregar({
             "Minuto": minuto,
             "Segundo": segundo,
             "Huecos": counts[0],
             "Grietas": counts[2],
             "Piel de cocodrilo": counts[1]
-        }])
-
-        # Usar pd.concat() para agregar la nueva fila al DataFrame
-        self.df_writer = pd.concat([self.df_writer, nueva_fila], ignore_index=True)
-
-        # Usar ExcelWriter para escribir el DataFrame al archivo sin sobreescribir
-        with pd.ExcelWriter(self.ruta_excel, engine="openpyxl", mode="a", if_sheet_exists="overlay") as writer:
-            self.df_writer.to_excel(writer, index=False, header=False, startrow=self.df_writer.shape[0])
-
-    def iniciar_excel_writer(self):
-        """
-        Inicializa el archivo Excel si no existe y configura el escritor de pandas.
-        También crea el DataFrame inicial en memoria.
-        """
-        # Asegurarse de que el directorio de la ruta del archivo existe
-        os.makedirs(os.path.dirname(self.ruta_excel), exist_ok=True)
-
-        # Si el archivo no existe, crear uno nuevo con los encabezados
-        if not os.path.exists(self.ruta_excel):
-            df = pd.DataFrame(columns=["Minuto", "Segundo", "Huecos", "Grietas", "Piel de cocodrilo"])
-            df.to_excel(self.ruta_excel, index=False)
-
-        # Inicializar el DataFrame en memoria
-        self.df_writer = pd.read_excel(self.ruta_excel)
+        })
 
     def guardar_resultados_excel(self):
         """
-        Guarda los resultados acumulados en el archivo Excel.
-        Si el archivo ya existe, sobreescribe los datos con los nuevos resultados.
+        Genera el archivo Excel a partir del almacén de detecciones en memoria (no relee el
+        sumidero, que tiene las mismas filas) y sincroniza el sumidero si sigue abierto. Si el
+        archivo ya existe, sobreescribe los datos con los nuevos resultados.
         """
-        if not self.resultados_inferencia:
+        if not len(self.detecciones):
             return  # No hay resultados que guardar
 
-        # Al finalizar, guardar los resultados en el archivo Excel
-        self.df_writer.to_excel(self.ruta_excel, index=False)
-
-
+        t = self.metricas.tiempo()
+        if self.sumidero is not None:
+            self.sumidero.sincronizar()
+        self.detecciones.a_reporte().to_excel(self.ruta_excel, index=False)
+        self.metricas.registrar("excel", t)
@@ -0,0 +1,372 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: Base de datos persistente de detecciones (SQLite). Guarda cada caja detectada (video, frame, marca ----------------
+------------- de tiempo, clase, confianza, coordenadas e identificador de seguimiento) con índices por video, tiempo y clase, ---------------
+------------- y mantiene conteos preagregados por segmento de tiempo. Consultas como "todos los huecos entre los minutos 40 y ----------------
+------------- 55 de estos 30 videos" se responden con búsquedas en los índices, sin releer los Excel de cada recorrido. ------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+
+Uso:
+    python base_detecciones.py detecciones.sqlite --videos recorrido_01.mp4 --desde-min 40 --hasta-min 55 --clases 0
+    python base_detecciones.py detecciones.sqlite --segmentos 60 -o conteos.xlsx
+'''
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import cv2
+import numpy as np
+import pandas as pd
+from almacenamiento import AlmacenDetecciones
+from cache_inferencia import huella_archivo
+
+# Versión del esquema
+VERSION_BASE = 1
+
+# Columnas de conteo por clase (en el orden de AlmacenDetecciones.CLASES) en muestras y segmentos
+COLUMNAS_CONTEO = ("huecos", "piel_cocodrilo", "grietas")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY, huella TEXT NOT NULL UNIQUE, ruta TEXT NOT NULL, nombre TEXT NOT NULL,
+    fps REAL, frames INTEGER, modelo TEXT, actualizado REAL
+);
+CREATE INDEX IF NOT EXISTS videos_nombre ON videos (nombre);
+CREATE TABLE IF NOT EXISTS muestras (
+    video_id INTEGER NOT NULL, frame INTEGER NOT NULL, ms REAL NOT NULL,
+    huecos INTEGER NOT NULL, piel_cocodrilo INTEGER NOT NULL, grietas INTEGER NOT NULL,
+    PRIMARY KEY (video_id, frame)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cajas (
+    id INTEGER PRIMARY KEY, video_id INTEGER NOT NULL, frame INTEGER NOT NULL, ms REAL NOT NULL,
+    clase INTEGER NOT NULL, confianza REAL NOT NULL, x1 REAL, y1 REAL, x2 REAL, y2 REAL, id_seguimiento INTEGER
+);
+CREATE INDEX IF NOT EXISTS cajas_video_tiempo ON cajas (video_id, ms);
+CREATE INDEX IF NOT EXISTS cajas_video_clase_tiempo ON cajas (video_id, clase, ms);
+CREATE INDEX IF NOT EXISTS cajas_clase_tiempo ON cajas (clase, ms);
+CREATE TABLE IF NOT EXISTS segmentos (
+    video_id INTEGER NOT NULL, segmento INTEGER NOT NULL,
+    huecos INTEGER NOT NULL, piel_cocodrilo INTEGER NOT NULL, grietas INTEGER NOT NULL,
+    PRIMARY KEY (video_id, segmento)
+) WITHOUT ROWID;
+"""
+
+
+def _clase(valor):
+    # Acepta el índice de la clase o su nombre en AlmacenDetecciones.CLASES (sin distinguir mayúsculas)
+    if isinstance(valor, str) and not valor.isdigit():
+        nombres = [nombre.lower() for nombre in AlmacenDetecciones.CLASES]
+        if valor.lower() not in nombres:
+            raise ValueError(f"Clase desconocida: {valor}")
+        return nombres.index(valor.lower())
+    return int(valor)
+
+
+class BaseDetecciones:
+    '''
+    Base de datos SQLite de detecciones por caja.
+
+    Tablas:
+        videos: un registro por video (identificado por la huella de su contenido).
+        muestras: conteos registrados por muestra (los mismos del Excel).
+        cajas: una fila por caja, con índices (video, tiempo), (video, clase, tiempo) y (clase, tiempo).
+        segmentos: conteos por video y segmento de `segmento_s` segundos, actualizados al ingresar.
+
+    Atributos:
+        ruta (str): Archivo SQLite.
+        segmento_s (float): Duración de los segmentos preagregados (fija al crear la base).
+    '''
+
+    def __init__(self, ruta, segmento_s=10.0):
+        '''
+        Parámetros:
+            ruta (str): Archivo SQLite (se crea si no existe).
+            segmento_s (float): Duración de los segmentos preagregados si la base es nueva; una
+                base existente conserva la suya.
+        '''
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(carpeta, exist_ok=True)
+        self.ruta = ruta
+        self._bloqueo = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=60, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(_ESQUEMA)
+        self._conexion.execute(
+            "INSERT OR IGNORE INTO meta (clave, valor) VALUES ('version', ?), ('segmento_s', ?)",
+            (str(VERSION_BASE), str(float(segmento_s))),
+        )
+        self._conexion.commit()
+        meta = dict(self._conexion.execute("SELECT clave, valor FROM meta").fetchall())
+        if int(meta["version"]) != VERSION_BASE:
+            raise ValueError(f"Versión de base de detecciones no soportada: {meta['version']}")
+        self.segmento_s = float(meta["segmento_s"])
+
+    def __getstate__(self):
+        # Cada proceso del lote abre su propia conexión (SQLite serializa las escrituras)
+        return {"ruta": self.ruta, "segmento_s": self.segmento_s}
+
+    def __setstate__(self, estado):
+        self.__init__(**estado)
+
+    def ingresar(self, video_path, almacen, inicio_frame=0, fin_frame=None, modelo=None):
+        '''
+        Guarda las detecciones de un video procesado en el rango de frames [inicio_frame,
+        fin_frame). Lo que había de ese video en el rango se reemplaza, así que reprocesar un
+        intervalo (o procesarlo por fragmentos) no duplica detecciones.
+
+        Parámetros:
+            video_path (str): Video procesado.
+            almacen (AlmacenDetecciones): Detecciones de una sola ejecución sobre este video; solo
+                se toman las del rango. Un frame repetido (almacén de varias ejecuciones) es un error.
+            inicio_frame (int): Primer frame procesado.
+            fin_frame (int): Frame final (excluido), o None hasta el final del video.
+            modelo (str): Ruta del modelo con el que se detectó.
+
+        Retorna:
+            int: Identificador del video en la base.
+        '''
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        fin_frame = frames if fin_frame is None else fin_frame
+        huella = huella_archivo(video_path, completo=False)
+
+        columnas = almacen.columnas()
+        en_rango = (columnas["frame"] >= inicio_frame) & (columnas["frame"] < fin_frame)
+        frames_rango = columnas["frame"][en_rango]
+        if len(np.unique(frames_rango)) != len(frames_rango):
+            raise ValueError("El almacén tiene frames repetidos; debe contener una sola ejecución sobre el video")
+        conteos = np.column_stack([columnas[nombre][en_rango] for nombre in AlmacenDetecciones.CLASES])
+        filas_muestras = zip(
+            frames_rango.tolist(), columnas["ms"][en_rango].tolist(), *conteos.T.tolist()
+        )
+        cajas = almacen.cajas_dataframe()
+        cajas = cajas[(cajas["frame"] >= inicio_frame) & (cajas["frame"] < fin_frame)]
+        filas_cajas = cajas[["frame", "ms", "clase", "confianza", "x1", "y1", "x2", "y2", "id"]].itertuples(
+            index=False, name=None
+        )
+
+        segmento_ms = self.segmento_s * 1000.0
+        primero = int(inicio_frame * 1000.0 / fps // segmento_ms)
+        ultimo = int(max(fin_frame - 1, inicio_frame) * 1000.0 / fps // segmento_ms)
+        with self._bloqueo, self._conexion:
+            self._conexion.execute(
+                "INSERT INTO videos (huella, ruta, nombre, fps, frames, modelo, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(huella) DO UPDATE SET ruta = excluded.ruta, nombre = excluded.nombre, fps = excluded.fps, "
+                "frames = excluded.frames, modelo = excluded.modelo, actualizado = excluded.actualizado",
+                (huella, os.path.abspath(video_path), os.path.basename(video_path), fps, frames, modelo, time.time()),
+            )
+            video_id = self._conexion.execute("SELECT id FROM videos WHERE huella = ?", (huella,)).fetchone()[0]
+            rango = (video_id, inicio_frame, fin_frame)
+            self._conexion.execute("DELETE FROM cajas WHERE video_id = ? AND frame >= ? AND frame < ?", rango)
+            self._conexion.execute("DELETE FROM muestras WHERE video_id = ? AND frame >= ? AND frame < ?", rango)
+            self._conexion.executemany(
+                "INSERT INTO muestras (video_id, frame, ms, huecos, piel_cocodrilo, grietas) VALUES (?, ?, ?, ?, ?, ?)",
+                ((video_id,) + fila for fila in filas_muestras),
+            )
+            self._conexion.executemany(
+                "INSERT INTO cajas (video_id, frame, ms, clase, confianza, x1, y1, x2, y2, id_seguimiento) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (video_id,) + tuple(v.item() if hasattr(v, "item") else v for v in fila[:-1])
+                    + (None if fila[-1] < 0 else int(fila[-1]),)
+                    for fila in filas_cajas
+                ),
+            )
+            # Los segmentos que tocan el rango se recalculan desde las muestras (incluye las de
+            # fuera del rango que caen en los segmentos de los bordes)
+            self._conexion.execute(
+                "DELETE FROM segmentos WHERE video_id = ? AND segmento >= ? AND segmento <= ?",
+                (video_id, primero, ultimo),
+            )
+            self._conexion.execute(
+                "INSERT INTO segmentos (video_id, segmento, huecos, piel_cocodrilo, grietas) "
+                "SELECT video_id, CAST(ms / ? AS INTEGER), SUM(huecos), SUM(piel_cocodrilo), SUM(grietas) "
+                "FROM muestras WHERE video_id = ? AND ms >= ? AND ms < ? GROUP BY 1, 2",
+                (segmento_ms, video_id, primero * segmento_ms, (ultimo + 1) * segmento_ms),
+            )
+        return video_id
+
+    def _ids_videos(self, videos):
+        # Acepta identificadores, rutas o nombres de archivo
+        if videos is None:
+            return None
+        ids = set()
+        with self._bloqueo:
+            for video in videos:
+                if isinstance(video, (int, np.integer)):
+                    ids.add(int(video))
+                    continue
+                filas = self._conexion.execute(
+                    "SELECT id FROM videos WHERE ruta = ? OR nombre = ?", (os.path.abspath(video), os.path.basename(video))
+                ).fetchall()
+                ids.update(fila[0] for fila in filas)
+        return sorted(ids)
+
+    def videos(self):
+        '''
+        Retorna:
+            pd.DataFrame: Videos ingresados (id, nombre, ruta, fps, frames, modelo, actualizado).
+        '''
+        with self._bloqueo:
+            return pd.read_sql_query(
+                "SELECT id, nombre, ruta, fps, frames, modelo, actualizado FROM videos ORDER BY id", self._conexion
+            )
+
+    def cajas(self, videos=None, desde_s=None, hasta_s=None, clases=None, confianza_min=None, limite=None):
+        '''
+        Cajas detectadas, filtradas por video, intervalo de tiempo, clase y confianza.
+
+        Parámetros:
+            videos (list): Identificadores, rutas o nombres de los videos. None consulta todos.
+            desde_s (float): Inicio del intervalo en segundos desde el inicio de cada video.
+            hasta_s (float): Fin del intervalo (excluido) en segundos.
+            clases (list): Índices (0 hueco, 1 piel de cocodrilo, 2 grieta) o nombres de AlmacenDetecciones.CLASES.
+            confianza_min (float): Confianza mínima.
+            limite (int): Máximo de filas.
+
+        Retorna:
+            pd.DataFrame: video, frame, ms, minuto, segundo, clase, confianza, x1, y1, x2, y2 e
+            id_seguimiento, ordenadas por video y tiempo.
+        '''
+        condiciones, parametros = self._filtros(videos, desde_s, hasta_s, "c.ms", 1000.0)
+        if clases is not None:
+            clases = [_clase(c) for c in clases]
+            condiciones.append(f"c.clase IN ({', '.join('?' * len(clases))})")
+            parametros += clases
+        if confianza_min is not None:
+            condiciones.append("c.confianza >= ?")
+            parametros.append(confianza_min)
+        consulta = (
+            "SELECT v.nombre AS video, c.frame, c.ms, c.clase, c.confianza, c.x1, c.y1, c.x2, c.y2, c.id_seguimiento "
+            "FROM cajas c JOIN videos v ON v.id = c.video_id"
+            + (" WHERE " + " AND ".join(condiciones) if condiciones else "")
+            + " ORDER BY c.video_id, c.ms"
+            + (f" LIMIT {int(limite)}" if limite else "")
+        )
+        with self._bloqueo:
+            datos = pd.read_sql_query(consulta, self._conexion, params=parametros)
+        tiempo_seg = (datos["ms"] // 1000).astype(np.int64)
+        datos.insert(3, "minuto", tiempo_seg // 60)
+        datos.insert(4, "segundo", tiempo_seg % 60)
+        return datos
+
+    def conteos_por_segmento(self, videos=None, desde_s=None, hasta_s=None, segmento_s=None):
+        '''
+        Conteos preagregados por segmento de tiempo (leídos de la tabla de segmentos, sin recorrer las cajas).
+
+        Parámetros:
+            videos (list): Identificadores, rutas o nombres de los videos. None consulta todos.
+            desde_s (float): Inicio del intervalo en segundos; se incluye el segmento que lo contiene.
+            hasta_s (float): Fin del intervalo en segundos; se incluye el segmento que lo contiene.
+            segmento_s (float): Duración de los segmentos del resultado; debe ser múltiplo de la
+                de la base. None usa la de la base.
+
+        Retorna:
+            pd.DataFrame: video, inicio_s, fin_s y conteos por clase de cada segmento con datos.
+        '''
+        segmento_s = self.segmento_s if segmento_s is None else segmento_s
+        factor = int(round(segmento_s / self.segmento_s))
+        if factor < 1 or abs(factor * self.segmento_s - segmento_s) > 1e-6:
+            raise ValueError(f"segmento_s debe ser múltiplo de {self.segmento_s} s")
+        # El intervalo se ajusta a segmentos completos del resultado
+        desde_s = None if desde_s is None else np.floor(desde_s / segmento_s) * segmento_s
+        hasta_s = None if hasta_s is None else np.ceil(hasta_s / segmento_s) * segmento_s
+        condiciones, parametros = self._filtros(videos, desde_s, hasta_s, "s.segmento", 1.0 / self.segmento_s)
+        consulta = (
+            f"SELECT v.nombre AS video, s.segmento / {factor} AS grupo, "
+            + ", ".join(f"SUM(s.{c}) AS {c}" for c in COLUMNAS_CONTEO)
+            + " FROM segmentos s JOIN videos v ON v.id = s.video_id"
+            + (" WHERE " + " AND ".join(condiciones) if condiciones else "")
+            + " GROUP BY s.video_id, grupo ORDER BY s.video_id, grupo"
+        )
+        with self._bloqueo:
+            datos = pd.read_sql_query(consulta, self._conexion, params=parametros)
+        grupo = datos.pop("grupo")
+        datos.insert(1, "inicio_s", grupo * float(segmento_s))
+        datos.insert(2, "fin_s", (grupo + 1) * float(segmento_s))
+        return datos
+
+    def _filtros(self, videos, desde_s, hasta_s, columna, escala):
+        # Condiciones WHERE de video e intervalo; `escala` convierte segundos a las unidades de `columna`
+        condiciones, parametros = [], []
+        ids = self._ids_videos(videos)
+        if ids is not None:
+            condiciones.append(f"{columna.split('.')[0]}.video_id IN ({', '.join('?' * len(ids)) or 'NULL'})")
+            parametros += ids
+        if columna.endswith("segmento"):
+            # Los segmentos se incluyen si se solapan con el intervalo
+            if desde_s is not None:
+                condiciones.append(f"{columna} >= ?")
+                parametros.append(int(desde_s * escala))
+            if hasta_s is not None:
+                condiciones.append(f"{columna} < ?")
+                parametros.append(int(np.ceil(hasta_s * escala)))
+        else:
+            if desde_s is not None:
+                condiciones.append(f"{columna} >= ?")
+                parametros.append(desde_s * escala)
+            if hasta_s is not None:
+                condiciones.append(f"{columna} < ?")
+                parametros.append(hasta_s * escala)
+        return condiciones, parametros
+
+    def eliminar_video(self, video):
+        '''
+        Elimina un video y todas sus detecciones.
+        '''
+        ids = self._ids_videos([video])
+        with self._bloqueo, self._conexion:
+            for video_id in ids:
+                for tabla in ("cajas", "muestras", "segmentos"):
+                    self._conexion.execute(f"DELETE FROM {tabla} WHERE video_id = ?", (video_id,))
+                self._conexion.execute("DELETE FROM videos WHERE id = ?", (video_id,))
+
+    def cerrar(self):
+        self._conexion.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas sobre la base de detecciones.")
+    parser.add_argument("base", help="Archivo SQLite de la base de detecciones.")
+    parser.add_argument("--videos", nargs="+", default=None, help="Rutas o nombres de los videos (todos si se omite).")
+    parser.add_argument("--desde-min", type=float, default=None)
+    parser.add_argument("--hasta-min", type=float, default=None)
+    parser.add_argument("--clases", nargs="+", default=None, help="Índices o nombres de clase (solo para cajas).")
+    parser.add_argument("--confianza-min", type=float, default=None)
+    parser.add_argument(
+        "--segmentos", type=float, default=None,
+        help="Reporta conteos por segmentos de N segundos en lugar de las cajas.",
+    )
+    parser.add_argument("-o", "--salida", default=None, help="Archivo .xlsx o .csv con el resultado.")
+    args = parser.parse_args(argv)
+
+    base = BaseDetecciones(args.base)
+    desde = None if args.desde_min is None else args.desde_min * 60
+    hasta = None if args.hasta_min is None else args.hasta_min * 60
+    t0 = time.perf_counter()
+    if args.segmentos:
+        datos = base.conteos_por_segmento(args.videos, desde, hasta, args.segmentos)
+    else:
+        datos = base.cajas(args.videos, desde, hasta, args.clases, args.confianza_min)
+    print(f"{len(datos)} filas en {(time.perf_counter() - t0) * 1000:.1f} ms")
+    if args.salida:
+        if args.salida.endswith(".csv"):
+            datos.to_csv(args.salida, index=False)
+        else:
+            datos.to_excel(args.salida, index=False)
+    else:
+        print(datos.to_string(max_rows=40))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,641 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: Benchmark reproducible del backend. Genera videos sintéticos de pavimento (asfalto, líneas, huecos, ----------------
+------------- grietas, piel de cocodrilo e iluminación no uniforme) a varias resoluciones y duraciones, reemplaza YOLO por un ------------------
+------------- detector simulado determinista con un retardo configurable, y mide el rendimiento de procesar_video de extremo ----------------
+------------- a extremo y de cada etapa por separado (imflatfield, decodificación, sumideros de resultados). Los resultados se -------------
+------------- guardan en JSON con un identificador estable por medición, de modo que dos ejecuciones se pueden comparar. ----------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+
+Uso:
+    python benchmark.py --resoluciones 640x360 1280x720 1920x1080 --duraciones 10 -o benchmarks/antes.json
+    python benchmark.py --comparar benchmarks/antes.json benchmarks/despues.json
+'''
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+# Versión del formato del JSON de resultados
+VERSION_BENCHMARK = 1
+
+# Ruta bajo la que se registra el detector simulado en RegistroModelos
+RUTA_DETECTOR_SIMULADO = "detector_simulado.pt"
+
+# Configuraciones de procesar_video medidas de extremo a extremo: (nombre, argumentos, con video de salida)
+CONFIGURACIONES_EXTREMO = (
+    ("serie", {}, True),
+    ("lote_8", {"tamano_lote": 8}, True),
+    ("pipeline", {"paralelo": True, "tamano_lote": 4}, True),
+    ("solo_reporte", {}, False),
+)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------------------
+# Videos sintéticos
+# ------------------------------------------------------------------------------------------------------------------------------------------
+
+def _textura_via(ancho, alto, rng, defectos):
+    '''
+    Dibuja un tramo de vía (escala de grises) que se repite verticalmente al desplazarse.
+    '''
+    textura = rng.normal(100, 14, (alto, ancho)).astype(np.float32)
+    textura = cv2.GaussianBlur(textura, (0, 0), max(1.0, ancho / 800))
+    textura = np.clip(textura, 0, 255).astype(np.uint8)
+    escala = ancho / 1280
+
+    # Línea central discontinua
+    grosor = max(2, int(12 * escala))
+    for y in range(0, alto, alto // 4):
+        cv2.rectangle(textura, (ancho // 2 - grosor, y), (ancho // 2 + grosor, y + alto // 8), 225, -1)
+
+    margen = int(alto * 0.05)
+    for _ in range(defectos):
+        tipo = rng.integers(3)
+        cx = int(rng.uniform(0.1, 0.9) * ancho)
+        cy = int(rng.uniform(margen, alto - margen))
+        if tipo == 0:
+            # Hueco: elipse oscura
+            ejes = (int(rng.uniform(25, 60) * escala), int(rng.uniform(12, 30) * escala))
+            cv2.ellipse(textura, (cx, cy), ejes, float(rng.uniform(0, 180)), 0, 360, int(rng.uniform(30, 45)), -1)
+        elif tipo == 1:
+            # Piel de cocodrilo: malla de grietas cortas en un parche
+            lado = int(rng.uniform(60, 120) * escala)
+            for _ in range(14):
+                x0, y0 = cx + rng.integers(-lado, lado), cy + rng.integers(-lado // 2, lado // 2)
+                x1, y1 = x0 + rng.integers(-lado // 3, lado // 3), y0 + rng.integers(-lado // 3, lado // 3)
+                cv2.line(textura, (int(x0), int(y0)), (int(x1), int(y1)), 45, max(1, int(3 * escala)))
+        else:
+            # Grieta: camino aleatorio largo y delgado
+            puntos = [(cx, cy)]
+            angulo = rng.uniform(0, np.pi)
+            for _ in range(12):
+                angulo += rng.normal(0, 0.35)
+                largo = rng.uniform(15, 35) * escala
+                x, y = puntos[-1]
+                puntos.append((int(x + largo * np.cos(angulo)), int(y + largo * np.sin(angulo))))
+            cv2.polylines(textura, [np.array(puntos, np.int32)], False, 40, max(1, int(3 * escala)))
+    return textura
+
+
+def generar_video_sintetico(ruta, ancho=1280, alto=720, segundos=10, fps=30, semilla=0, defectos=12):
+    '''
+    Genera un video de una cámara que avanza sobre una vía con imperfecciones.
+
+    El cuadro tiene cielo sobre el horizonte (35 % superior) y, debajo, una textura de asfalto
+    con línea central, huecos, grietas y piel de cocodrilo que se desplaza hacia la cámara. La
+    iluminación no es uniforme (viñeteado y sombra lateral que varía lentamente), que es lo que
+    corrige imflatfield. El mismo (ancho, alto, segundos, fps, semilla) produce el mismo video.
+
+    Parámetros:
+        ruta (str): Ruta del video (.mp4).
+        ancho (int): Ancho en píxeles.
+        alto (int): Alto en píxeles.
+        segundos (float): Duración.
+        fps (float): Cuadros por segundo.
+        semilla (int): Semilla de la textura y de las imperfecciones.
+        defectos (int): Imperfecciones por tramo repetido de la vía.
+
+    Retorna:
+        str: La ruta del video.
+    '''
+    rng = np.random.default_rng(semilla)
+    horizonte = int(alto * 0.35)
+    alto_via = alto - horizonte
+    periodo = 2 * alto_via
+    textura = _textura_via(ancho, periodo, rng, defectos)
+    textura = cv2.cvtColor(np.vstack([textura, textura[:alto_via]]), cv2.COLOR_GRAY2BGR)
+
+    cielo = np.linspace((235, 205, 175), (205, 195, 185), horizonte).astype(np.uint8)
+    cielo = np.repeat(cielo[:, None, :], ancho, axis=1)
+
+    # Ganancia de iluminación sobre la vía en 1/128 (128 = sin cambio)
+    y, x = np.mgrid[0:alto_via, 0:ancho].astype(np.float32)
+    ganancia = 1.15 - 0.45 * ((x - ancho / 2) / ancho) ** 2 - 0.25 * (y / alto_via) + 0.2 * (x / ancho)
+    ganancia = cv2.merge([np.clip(ganancia * 128, 0, 255).astype(np.uint8)] * 3)
+
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(carpeta, exist_ok=True)
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*"mp4v"), fps, (ancho, alto))
+    frame = np.empty((alto, ancho, 3), np.uint8)
+    frame[:horizonte] = cielo
+    velocidad = alto_via / fps  # La vía avanza la mitad del tramo por segundo
+    for i in range(int(round(segundos * fps))):
+        desplazamiento = int(periodo - (i * velocidad) % periodo) % periodo
+        nubes = 0.9 + 0.1 * np.sin(2 * np.pi * i / (7 * fps))
+        cv2.multiply(
+            textura[desplazamiento:desplazamiento + alto_via], ganancia, dst=frame[horizonte:],
+            scale=nubes / 128, dtype=cv2.CV_8U,
+        )
+        escritor.write(frame)
+    escritor.release()
+    return ruta
+
+
+def video_sintetico(carpeta, ancho, alto, segundos, fps=30, semilla=0):
+    '''
+    Retorna la ruta del video sintético con esos parámetros, generándolo si aún no existe en `carpeta`.
+    '''
+    ruta = os.path.join(carpeta, f"sintetico_{ancho}x{alto}_{segundos:g}s_{fps:g}fps_{semilla}.mp4")
+    if not os.path.exists(ruta):
+        generar_video_sintetico(ruta + ".tmp.mp4", ancho, alto, segundos, fps, semilla)
+        os.replace(ruta + ".tmp.mp4", ruta)
+    return ruta
+
+
+# ------------------------------------------------------------------------------------------------------------------------------------------
+# Detector simulado
+# ------------------------------------------------------------------------------------------------------------------------------------------
+
+class _TensorSimulado:
+    # Imita lo que extraer_cajas usa de un tensor de PyTorch: .cpu().numpy()
+    def __init__(self, datos):
+        self._datos = datos
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._datos
+
+
+class CajasSimuladas:
+    '''
+    Cajas de un ResultadoSimulado, con los atributos cls, conf y xyxy de las de Ultralytics.
+    '''
+
+    def __init__(self, clases, confianzas, xyxy):
+        self.cls = _TensorSimulado(clases.astype(np.float32))
+        self.conf = _TensorSimulado(confianzas.astype(np.float32))
+        self.xyxy = _TensorSimulado(xyxy.astype(np.float32))
+
+    def __len__(self):
+        return len(self.cls.numpy())
+
+
+class ResultadoSimulado:
+    '''
+    Resultado de una imagen del detector simulado (boxes y orig_img, como los de Ultralytics).
+    '''
+
+    def __init__(self, imagen, cajas):
+        self.orig_img = imagen
+        self.boxes = cajas
+
+
+class DetectorSimulado:
+    '''
+    Reemplazo determinista del modelo YOLO para medir el backend sin los pesos entrenados.
+
+    Detecta las regiones oscuras de la vía sobre una versión reducida de la imagen (umbral
+    relativo a la mediana y componentes conexas) y las clasifica por su forma: compactas y
+    llenas como huecos, alargadas como grietas y el resto como piel de cocodrilo. La misma
+    imagen produce siempre las mismas cajas. Cada llamada tarda al menos retardo_lote_ms más
+    retardo_ms por imagen (con time.sleep, que libera el GIL como lo hace la inferencia en GPU),
+    así que el costo del modelo es fijo y las diferencias medidas provienen del backend.
+
+    Atributos:
+        retardo_ms (float): Latencia simulada por imagen.
+        retardo_lote_ms (float): Latencia simulada fija por llamada.
+        ancho_analisis (int): Ancho de la imagen reducida sobre la que se detecta.
+        llamadas (int): Llamadas recibidas.
+        imagenes (int): Imágenes inferidas.
+    '''
+
+    def __init__(self, retardo_ms=10.0, retardo_lote_ms=2.0, ancho_analisis=320):
+        self.retardo_ms = retardo_ms
+        self.retardo_lote_ms = retardo_lote_ms
+        self.ancho_analisis = ancho_analisis
+        self.llamadas = 0
+        self.imagenes = 0
+
+    def _detectar(self, imagen):
+        gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+        factor = max(1.0, gris.shape[1] / self.ancho_analisis)
+        reducida = cv2.resize(
+            gris, (max(1, int(gris.shape[1] / factor)), max(1, int(gris.shape[0] / factor))),
+            interpolation=cv2.INTER_AREA,
+        )
+        mascara = (reducida < np.median(reducida) * 0.75).astype(np.uint8)
+        mascara = cv2.morphologyEx(mascara, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+        n, _, estadisticas, _ = cv2.connectedComponentsWithStats(mascara, connectivity=8)
+        clases, confianzas, cajas = [], [], []
+        for x, y, w, h, area in estadisticas[1:n]:
+            if area < 6:
+                continue
+            llenado = area / float(w * h)
+            alargamiento = max(w, h) / float(min(w, h))
+            if llenado >= 0.6 and alargamiento < 3:
+                clase = 0
+            elif alargamiento >= 3 or llenado < 0.25:
+                clase = 2
+            else:
+                clase = 1
+            clases.append(clase)
+            confianzas.append(0.5 + 0.45 * area / (area + 50.0))
+            cajas.append((x * factor, y * factor, (x + w) * factor, (y + h) * factor))
+        return ResultadoSimulado(imagen, CajasSimuladas(
+            np.array(clases, np.int64), np.array(confianzas, np.float32), np.array(cajas, np.float32).reshape(-1, 4),
+        ))
+
+    def __call__(self, imagenes, verbose=False, **kwargs):
+        '''
+        Parámetros:
+            imagenes: Una imagen (np.ndarray) o una lista de imágenes.
+
+        Retorna:
+            list: Un ResultadoSimulado por imagen.
+        '''
+        lista = imagenes if isinstance(imagenes, list) else [imagenes]
+        t0 = time.perf_counter()
+        resultados = [self._detectar(imagen) for imagen in lista]
+        espera = (self.retardo_lote_ms + self.retardo_ms * len(lista)) / 1000.0 - (time.perf_counter() - t0)
+        if espera > 0:
+            time.sleep(espera)
+        self.llamadas += 1
+        self.imagenes += len(lista)
+        return resultados
+
+
+def registrar_detector_simulado(retardo_ms=10.0, retardo_lote_ms=2.0, ruta=RUTA_DETECTOR_SIMULADO):
+    '''
+    Registra un DetectorSimulado en RegistroModelos bajo `ruta`; los PavementProcessor creados
+    con model_path=ruta lo usan en lugar de cargar YOLO.
+
+    Retorna:
+        DetectorSimulado: El detector registrado.
+    '''
+    from backend import RegistroModelos
+
+    detector = DetectorSimulado(retardo_ms, retardo_lote_ms)
+    RegistroModelos.registrar(ruta, detector)
+    return detector
+
+
+# ------------------------------------------------------------------------------------------------------------------------------------------
+# Mediciones
+# ------------------------------------------------------------------------------------------------------------------------------------------
+
+def _resultado(etapa, caso, valor, unidad, mayor_es_mejor, repeticiones, **parametros):
+    # Una medición; "id" es estable entre ejecuciones y es lo que usa comparar()
+    return {
+        "id": f"{etapa}/{caso}",
+        "etapa": etapa,
+        "caso": caso,
+        "valor": float(valor),
+        "unidad": unidad,
+        "mayor_es_mejor": mayor_es_mejor,
+        "repeticiones": [float(r) for r in repeticiones],
+        "parametros": parametros,
+    }
+
+
+def _primeros_frames(video_path, cantidad, paso=1):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    indice = 0
+    while len(frames) < cantidad:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if indice % paso == 0:
+            frames.append(frame)
+        indice += 1
+    cap.release()
+    return frames
+
+
+def medir_flatfield(video_path, nombre, repeticiones=3, cuadros=10, paso=20):
+    '''
+    Mide imflatfield en cada modo (ms por frame) sobre frames del video.
+
+    Parámetros:
+        video_path (str): Video sintético.
+        nombre (str): Nombre del caso (resolución y duración).
+        repeticiones (int): Pasadas sobre los frames (se toma la mejor).
+        cuadros (int): Frames medidos por pasada.
+        paso (int): Separación entre frames (el modo incremental ve frames muestreados consecutivos).
+
+    Retorna:
+        list: Mediciones (ver _resultado).
+    '''
+    from backend import FlatFieldIncremental, PoolBuffers, imflatfield
+
+    frames = _primeros_frames(video_path, cuadros, paso)
+    resultados = []
+    for modo in ("exacto", "rapido", "incremental"):
+        pool = PoolBuffers()
+        tiempos = []
+        for _ in range(repeticiones):
+            incremental = FlatFieldIncremental(pool=pool)
+            t0 = time.perf_counter()
+            for frame in frames:
+                salida = incremental(frame) if modo == "incremental" else imflatfield(frame, modo=modo, pool=pool)
+                pool.devolver(salida)
+            tiempos.append((time.perf_counter() - t0) / len(frames) * 1000)
+        resultados.append(_resultado(
+            "imflatfield", f"{modo}/{nombre}", min(tiempos), "ms/frame", False, tiempos, modo=modo, frames=len(frames),
+        ))
+    return resultados
+
+
+def medir_decodificacion(video_path, nombre, repeticiones=3, paso=20):
+    '''
+    Mide la lectura del video (frames del video recorridos por segundo): cap.read de todos los
+    frames y LectorMuestreado con un paso fijo (grab de los omitidos, retrieve de las muestras).
+
+    Retorna:
+        list: Mediciones (ver _resultado).
+    '''
+    from backend import LectorMuestreado, PoolBuffers
+
+    tiempos = {"read": [], f"muestreado_paso_{paso}": []}
+    total = 0
+    for _ in range(repeticiones):
+        cap = cv2.VideoCapture(video_path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        t0 = time.perf_counter()
+        while cap.read()[0]:
+            pass
+        tiempos["read"].append(total / (time.perf_counter() - t0))
+        cap.release()
+
+        cap = cv2.VideoCapture(video_path)
+        pool = PoolBuffers()
+        t0 = time.perf_counter()
+        for muestra in LectorMuestreado(cap, 0, total, paso=paso, pool=pool):
+            pool.devolver(muestra.frame)
+        tiempos[f"muestreado_paso_{paso}"].append(total / (time.perf_counter() - t0))
+        cap.release()
+    return [
+        _resultado("decodificacion", f"{caso}/{nombre}", max(valores), "frames/s", True, valores, frames=total)
+        for caso, valores in tiempos.items()
+    ]
+
+
+def medir_sumideros(carpeta, filas=20000, repeticiones=3):
+    '''
+    Mide cada sumidero de resultados (filas agregadas por segundo, incluido el cierre) y el
+    almacén columnar en memoria.
+
+    Retorna:
+        list: Mediciones (ver _resultado).
+    '''
+    from almacenamiento import SUMIDEROS, AlmacenDetecciones, crear_sumidero
+
+    fila = {"Minuto": 1, "Segundo": 30, "Huecos": 2, "Grietas": 1, "Piel de cocodrilo": 0}
+    resultados = []
+    for formato in SUMIDEROS:
+        tiempos = []
+        try:
+            for _ in range(repeticiones):
+                sumidero = crear_sumidero(formato, os.path.join(carpeta, f"sumidero_{formato}"))
+                t0 = time.perf_counter()
+                for _ in range(filas):
+                    sumidero.agregar(fila)
+                sumidero.cerrar()
+                tiempos.append(filas / (time.perf_counter() - t0))
+        except ImportError as e:
+            print(f"Sumidero {formato} omitido: {e}")
+            continue
+        resultados.append(_resultado("sumidero", formato, max(tiempos), "filas/s", True, tiempos, filas=filas))
+
+    rng = np.random.default_rng(0)
+    clases = rng.integers(0, 3, 4)
+    confianzas = rng.uniform(0.3, 1, 4).astype(np.float32)
+    xyxy = rng.uniform(0, 640, (4, 4)).astype(np.float32)
+    tiempos = []
+    for _ in range(repeticiones):
+        almacen = AlmacenDetecciones()
+        t0 = time.perf_counter()
+        for i in range(filas):
+            almacen.agregar(i, i * 33.3, (1, 1, 2), clases, confianzas, xyxy)
+        tiempos.append(filas / (time.perf_counter() - t0))
+    resultados.append(_resultado("sumidero", "almacen", max(tiempos), "filas/s", True, tiempos, filas=filas))
+    return resultados
+
+
+def medir_extremo_a_extremo(video_path, nombre, carpeta, repeticiones=3, paso=20, modo_flatfield="rapido",
+                            configuraciones=CONFIGURACIONES_EXTREMO):
+    '''
+    Mide procesar_video completo con el detector simulado (frames del video por segundo).
+    Cada repetición usa un PavementProcessor nuevo; el modelo ya está registrado, así que no
+    hay arranque en frío.
+
+    Retorna:
+        list: Mediciones (ver _resultado), con las muestras inferidas y las filas del reporte.
+    '''
+    from backend import PavementProcessor
+
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    resultados = []
+    for caso, argumentos, con_video in configuraciones:
+        tiempos = []
+        for _ in range(repeticiones):
+            procesador = PavementProcessor(
+                RUTA_DETECTOR_SIMULADO, modo_flatfield=modo_flatfield, calentar=False,
+                ruta_excel=os.path.join(carpeta, f"extremo_{caso}.xlsx"),
+            )
+            salida = os.path.join(carpeta, f"extremo_{caso}.mp4") if con_video else None
+            t0 = time.perf_counter()
+            procesador.procesar_video(video_path, salida, todo=True, paso=paso, **argumentos)
+            tiempos.append(total / (time.perf_counter() - t0))
+        resultados.append(_resultado(
+            "extremo_a_extremo", f"{caso}/{nombre}", max(tiempos), "frames/s", True, tiempos,
+            frames=total, paso=paso, modo_flatfield=modo_flatfield, video=con_video,
+            filas_reporte=len(procesador.detecciones), **argumentos,
+        ))
+    return resultados
+
+
+# ------------------------------------------------------------------------------------------------------------------------------------------
+# Ejecución y comparación
+# ------------------------------------------------------------------------------------------------------------------------------------------
+
+def entorno():
+    '''
+    Retorna:
+        dict: Versión de Python, NumPy y OpenCV, plataforma, CPUs y commit de git (si lo hay).
+    '''
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def ejecutar_benchmark(resoluciones=((640, 360), (1280, 720), (1920, 1080)), duraciones=(10,), fps=30,
+                       repeticiones=3, paso=20, retardo_ms=10.0, retardo_lote_ms=2.0, filas_sumidero=20000,
+                       etapas=("imflatfield", "decodificacion", "sumidero", "extremo_a_extremo"),
+                       carpeta_videos=None, semilla=0):
+    '''
+    Ejecuta el benchmark completo.
+
+    Parámetros:
+        resoluciones (tuple): Pares (ancho, alto) de los videos sintéticos.
+        duraciones (tuple): Duraciones en segundos de los videos sintéticos.
+        fps (float): Cuadros por segundo de los videos.
+        repeticiones (int): Repeticiones por medición (se reporta la mejor y se guardan todas).
+        paso (int): Se infiere un frame de cada `paso` en las mediciones de extremo a extremo.
+        retardo_ms (float): Latencia simulada del detector por imagen.
+        retardo_lote_ms (float): Latencia simulada del detector por llamada.
+        filas_sumidero (int): Filas agregadas por medición de sumidero.
+        etapas (tuple): Etapas a medir.
+        carpeta_videos (str): Carpeta donde se generan (y reutilizan) los videos sintéticos.
+            None usa ~/.cache/reconocimiento_vial/benchmark.
+        semilla (int): Semilla de los videos.
+
+    Retorna:
+        dict: {"version", "fecha", "entorno", "parametros", "resultados"} listo para json.dump.
+    '''
+    if carpeta_videos is None:
+        carpeta_videos = os.path.join(os.path.expanduser("~"), ".cache", "reconocimiento_vial", "benchmark")
+    parametros = {
+        "resoluciones": [f"{ancho}x{alto}" for ancho, alto in resoluciones],
+        "duraciones": list(duraciones), "fps": fps, "repeticiones": repeticiones, "paso": paso,
+        "retardo_ms": retardo_ms, "retardo_lote_ms": retardo_lote_ms, "filas_sumidero": filas_sumidero,
+        "etapas": list(etapas), "semilla": semilla,
+    }
+    registrar_detector_simulado(retardo_ms, retardo_lote_ms)
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as carpeta:
+        if "sumidero" in etapas:
+            print("Midiendo sumideros...")
+            resultados += medir_sumideros(carpeta, filas_sumidero, repeticiones)
+        for ancho, alto in resoluciones:
+            for segundos in duraciones:
+                nombre = f"{ancho}x{alto}_{segundos:g}s"
+                video_path = video_sintetico(carpeta_videos, ancho, alto, segundos, fps, semilla)
+                print(f"Midiendo {nombre}...")
+                if "imflatfield" in etapas:
+                    resultados += medir_flatfield(video_path, nombre, repeticiones, paso=paso)
+                if "decodificacion" in etapas:
+                    resultados += medir_decodificacion(video_path, nombre, repeticiones, paso)
+                if "extremo_a_extremo" in etapas:
+                    resultados += medir_extremo_a_extremo(video_path, nombre, carpeta, repeticiones, paso)
+    for r in resultados:
+        print(f"{r['id']:<50}{r['valor']:>12.2f} {r['unidad']}")
+    return {
+        "version": VERSION_BENCHMARK,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "entorno": entorno(),
+        "parametros": parametros,
+        "resultados": resultados,
+    }
+
+
+def comparar(base, nuevo, tolerancia=0.1):
+    '''
+    Compara dos resultados de ejecutar_benchmark medición por medición (por id).
+
+    Parámetros:
+        base (dict): Resultados de referencia.
+        nuevo (dict): Resultados a comparar.
+        tolerancia (float): Empeoramiento relativo a partir del cual una medición es una regresión.
+
+    Retorna:
+        list: Por medición común: {"id", "base", "nuevo", "unidad", "mejora", "regresion"}, donde
+        mejora es el factor de mejora (>1 es mejor, sin importar si la unidad crece o decrece).
+    '''
+    anteriores = {r["id"]: r for r in base["resultados"]}
+    filas = []
+    for r in nuevo["resultados"]:
+        anterior = anteriores.get(r["id"])
+        if anterior is None or anterior["unidad"] != r["unidad"]:
+            continue
+        if r["mayor_es_mejor"]:
+            mejora = r["valor"] / max(anterior["valor"], 1e-12)
+        else:
+            mejora = anterior["valor"] / max(r["valor"], 1e-12)
+        filas.append({
+            "id": r["id"], "base": anterior["valor"], "nuevo": r["valor"], "unidad": r["unidad"],
+            "mejora": mejora, "regresion": mejora < 1 - tolerancia,
+        })
+    return filas
+
+
+def _resolucion(texto):
+    ancho, alto = texto.lower().split("x")
+    return int(ancho), int(alto)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark reproducible del backend con videos sintéticos.")
+    parser.add_argument(
+        "--resoluciones", nargs="+", type=_resolucion, default=[(640, 360), (1280, 720), (1920, 1080)],
+        help="Resoluciones ANCHOxALTO de los videos sintéticos.",
+    )
+    parser.add_argument("--duraciones", nargs="+", type=float, default=[10], help="Duraciones en segundos.")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--paso", type=int, default=20)
+    parser.add_argument("--retardo-ms", type=float, default=10.0, help="Latencia simulada del detector por imagen.")
+    parser.add_argument("--retardo-lote-ms", type=float, default=2.0, help="Latencia simulada por llamada.")
+    parser.add_argument("--filas-sumidero", type=int, default=20000)
+    parser.add_argument(
+        "--etapas", nargs="+", default=["imflatfield", "decodificacion", "sumidero", "extremo_a_extremo"],
+        choices=["imflatfield", "decodificacion", "sumidero", "extremo_a_extremo"],
+    )
+    parser.add_argument("--videos", default=None, help="Carpeta de los videos sintéticos (se reutilizan).")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument(
+        "-o", "--salida", default=None,
+        help="JSON de resultados. Por defecto benchmarks/benchmark_<commit>.json.",
+    )
+    parser.add_argument(
+        "--comparar", nargs=2, metavar=("BASE", "NUEVO"), default=None,
+        help="Compara dos JSON de resultados en lugar de medir; termina con código 1 si hay regresiones.",
+    )
+    parser.add_argument("--tolerancia", type=float, default=0.1, help="Empeoramiento relativo admitido al comparar.")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        with open(args.comparar[0], encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.comparar[1], encoding="utf-8") as f:
+            nuevo = json.load(f)
+        filas = comparar(base, nuevo, args.tolerancia)
+        for fila in filas:
+            marca = "  REGRESIÓN" if fila["regresion"] else ""
+            print(f"{fila['id']:<50}{fila['base']:>12.2f}{fila['nuevo']:>12.2f} {fila['unidad']:<9}"
+                  f"x{fila['mejora']:.2f}{marca}")
+        return 1 if any(fila["regresion"] for fila in filas) else 0
+
+    reporte = ejecutar_benchmark(
+        args.resoluciones, args.duraciones, args.fps, args.repeticiones, args.paso, args.retardo_ms,
+        args.retardo_lote_ms, args.filas_sumidero, args.etapas, args.videos, args.semilla,
+    )
+    salida = args.salida or os.path.join("benchmarks", f"benchmark_{reporte['entorno']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
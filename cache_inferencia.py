@@ -0,0 +1,243 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: Caché en disco de las detecciones por frame muestreado. Cada entrada se identifica por el contenido -----------------
+------------- del video, el de los pesos del modelo y los parámetros de preprocesado, de modo que volver a procesar el mismo ----------------
+------------- video (otra ruta de salida, otro intervalo, reexportar el Excel) no repite la inferencia de los frames ya vistos. ---------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+'''
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Versión del formato de las entradas; cambiarla invalida la caché existente
+VERSION_CACHE = 1
+
+# Huellas ya calculadas: {(ruta, tamaño, mtime): huella}
+_HUELLAS = {}
+
+
+def huella_archivo(ruta, completo=True, bloque=1 << 20, muestras=16):
+    '''
+    Calcula el SHA-256 del contenido de un archivo.
+
+    Parámetros:
+        ruta (str): Ruta del archivo.
+        completo (bool): Si True, lee todo el archivo. Si False (videos de varios GB), lee el
+            primer y el último bloque y `muestras` bloques repartidos de forma uniforme, junto con
+            el tamaño del archivo.
+        bloque (int): Tamaño en bytes de cada bloque leído.
+        muestras (int): Bloques intermedios leídos cuando completo es False.
+
+    Retorna:
+        str: Huella hexadecimal. Se memoriza por (ruta, tamaño, fecha de modificación).
+    '''
+    estado = os.stat(ruta)
+    memo = (os.path.abspath(ruta), estado.st_size, estado.st_mtime_ns, completo)
+    if memo in _HUELLAS:
+        return _HUELLAS[memo]
+    h = hashlib.sha256(str(estado.st_size).encode())
+    with open(ruta, "rb") as f:
+        if completo or estado.st_size <= bloque * (muestras + 2):
+            for datos in iter(lambda: f.read(bloque), b""):
+                h.update(datos)
+        else:
+            posiciones = np.linspace(0, estado.st_size - bloque, muestras + 2).astype(np.int64)
+            for posicion in posiciones:
+                f.seek(int(posicion))
+                h.update(f.read(bloque))
+    _HUELLAS[memo] = h.hexdigest()
+    return _HUELLAS[memo]
+
+
+def _a_bytes(clases, confianzas, xyxy):
+    # (n, 6) float32: clase, confianza, x1, y1, x2, y2 (las clases son enteros pequeños, exactos en float32)
+    return np.column_stack([clases.astype(np.float32), confianzas, xyxy]).astype(np.float32).tobytes()
+
+
+def _de_bytes(datos):
+    tabla = np.frombuffer(datos, dtype=np.float32).reshape(-1, 6)
+    return tabla[:, 0].astype(np.int64), tabla[:, 1].copy(), tabla[:, 2:].copy()
+
+
+class CacheInferencia:
+    '''
+    Caché en disco (SQLite) de las cajas detectadas en cada frame muestreado.
+
+    Las entradas se agrupan por clave (huella del video + huella de los pesos + parámetros) y
+    se indexan por número de frame, así que dos intervalos que se solapan comparten los frames
+    comunes. Cuando el tamaño total supera `limite_bytes`, se eliminan las claves usadas hace
+    más tiempo (LRU).
+
+    Atributos:
+        ruta (str): Archivo SQLite de la caché.
+        limite_bytes (int): Tamaño máximo de los datos guardados.
+        intervalo_escritura (int): Entradas nuevas acumuladas antes de escribirlas en disco.
+    '''
+
+    def __init__(self, ruta=None, limite_bytes=512 * 1024 * 1024, intervalo_escritura=256):
+        '''
+        Parámetros:
+            ruta (str): Archivo SQLite. None usa ~/.cache/reconocimiento_vial/inferencia.sqlite.
+            limite_bytes (int): Tamaño máximo de la caché en bytes.
+            intervalo_escritura (int): Entradas nuevas que se acumulan antes de escribirlas.
+        '''
+        if ruta is None:
+            ruta = os.path.join(os.path.expanduser("~"), ".cache", "reconocimiento_vial", "inferencia.sqlite")
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(carpeta, exist_ok=True)
+        self.ruta = ruta
+        self.limite_bytes = limite_bytes
+        self.intervalo_escritura = intervalo_escritura
+        self._pendientes = []
+        self._bloqueo = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS claves (
+                clave TEXT PRIMARY KEY, descripcion TEXT, bytes INTEGER NOT NULL DEFAULT 0, ultimo_uso REAL
+            );
+            CREATE TABLE IF NOT EXISTS entradas (
+                clave TEXT NOT NULL, indice INTEGER NOT NULL, cajas BLOB NOT NULL, PRIMARY KEY (clave, indice)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conexion.commit()
+
+    def __getstate__(self):
+        # Solo viaja la configuración (por ejemplo, a los procesos del lote); cada proceso abre su conexión
+        return {"ruta": self.ruta, "limite_bytes": self.limite_bytes, "intervalo_escritura": self.intervalo_escritura}
+
+    def __setstate__(self, estado):
+        self.__init__(**estado)
+
+    @staticmethod
+    def clave(video_path, model_path, parametros):
+        '''
+        Calcula la clave de un video procesado con unos pesos y unos parámetros.
+
+        Parámetros:
+            video_path (str): Ruta del video (se usa una huella de su contenido).
+            model_path (str): Ruta de los pesos (se usa la huella completa del archivo).
+            parametros (dict): Parámetros que afectan a las detecciones (serializables en JSON).
+
+        Retorna:
+            tuple: (clave, descripcion) donde descripcion es el JSON legible de lo que identifica la clave.
+        '''
+        descripcion = json.dumps(
+            {
+                "version": VERSION_CACHE,
+                "video": huella_archivo(video_path, completo=False),
+                "modelo": huella_archivo(model_path) if os.path.exists(model_path) else os.path.basename(model_path),
+                "parametros": parametros,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(descripcion.encode()).hexdigest(), descripcion
+
+    def cargar(self, clave, inicio, fin, descripcion=None):
+        '''
+        Lee las entradas de una clave en el rango de frames [inicio, fin) y marca la clave como usada.
+
+        Retorna:
+            dict: {indice: (clases, confianzas, xyxy)}.
+        '''
+        with self._bloqueo:
+            self._conexion.execute(
+                "INSERT INTO claves (clave, descripcion, ultimo_uso) VALUES (?, ?, ?) "
+                "ON CONFLICT(clave) DO UPDATE SET ultimo_uso = excluded.ultimo_uso",
+                (clave, descripcion, time.time()),
+            )
+            self._conexion.commit()
+            filas = self._conexion.execute(
+                "SELECT indice, cajas FROM entradas WHERE clave = ? AND indice >= ? AND indice < ?",
+                (clave, inicio, fin),
+            ).fetchall()
+        return {indice: _de_bytes(cajas) for indice, cajas in filas}
+
+    def guardar(self, clave, indice, cajas):
+        '''
+        Agrega las cajas (clases, confianzas, xyxy) de un frame. Se escriben en disco cada
+        `intervalo_escritura` entradas o al llamar a sincronizar.
+        '''
+        with self._bloqueo:
+            self._pendientes.append((clave, int(indice), _a_bytes(*cajas)))
+            lleno = len(self._pendientes) >= self.intervalo_escritura
+        if lleno:
+            self.sincronizar()
+
+    def sincronizar(self):
+        '''
+        Escribe en disco las entradas pendientes y actualiza el tamaño de cada clave.
+        '''
+        with self._bloqueo:
+            pendientes, self._pendientes = self._pendientes, []
+            if not pendientes:
+                return
+            self._conexion.executemany(
+                "INSERT OR REPLACE INTO entradas (clave, indice, cajas) VALUES (?, ?, ?)", pendientes
+            )
+            for clave in {p[0] for p in pendientes}:
+                self._conexion.execute(
+                    "UPDATE claves SET bytes = (SELECT COALESCE(SUM(LENGTH(cajas)), 0) FROM entradas WHERE clave = ?) "
+                    "WHERE clave = ?",
+                    (clave, clave),
+                )
+            self._conexion.commit()
+
+    def tamano(self):
+        '''
+        Retorna:
+            int: Bytes de datos guardados en la caché.
+        '''
+        with self._bloqueo:
+            return self._conexion.execute("SELECT COALESCE(SUM(bytes), 0) FROM claves").fetchone()[0]
+
+    def recortar(self, conservar=None):
+        '''
+        Elimina las claves usadas hace más tiempo hasta que la caché cabe en limite_bytes.
+
+        Parámetros:
+            conservar (str): Clave que no se elimina aunque la caché siga excediendo el límite
+                (la del video en curso).
+        '''
+        self.sincronizar()
+        with self._bloqueo:
+            total = self._conexion.execute("SELECT COALESCE(SUM(bytes), 0) FROM claves").fetchone()[0]
+            if total <= self.limite_bytes:
+                return
+            for clave, tamano in self._conexion.execute(
+                "SELECT clave, bytes FROM claves ORDER BY ultimo_uso ASC"
+            ).fetchall():
+                if total <= self.limite_bytes:
+                    break
+                if clave == conservar:
+                    continue
+                self._conexion.execute("DELETE FROM entradas WHERE clave = ?", (clave,))
+                self._conexion.execute("DELETE FROM claves WHERE clave = ?", (clave,))
+                total -= tamano
+            self._conexion.commit()
+
+    def limpiar(self):
+        '''
+        Elimina todas las entradas de la caché.
+        '''
+        with self._bloqueo:
+            self._pendientes = []
+            self._conexion.execute("DELETE FROM entradas")
+            self._conexion.execute("DELETE FROM claves")
+            self._conexion.commit()
+
+    def cerrar(self):
+        self.sincronizar()
+        self._conexion.close()
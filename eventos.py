@@ -0,0 +1,392 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: API de eventos del procesamiento, alternativa al callback síncrono. El procesamiento corre en un -------------------
+------------- hilo propio y publica eventos tipados (detección, progreso, vista previa y finalizado) en suscripciones que se ----------------
+------------- consumen con un iterador o con async for. Cada suscripción elige los tipos que recibe y su política ante un -----------------
+------------- consumidor lento; los frames de la vista previa solo se reducen y copian si alguna suscripción los pidió. -----------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+
+Uso:
+    for evento in procesador.eventos("recorrido.mp4", None, tipos=("deteccion",)):
+        print(evento.ms, evento.conteos)
+
+    async for evento in procesador.eventos("recorrido.mp4", None, tipos=("progreso",), politica="ultimo"):
+        ...
+'''
+
+import asyncio
+import threading
+import time
+from collections import deque
+import cv2
+
+# Tipos de evento y políticas ante un consumidor lento
+TIPOS_EVENTO = ("deteccion", "progreso", "vista_previa", "finalizado")
+POLITICAS = ("bloquear", "descartar_antiguos", "descartar_nuevos", "ultimo")
+
+
+class Evento:
+    '''
+    Clase base de los eventos.
+
+    Atributos:
+        tipo (str): Uno de TIPOS_EVENTO.
+        t (float): Instante de publicación (time.perf_counter).
+    '''
+
+    tipo = None
+
+    def __init__(self):
+        self.t = time.perf_counter()
+
+    def __repr__(self):
+        campos = ", ".join(f"{k}={v!r}" for k, v in vars(self).items() if k != "t" and not hasattr(v, "shape"))
+        return f"{type(self).__name__}({campos})"
+
+
+class EventoDeteccion(Evento):
+    '''
+    Muestra con al menos una imperfección registrada.
+
+    Atributos:
+        indice (int): Índice del frame.
+        ms (float): Marca de tiempo en milisegundos.
+        conteos (dict): Imperfecciones registradas por clase (con seguimiento, solo las nuevas).
+        clases (np.ndarray): Clase de cada caja visible.
+        confianzas (np.ndarray): Confianza de cada caja.
+        xyxy (np.ndarray): Coordenadas (n, 4) de cada caja en el frame completo.
+    '''
+
+    tipo = "deteccion"
+
+    def __init__(self, indice, ms, conteos, clases, confianzas, xyxy):
+        super().__init__()
+        self.indice = indice
+        self.ms = ms
+        self.conteos = conteos
+        self.clases = clases
+        self.confianzas = confianzas
+        self.xyxy = xyxy
+
+
+class EventoProgreso(Evento):
+    '''
+    Una muestra procesada (con o sin detecciones).
+
+    Atributos:
+        indice (int): Índice del frame.
+        progreso (float): Porcentaje del intervalo procesado.
+        conteos (dict): Imperfecciones visibles en la muestra por clase.
+        totales (dict): Imperfecciones registradas desde el inicio por clase.
+    '''
+
+    tipo = "progreso"
+
+    def __init__(self, indice, progreso, conteos, totales):
+        super().__init__()
+        self.indice = indice
+        self.progreso = progreso
+        self.conteos = conteos
+        self.totales = totales
+
+
+class EventoVistaPrevia(Evento):
+    '''
+    Frames reducidos al tamaño de la vista previa (copias propias del evento).
+
+    Atributos:
+        indice (int): Índice del frame.
+        frame_inferido (np.ndarray): Frame BGR con las detecciones dibujadas.
+        frame (np.ndarray): Frame BGR original.
+    '''
+
+    tipo = "vista_previa"
+
+    def __init__(self, indice, frame_inferido, frame):
+        super().__init__()
+        self.indice = indice
+        self.frame_inferido = frame_inferido
+        self.frame = frame
+
+
+class EventoFinalizado(Evento):
+    '''
+    Fin del procesamiento (siempre es el último evento y nunca se descarta).
+
+    Atributos:
+        salida: Lo que retornó el método de procesamiento (ruta del video o estadísticas en vivo).
+        detecciones (int): Muestras con detecciones en el almacén.
+        error (Exception): Excepción que detuvo el procesamiento, o None.
+        cancelado (bool): True si se detuvo con cancelar().
+    '''
+
+    tipo = "finalizado"
+
+    def __init__(self, salida, detecciones, error=None, cancelado=False):
+        super().__init__()
+        self.salida = salida
+        self.detecciones = detecciones
+        self.error = error
+        self.cancelado = cancelado
+
+
+class Suscripcion:
+    '''
+    Buffer de eventos de un consumidor. Se recorre con for (bloqueante) o async for, y termina
+    tras el último evento del procesamiento; si este falló, la iteración relanza el error.
+
+    Políticas cuando el buffer está lleno:
+        "bloquear": el procesamiento espera a que el consumidor libere espacio (no se pierde nada).
+        "descartar_antiguos": se descarta el evento más antiguo del buffer.
+        "descartar_nuevos": se descarta el evento que llega.
+        "ultimo": se conserva solo el evento más reciente de cada tipo (ideal para progreso y vista previa).
+
+    Atributos:
+        tipos (frozenset): Tipos de evento que recibe.
+        politica (str): Una de POLITICAS.
+        capacidad (int): Eventos máximos en el buffer.
+        descartados (int): Eventos descartados por la política.
+    '''
+
+    def __init__(self, tipos=None, politica="bloquear", capacidad=64):
+        tipos = TIPOS_EVENTO if tipos is None else tipos
+        desconocidos = set(tipos) - set(TIPOS_EVENTO)
+        if desconocidos:
+            raise ValueError(f"Tipos de evento no soportados: {sorted(desconocidos)}")
+        if politica not in POLITICAS:
+            raise ValueError(f"Política no soportada: {politica}")
+        self.tipos = frozenset(tipos)
+        self.politica = politica
+        self.capacidad = max(1, capacidad)
+        self.descartados = 0
+        self._eventos = deque()
+        self._condicion = threading.Condition()
+        self._terminada = False
+        self._cerrada = False
+        self._error = None
+        self._flujo = None
+
+    def quiere(self, tipo):
+        return tipo in self.tipos and not self._cerrada
+
+    def entregar(self, evento):
+        '''
+        Agrega un evento aplicando la política (lo llama el hilo del procesamiento).
+        '''
+        with self._condicion:
+            if self._cerrada:
+                return
+            if self.politica == "ultimo":
+                anteriores = [e for e in self._eventos if e.tipo == evento.tipo]
+                for anterior in anteriores:
+                    self._eventos.remove(anterior)
+                self.descartados += len(anteriores)
+            elif len(self._eventos) >= self.capacidad and evento.tipo != "finalizado":
+                if self.politica == "bloquear":
+                    while len(self._eventos) >= self.capacidad and not self._cerrada:
+                        self._condicion.wait()
+                    if self._cerrada:
+                        return
+                elif self.politica == "descartar_antiguos":
+                    self._eventos.popleft()
+                    self.descartados += 1
+                else:
+                    self.descartados += 1
+                    return
+            self._eventos.append(evento)
+            self._condicion.notify_all()
+
+    def terminar(self, error=None):
+        '''
+        Marca que no habrá más eventos (lo llama el hilo del procesamiento).
+        '''
+        with self._condicion:
+            self._terminada = True
+            self._error = error
+            self._condicion.notify_all()
+
+    def cerrar(self):
+        '''
+        El consumidor deja de leer: cancela el procesamiento y libera al productor si estaba bloqueado.
+        '''
+        with self._condicion:
+            self._cerrada = True
+            self._eventos.clear()
+            self._condicion.notify_all()
+        if self._flujo is not None:
+            self._flujo.cancelar()
+
+    def tomar(self, timeout=None):
+        '''
+        Retorna:
+            tuple: (evento o None, True si la suscripción terminó y no quedan eventos).
+        '''
+        with self._condicion:
+            if not self._eventos and not self._terminada and not self._cerrada:
+                self._condicion.wait(timeout)
+            if self._eventos:
+                evento = self._eventos.popleft()
+                self._condicion.notify_all()
+                return evento, False
+            return None, self._terminada or self._cerrada
+
+    def __iter__(self):
+        try:
+            while True:
+                evento, fin = self.tomar(timeout=0.5)
+                if evento is not None:
+                    yield evento
+                elif fin:
+                    break
+        finally:
+            if not self._terminada:
+                self.cerrar()
+        if self._error is not None:
+            raise self._error
+
+    async def __aiter__(self):
+        try:
+            while True:
+                evento, fin = await asyncio.to_thread(self.tomar, 0.1)
+                if evento is not None:
+                    yield evento
+                elif fin:
+                    break
+        finally:
+            if not self._terminada:
+                self.cerrar()
+        if self._error is not None:
+            raise self._error
+
+
+class FlujoEventos:
+    '''
+    Ejecuta procesar_video (o procesar_en_vivo) en un hilo y reparte sus eventos entre las
+    suscripciones. El procesador publica a través de publicar(), llamado desde
+    PavementProcessor._publicar_resultado y _procesar_cuadro_a_cuadro en lugar del callback.
+
+    Uso:
+        flujo = FlujoEventos(procesador, "recorrido.mp4", None)
+        detecciones = flujo.suscribir(("deteccion",), politica="bloquear")
+        vista = flujo.suscribir(("vista_previa", "progreso"), politica="ultimo")
+        flujo.iniciar()
+
+    Atributos:
+        procesador (PavementProcessor): Procesador que ejecuta el trabajo.
+        suscripciones (list): Suscripciones registradas.
+        tamano_vista (tuple): (ancho, alto) de los frames de vista previa.
+        fps_vista (float): Vistas previas máximas por segundo (None: una por muestra).
+    '''
+
+    def __init__(self, procesador, *args, en_vivo=False, tamano_vista=(600, 300), fps_vista=None, **kwargs):
+        '''
+        Parámetros:
+            procesador (PavementProcessor): Procesador que ejecuta el trabajo.
+            *args, **kwargs: Argumentos de procesar_video (o de procesar_en_vivo si en_vivo es True),
+                excepto callback.
+            en_vivo (bool): Usa procesar_en_vivo.
+            tamano_vista (tuple): (ancho, alto) de los frames de vista previa.
+            fps_vista (float): Vistas previas máximas por segundo.
+        '''
+        self.procesador = procesador
+        self.suscripciones = []
+        self.tamano_vista = tamano_vista
+        self.fps_vista = fps_vista
+        self._metodo = procesador.procesar_en_vivo if en_vivo else procesador.procesar_video
+        self._args = args
+        self._kwargs = kwargs
+        self._totales = {0: 0, 1: 0, 2: 0}
+        self._ultima_vista = 0.0
+        self._hilo = None
+
+    def suscribir(self, tipos=None, politica="bloquear", capacidad=64):
+        '''
+        Registra una suscripción (antes de iniciar).
+
+        Retorna:
+            Suscripcion: Iterable (for o async for) con los eventos de `tipos`.
+        '''
+        suscripcion = Suscripcion(tipos, politica, capacidad)
+        suscripcion._flujo = self
+        self.suscripciones.append(suscripcion)
+        return suscripcion
+
+    @property
+    def quiere_vista(self):
+        return any(s.quiere("vista_previa") for s in self.suscripciones)
+
+    def _entregar(self, evento):
+        for suscripcion in self.suscripciones:
+            if suscripcion.quiere(evento.tipo):
+                suscripcion.entregar(evento)
+
+    def publicar(self, indice, ms, progreso, conteos, registrados, cajas, frame_inferido, frame):
+        '''
+        Publica los eventos de una muestra procesada (lo llama el procesador).
+
+        Parámetros:
+            indice (int): Índice del frame.
+            ms (float): Marca de tiempo en milisegundos.
+            progreso (float): Porcentaje procesado.
+            conteos (dict): Imperfecciones visibles por clase.
+            registrados (dict): Imperfecciones registradas por clase (las que van al reporte).
+            cajas (tuple): (clases, confianzas, xyxy) de la muestra.
+            frame_inferido (np.ndarray): Frame con las detecciones dibujadas, o None.
+            frame (np.ndarray): Frame original (pertenece al pool: solo se usa durante la llamada).
+        '''
+        for clase, cantidad in registrados.items():
+            self._totales[clase] += cantidad
+        if any(registrados.values()):
+            self._entregar(EventoDeteccion(indice, ms, dict(registrados), *cajas))
+        self._entregar(EventoProgreso(indice, progreso, dict(conteos), dict(self._totales)))
+        if frame_inferido is not None and self.quiere_vista:
+            ahora = time.perf_counter()
+            if self.fps_vista is None or ahora - self._ultima_vista >= 1.0 / self.fps_vista:
+                self._ultima_vista = ahora
+                self._entregar(EventoVistaPrevia(
+                    indice,
+                    cv2.resize(frame_inferido, self.tamano_vista, interpolation=cv2.INTER_AREA),
+                    cv2.resize(frame, self.tamano_vista, interpolation=cv2.INTER_AREA),
+                ))
+
+    def _ejecutar(self):
+        salida, error = None, None
+        try:
+            salida = self._metodo(*self._args, **self._kwargs)
+        except Exception as e:
+            error = e
+        finally:
+            self.procesador.emisor = None
+            self._entregar(EventoFinalizado(
+                salida, len(self.procesador.detecciones), error, self.procesador._cancelado.is_set()
+            ))
+            for suscripcion in self.suscripciones:
+                suscripcion.terminar(error)
+
+    def iniciar(self):
+        '''
+        Inicia el procesamiento en un hilo.
+
+        Retorna:
+            FlujoEventos: El propio flujo.
+        '''
+        self.procesador.emisor = self
+        self.procesador._programar_ejecucion()
+        self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+        self._hilo.start()
+        return self
+
+    def cancelar(self):
+        '''
+        Detiene el procesamiento si ninguna suscripción sigue abierta.
+        '''
+        if all(s._cerrada for s in self.suscripciones):
+            self.procesador.cancelar()
+
+    def esperar(self, timeout=None):
+        if self._hilo is not None:
+            self._hilo.join(timeout)
@@ -0,0 +1,184 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: Instrumentación del procesamiento por etapas (decodificación, preprocesado, inferencia, dibujo, ---------------------
+------------- escritura del video, registro de resultados e interfaz). Mide el tiempo de cada llamada, la profundidad de las --------------
+------------- colas del pipeline y el rendimiento global, y genera un reporte con percentiles p50/p95/p99 por etapa. -------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+'''
+
+import json
+import time
+import numpy as np
+
+# Orden de las etapas en los reportes
+ETAPAS = (
+    "decodificacion", "preprocesado", "inferencia", "seguimiento", "dibujo", "escritura", "registro",
+    "interfaz", "punto_control", "excel", "latencia",
+)
+
+
+class MetricasEtapas:
+    '''
+    Acumula la duración de cada llamada por etapa y muestras de la profundidad de las colas.
+
+    Uso en el bucle de procesamiento:
+        t = metricas.tiempo()
+        ...trabajo de la etapa...
+        metricas.registrar("inferencia", t)
+
+    Las duraciones se guardan en listas (un append por llamada, seguro entre hilos), y los
+    percentiles solo se calculan en resumen().
+
+    Atributos:
+        activo (bool): True; MetricasNulas lo tiene en False.
+        frames (int): Frames del intervalo recorridos hasta ahora.
+        muestras (int): Muestras publicadas (inferidas o leídas de la caché).
+    '''
+
+    activo = True
+
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self):
+        '''
+        Descarta las mediciones (al empezar un video).
+        '''
+        self._duraciones = {}
+        self._profundidades = {}
+        self._inicio = time.perf_counter()
+        self._fin = None
+        self.frames = 0
+        self.muestras = 0
+
+    def tiempo(self):
+        return time.perf_counter()
+
+    def registrar(self, etapa, t0):
+        '''
+        Registra la duración de una llamada a `etapa` que empezó en t0 (ver tiempo()).
+        '''
+        self._duraciones.setdefault(etapa, []).append(time.perf_counter() - t0)
+
+    def profundidad(self, cola, valor):
+        '''
+        Registra una muestra de la profundidad (elementos en espera) de una cola del pipeline.
+        '''
+        self._profundidades.setdefault(cola, []).append(valor)
+
+    def terminar(self):
+        '''
+        Marca el fin de la ejecución (la duración total deja de crecer).
+        '''
+        self._fin = time.perf_counter()
+
+    def duracion(self):
+        return (self._fin or time.perf_counter()) - self._inicio
+
+    def fps(self):
+        '''
+        Retorna:
+            float: Frames del video recorridos por segundo de ejecución.
+        '''
+        return self.frames / max(self.duracion(), 1e-9)
+
+    def resumen(self):
+        '''
+        Retorna:
+            dict: Duración total, frames y muestras por segundo, y por etapa: llamadas, tiempo
+            total, fracción del tiempo de ejecución, media y percentiles p50/p95/p99 en ms; por
+            cola: profundidad media, p95 y máxima. En el pipeline las etapas corren en paralelo,
+            así que las fracciones pueden sumar más de 1.
+        '''
+        duracion = self.duracion()
+        etapas = {}
+        nombres = [e for e in ETAPAS if e in self._duraciones] + sorted(set(self._duraciones) - set(ETAPAS))
+        for etapa in nombres:
+            valores = np.asarray(self._duraciones[etapa], dtype=np.float64) * 1000.0
+            p50, p95, p99 = np.percentile(valores, (50, 95, 99))
+            etapas[etapa] = {
+                "llamadas": int(len(valores)),
+                "total_s": float(valores.sum() / 1000.0),
+                "fraccion": float(valores.sum() / 1000.0 / max(duracion, 1e-9)),
+                "media_ms": float(valores.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+            }
+        colas = {}
+        for cola, valores in sorted(self._profundidades.items()):
+            valores = np.asarray(valores, dtype=np.float64)
+            colas[cola] = {
+                "media": float(valores.mean()),
+                "p95": float(np.percentile(valores, 95)),
+                "maxima": int(valores.max()),
+            }
+        return {
+            "duracion_s": duracion,
+            "frames": self.frames,
+            "muestras": self.muestras,
+            "fps": self.frames / max(duracion, 1e-9),
+            "muestras_por_s": self.muestras / max(duracion, 1e-9),
+            "etapas": etapas,
+            "colas": colas,
+        }
+
+    def guardar_json(self, ruta):
+        '''
+        Escribe resumen() en un archivo JSON.
+        '''
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(self.resumen(), f, indent=2, ensure_ascii=False)
+
+    def tabla(self):
+        '''
+        Retorna:
+            str: Resumen legible, una línea por etapa.
+        '''
+        resumen = self.resumen()
+        lineas = [
+            f"{resumen['frames']} frames, {resumen['muestras']} muestras en {resumen['duracion_s']:.1f} s "
+            f"({resumen['fps']:.1f} frames/s, {resumen['muestras_por_s']:.1f} muestras/s)",
+            f"{'etapa':<15}{'llamadas':>9}{'total s':>9}{'%':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}",
+        ]
+        for etapa, d in resumen["etapas"].items():
+            lineas.append(
+                f"{etapa:<15}{d['llamadas']:>9}{d['total_s']:>9.2f}{d['fraccion'] * 100:>6.1f}"
+                f"{d['p50_ms']:>9.2f}{d['p95_ms']:>9.2f}{d['p99_ms']:>9.2f}"
+            )
+        for cola, d in resumen["colas"].items():
+            lineas.append(f"cola {cola}: media {d['media']:.1f}, p95 {d['p95']:.0f}, máxima {d['maxima']}")
+        return "\n".join(lineas)
+
+
+class MetricasNulas:
+    '''
+    Misma interfaz que MetricasEtapas sin medir nada, para que la instrumentación desactivada
+    cueste solo dos llamadas vacías por etapa.
+    '''
+
+    activo = False
+    frames = 0
+    muestras = 0
+
+    def reiniciar(self):
+        pass
+
+    def tiempo(self):
+        return 0.0
+
+    def registrar(self, etapa, t0):
+        pass
+
+    def profundidad(self, cola, valor):
+        pass
+
+    def terminar(self):
+        pass
+
+    def fps(self):
+        return 0.0
@@ -26,7 +26,11 @@ El backend genera un archivo Excel con los resultados detallados.
 -----------------------------------------------------------------------------------------------------------------------------------------------
 '''
 
-from backend import PavementProcessor
+from backend import PavementProcessor, RegistroModelos, RUTA_MODELO
+from cache_inferencia import CacheInferencia
+from puntos_control import PuntoControlIncompatible
+import logging
+import os
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
@@ -34,6 +38,49 @@ from PIL import Image, ImageTk
 import cv2
 #import pandas as pd
 
+# Variable de entorno que activa la instrumentación por etapas (tabla de tiempos y JSON junto al Excel)
+VARIABLE_METRICAS = "RECONOCIMIENTO_VIAL_METRICAS"
+# Variables de entorno con la ubicación y el límite (en MB) de la caché de inferencia
+VARIABLE_CACHE_RUTA = "RECONOCIMIENTO_VIAL_CACHE"
+VARIABLE_CACHE_MB = "RECONOCIMIENTO_VIAL_CACHE_MB"
+
+registro = logging.getLogger("interfaz")
+
+
+class BuzonVistaPrevia:
+    '''
+    Buzón de un solo elemento entre el hilo de procesamiento y la interfaz: cada publicación
+    reemplaza a la anterior, de modo que la interfaz siempre muestra el frame más reciente y,
+    si se atrasa, los frames intermedios se descartan en lugar de acumularse. El procesamiento
+    nunca espera a la interfaz y la memoria ocupada no crece.
+
+    Atributos:
+        publicados (int): Frames publicados.
+        descartados (int): Frames reemplazados antes de que la interfaz los tomara.
+    '''
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self._ultimo = None
+        self.publicados = 0
+        self.descartados = 0
+
+    def publicar(self, elemento):
+        with self._bloqueo:
+            if self._ultimo is not None:
+                self.descartados += 1
+            self._ultimo = elemento
+            self.publicados += 1
+
+    def tomar(self):
+        '''
+        Retorna:
+            El último elemento publicado (y vacía el buzón), o None si no hay uno nuevo.
+        '''
+        with self._bloqueo:
+            elemento, self._ultimo = self._ultimo, None
+            return elemento
+
 
 class App:
     '''
@@ -53,13 +100,28 @@ class App:
         cant_huecos (tk.StringVar): Conteo de baches detectados.
         cant_grietas (tk.StringVar): Conteo de grietas detectadas.
         cant_Pcocodrilo (tk.StringVar): Conteo de piel de cocodrilo detectada.
+        fps_vista (float): Refrescos por segundo máximos de la vista previa.
+        buzon (BuzonVistaPrevia): Último frame reducido publicado por el procesamiento.
+        instrumentar (bool): Si el procesamiento mide el tiempo de cada etapa.
+        var_cache (tk.BooleanVar): Si se usa la caché de inferencia (desactivada por defecto).
+        var_punto_control (tk.BooleanVar): Si se guardan puntos de control para poder reanudar
+            (desactivado por defecto: la salida se escribe por segmentos que se unen al final).
+        ruta_cache (str): Archivo SQLite de la caché, o None para la ubicación por defecto.
+        limite_cache_mb (float): Tamaño máximo de la caché en MB.
     '''
-    def __init__(self, root):
+    def __init__(self, root, fps_vista=15, instrumentar=None, ruta_cache=None, limite_cache_mb=None):
         '''
         Constructor de la clase App. Inicializa la ventana principal y configura variables de estado.
         
         Args:
             root (tk.Tk): Objeto de la ventana principal de Tkinter.
+            fps_vista (float): Refrescos por segundo máximos de la vista previa.
+            instrumentar (bool): Mide el tiempo de cada etapa (ver PavementProcessor). None lo
+                activa solo si la variable de entorno RECONOCIMIENTO_VIAL_METRICAS vale 1.
+            ruta_cache (str): Archivo de la caché de inferencia. None usa la variable de entorno
+                RECONOCIMIENTO_VIAL_CACHE o, sin ella, ~/.cache/reconocimiento_vial/inferencia.sqlite.
+            limite_cache_mb (float): Tamaño máximo de la caché. None usa la variable de entorno
+                RECONOCIMIENTO_VIAL_CACHE_MB o 512 MB.
         '''
         self.root = root
         self.root.title("CRACKFINDER 	Detección Inteligente de irregularidades en pavimento")
@@ -74,6 +136,8 @@ class App:
         self.var_min_inicio = tk.StringVar(value="0")
         self.var_min_fin = tk.StringVar(value="0")
         self.var_todo = tk.BooleanVar(value=False)
+        self.var_cache = tk.BooleanVar(value=False)
+        self.var_punto_control = tk.BooleanVar(value=False)
         self.var_estado = tk.StringVar(value="Listo")
 
         self.video_ancho = 600
@@ -83,7 +147,23 @@ class App:
         self.cant_grietas = tk.StringVar(value="0")
         self.cant_Pcocodrilo = tk.StringVar(value="0")
 
+        self.fps_vista = fps_vista
+        if instrumentar is None:
+            instrumentar = os.environ.get(VARIABLE_METRICAS, "0") == "1"
+        self.instrumentar = instrumentar
+        self.ruta_cache = ruta_cache if ruta_cache is not None else os.environ.get(VARIABLE_CACHE_RUTA)
+        if limite_cache_mb is None:
+            limite_cache_mb = float(os.environ.get(VARIABLE_CACHE_MB, "512"))
+        self.limite_cache_mb = limite_cache_mb
+        self.buzon = BuzonVistaPrevia()
+        self._foto_normal = None
+        self._foto_inferido = None
+
         self.crear_interfaz()
+        self.refrescar_vista()
+
+        # Cargar y calentar el modelo mientras el usuario elige el video
+        RegistroModelos.precargar(RUTA_MODELO)
 
     def crear_interfaz(self):
         '''
@@ -184,6 +264,16 @@ class App:
         )
         btn_iniciar.grid(row=5, column=3, columnspan=2, pady=2)
 
+        # La caché guarda las detecciones en disco para no repetir la inferencia del mismo video
+        tk.Checkbutton(
+            frame_botones, text="Caché", variable=self.var_cache, bg="white", bd=3
+        ).grid(row=6, column=3, pady=2)
+
+        # Los puntos de control permiten reanudar un procesamiento largo interrumpido
+        tk.Checkbutton(
+            frame_botones, text="Reanudable", variable=self.var_punto_control, bg="white", bd=3
+        ).grid(row=6, column=4, pady=2)
+
         # Barra de progreso
         self.progress = ttk.Progressbar(
             frame_botones, orient="horizontal", length=300, mode="determinate",
@@ -293,70 +383,126 @@ class App:
         ini = int(self.var_min_inicio.get())
         fin = int(self.var_min_fin.get())
         todo = self.var_todo.get()
+        usar_cache = self.var_cache.get()
+
+        # Punto de control junto al video de salida (opcional): si un procesamiento anterior se
+        # interrumpió, se puede continuar desde donde quedó
+        punto_control, reanudar = None, False
+        if self.var_punto_control.get():
+            punto_control = os.path.splitext(self.ruta_salida)[0] + ".punto_control.json"
+            reanudar = os.path.exists(punto_control) and messagebox.askyesno(
+                "Reanudar", "Hay un procesamiento interrumpido para esta salida. ¿Continuar desde donde quedó?"
+            )
 
         self.var_estado.set("Ejecutando inferencia...")
         self.progress["value"] = 0
         self.root.update_idletasks()
 
         def worker():
-            procesador = PavementProcessor()
-            salida = procesador.procesar_video(
+            # El modelo se comparte a través de RegistroModelos; solo la primera ejecución lo carga
+            # La caché (opcional) evita repetir la inferencia al volver a procesar el mismo video
+            cache = None
+            if usar_cache:
+                cache = CacheInferencia(self.ruta_cache, limite_bytes=int(self.limite_cache_mb * 1024 * 1024))
+                registro.info("Caché de inferencia en %s (límite %.0f MB)", cache.ruta, self.limite_cache_mb)
+            procesador = PavementProcessor(cache=cache, instrumentar=self.instrumentar)
+            argumentos = dict(
                 video_path=self.ruta_video,
                 output_path=self.ruta_salida,
                 inicio_min=ini,
                 fin_min=fin,
                 todo=todo,
                 callback=self.mostrar_frame,
+                punto_control=punto_control,
+            )
+            try:
+                salida = procesador.procesar_video(reanudar=reanudar, **argumentos)
+            except PuntoControlIncompatible as e:
+                # El punto de control es de otro video o de otro intervalo: empezar de nuevo
+                # (se detecta antes de abrir la salida, así que no se pierde nada)
+                registro.warning("%s; se procesa desde el principio", e)
+                self.root.after(0, self.var_estado.set, "Punto de control incompatible: procesando desde el principio...")
+                salida = procesador.procesar_video(reanudar=False, **argumentos)
+
+            latencias = procesador.latencias_arranque
+            registro.info(
+                "Arranque %s: modelo %.2f s, primer frame %.2f s",
+                latencias["arranque"], latencias["modelo_s"], latencias["primer_frame_s"] or 0,
+            )
+
+            registro.debug(
+                "Vista previa: %d frames publicados, %d descartados", self.buzon.publicados, self.buzon.descartados
             )
 
             def finalizar():
+                # Mostrar el último frame pendiente antes del mensaje final
+                elemento = self.buzon.tomar()
+                if elemento is not None:
+                    self._mostrar_vista(*elemento)
                 self.var_estado.set(f" Video procesado en: {salida}")
                 messagebox.showinfo("Finalizado", f"Video procesado en:\n{salida}")
 
                 # Guardar los resultados en un archivo Excel al finalizar el procesamiento.
-                self.guardar_resultados_excel()
+                procesador.guardar_resultados_excel()
 
             self.root.after(0, finalizar)
 
         threading.Thread(target=worker, daemon=True).start()
     
-    def mostrar_frame(self, frame_inferido, frame_normal, porcentaje, counts):
+    def mostrar_frame(self, frame_inferido, frame_normal, porcentaje, counts, metricas=None):
         '''
-        Actualiza el área de video y las métricas de detección en la interfaz.
+        Callback del procesamiento (se ejecuta en el hilo del backend). Reduce ambos frames al
+        tamaño de la vista previa, los convierte a RGB y los deja en el buzón; refrescar_vista
+        los muestra desde el hilo de Tkinter.
     
         Args:
             frame_inferido (ndarray): Frame del video procesado.
             frame_normal (ndarray): Frame del video normal (sin inferencias).
             porcentaje (float): Progreso del procesamiento (%).
             counts (dict): Conteo de objetos detectados por clase.
+            metricas (MetricasEtapas): Métricas del procesamiento en curso (si está instrumentado).
         '''
-        def _update():
-            # Mostrar el frame normal
-            frame_rgb_normal = cv2.cvtColor(frame_normal, cv2.COLOR_BGR2RGB)
-            img_normal = Image.fromarray(frame_rgb_normal)
-            img_normal = img_normal.resize((self.video_ancho, self.video_alto))
-            img_tk_normal = ImageTk.PhotoImage(img_normal)
-            self.label_imagen_normal.configure(image=img_tk_normal)
-            self.label_imagen_normal.image = img_tk_normal  # Asegúrate de mantener la referencia
-    
-            # Mostrar el frame inferido (con detecciones)
-            frame_rgb_inferido = cv2.cvtColor(frame_inferido, cv2.COLOR_BGR2RGB)
-            img_inferido = Image.fromarray(frame_rgb_inferido)
-            img_inferido = img_inferido.resize((self.video_ancho, self.video_alto))
-            img_tk_inferido = ImageTk.PhotoImage(img_inferido)
-            self.label_inferencia.configure(image=img_tk_inferido)
-            self.label_inferencia.image = img_tk_inferido  # Asegúrate de mantener la referencia
-    
-            # Actualización de progreso
-            self.progress["value"] = porcentaje
+        # Los frames pertenecen al pool del procesador y solo son válidos durante esta llamada:
+        # la reducción genera copias pequeñas que sí pueden quedar en el buzón.
+        tamano = (self.video_ancho, self.video_alto)
+        normal = cv2.cvtColor(cv2.resize(frame_normal, tamano, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+        inferido = cv2.cvtColor(cv2.resize(frame_inferido, tamano, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+        fps = metricas.fps() if metricas is not None else None
+        self.buzon.publicar((normal, inferido, porcentaje, dict(counts), fps))
+
+    def refrescar_vista(self):
+        '''
+        Muestra el último frame del buzón (si hay uno nuevo) y se vuelve a programar según
+        fps_vista. Las imágenes de Tkinter se crean una vez y se actualizan en su lugar.
+        '''
+        elemento = self.buzon.tomar()
+        if elemento is not None:
+            self._mostrar_vista(*elemento)
+        self.root.after(max(1, int(1000 / self.fps_vista)), self.refrescar_vista)
+
+    def _mostrar_vista(self, normal, inferido, porcentaje, counts, fps):
+        '''
+        Actualiza las imágenes, el progreso y los conteos con un elemento del buzón.
+        '''
+        if self._foto_normal is None:
+            self._foto_normal = ImageTk.PhotoImage("RGB", (self.video_ancho, self.video_alto))
+            self._foto_inferido = ImageTk.PhotoImage("RGB", (self.video_ancho, self.video_alto))
+            self.label_imagen_normal.configure(image=self._foto_normal)
+            self.label_inferencia.configure(image=self._foto_inferido)
+        self._foto_normal.paste(Image.fromarray(normal))
+        self._foto_inferido.paste(Image.fromarray(inferido))
+
+        # Actualización de progreso
+        self.progress["value"] = porcentaje
+        if fps is None:
             self.var_estado.set(f"Progreso: {porcentaje:.1f}%")
-    
-            # Actualización de conteos
-            self.cant_huecos.set(str(counts.get(0, 0)))       # Pothole
-            self.cant_Pcocodrilo.set(str(counts.get(1, 0)))   # Cocodrile skin
-            self.cant_grietas.set(str(counts.get(2, 0)))      # Crack
-    
-        self.root.after(0, _update)
+        else:
+            self.var_estado.set(f"Progreso: {porcentaje:.1f}% ({fps:.1f} frames/s)")
+
+        # Actualización de conteos
+        self.cant_huecos.set(str(counts.get(0, 0)))       # Pothole
+        self.cant_Pcocodrilo.set(str(counts.get(1, 0)))   # Cocodrile skin
+        self.cant_grietas.set(str(counts.get(2, 0)))      # Crack
     
 
     def on_closing(self):
@@ -367,6 +513,7 @@ class App:
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
     root = tk.Tk()
     app = App(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)  # Guardar resultados al cerrar
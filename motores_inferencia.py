@@ -0,0 +1,338 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: Motores de inferencia para equipos sin GPU. Además del modelo de PyTorch (best.pt), el detector puede --------------
+------------- exportarse a ONNX y ejecutarse con ONNX Runtime en CPU, o cuantizarse a int8 (cuantización estática calibrada con --------------
+------------- frames de pavimento). comparar_motores mide la latencia de cada motor y la concordancia de los conteos por clase --------------
+------------- frente a PyTorch, para elegir el motor más rápido que se mantiene dentro de la tolerancia. ---------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+
+Uso:
+    python motores_inferencia.py recorrido.mp4 -m best.pt --cuadros 100 --tolerancia 0.95 -o motores.json
+'''
+
+import argparse
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import cv2
+import numpy as np
+
+registro = logging.getLogger(__name__)
+
+# Motores soportados, del más exacto al más rápido
+MOTORES = ("pytorch", "onnx", "onnx_int8")
+
+
+def ruta_motor(model_path, motor="pytorch"):
+    '''
+    Retorna la ruta del archivo que usa un motor, sin generarlo: best.pt para "pytorch",
+    best.onnx para "onnx" y best_int8.onnx para "onnx_int8". Una ruta .onnx se usa tal cual.
+    '''
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de inferencia no soportado: {motor}")
+    base, extension = os.path.splitext(model_path)
+    if motor == "pytorch" or extension.lower() == ".onnx":
+        return model_path
+    return base + (".onnx" if motor == "onnx" else "_int8.onnx")
+
+
+def _vigente(ruta, origen):
+    # El archivo derivado existe y no es más antiguo que el archivo del que se generó
+    if not os.path.exists(ruta):
+        return False
+    return not os.path.exists(origen) or os.path.getmtime(ruta) >= os.path.getmtime(origen)
+
+
+def exportar_onnx(model_path, imgsz=640, forzar=False):
+    '''
+    Exporta los pesos de PyTorch a ONNX (lote dinámico) junto al archivo original.
+
+    Parámetros:
+        model_path (str): Ruta de best.pt.
+        imgsz (int): Tamaño de entrada del modelo.
+        forzar (bool): Exporta aunque ya exista un .onnx más reciente que los pesos.
+
+    Retorna:
+        str: Ruta del .onnx.
+    '''
+    ruta = ruta_motor(model_path, "onnx")
+    if not forzar and _vigente(ruta, model_path):
+        return ruta
+    from ultralytics import YOLO
+
+    exportado = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if os.path.abspath(exportado) != os.path.abspath(ruta):
+        os.replace(exportado, ruta)
+    return ruta
+
+
+def frames_muestra(video_path, cantidad=64):
+    '''
+    Lee `cantidad` frames repartidos de forma uniforme a lo largo del video.
+
+    Retorna:
+        list: Frames BGR.
+    '''
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for indice in np.linspace(0, max(total - 1, 0), min(cantidad, max(total, 1))).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(indice))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def letterbox(imagen, imgsz=640):
+    '''
+    Prepara una imagen BGR como la entrada del modelo exportado: redimensiona manteniendo la
+    proporción, rellena con gris (114) hasta imgsz x imgsz y retorna un tensor RGB (1, 3, imgsz,
+    imgsz) float32 en [0, 1], igual que el preprocesado de Ultralytics.
+    '''
+    alto, ancho = imagen.shape[:2]
+    escala = min(imgsz / alto, imgsz / ancho)
+    nuevo_ancho, nuevo_alto = int(round(ancho * escala)), int(round(alto * escala))
+    lienzo = np.full((imgsz, imgsz, 3), 114, np.uint8)
+    y0, x0 = (imgsz - nuevo_alto) // 2, (imgsz - nuevo_ancho) // 2
+    lienzo[y0:y0 + nuevo_alto, x0:x0 + nuevo_ancho] = cv2.resize(
+        imagen, (nuevo_ancho, nuevo_alto), interpolation=cv2.INTER_LINEAR
+    )
+    return np.ascontiguousarray(lienzo[:, :, ::-1].transpose(2, 0, 1))[None].astype(np.float32) / 255.0
+
+
+class LectorCalibracion:
+    '''
+    Entrega las imágenes de calibración a quantize_static de ONNX Runtime, una por llamada a
+    get_next (la interfaz de CalibrationDataReader).
+    '''
+
+    def __init__(self, imagenes, nombre_entrada, imgsz=640):
+        self.imagenes = imagenes
+        self.nombre_entrada = nombre_entrada
+        self.imgsz = imgsz
+        self._siguiente = 0
+
+    def get_next(self):
+        if self._siguiente >= len(self.imagenes):
+            return None
+        imagen = self.imagenes[self._siguiente]
+        self._siguiente += 1
+        return {self.nombre_entrada: letterbox(imagen, self.imgsz)}
+
+    def rewind(self):
+        self._siguiente = 0
+
+
+def _nodos_cabeza(modelo):
+    # Nodos del último bloque (/model.N/..., la cabeza Detect en los modelos exportados por Ultralytics)
+    indices = {}
+    for nodo in modelo.graph.node:
+        coincidencia = re.match(r"^/model\.(\d+)/", nodo.name)
+        if coincidencia:
+            indices.setdefault(int(coincidencia.group(1)), []).append(nodo.name)
+    return indices[max(indices)] if indices else []
+
+
+def cuantizar_int8(ruta_onnx, imagenes, salida=None, imgsz=640, excluir_cabeza=True):
+    '''
+    Cuantización estática a int8 (pesos int8 por canal, activaciones uint8, formato QDQ) con
+    los rangos de activación calibrados sobre `imagenes`.
+
+    Parámetros:
+        ruta_onnx (str): Modelo ONNX en float32 (ver exportar_onnx).
+        imagenes (list): Imágenes BGR de calibración, preprocesadas como en la inferencia.
+        salida (str): Ruta del modelo cuantizado. None usa <modelo>_int8.onnx.
+        imgsz (int): Tamaño de entrada del modelo.
+        excluir_cabeza (bool): Deja en float32 la cabeza de detección, donde se decodifican
+            coordenadas y confianzas; cuantizarla es lo que más degrada las cajas.
+
+    Retorna:
+        str: Ruta del modelo cuantizado.
+    '''
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    if not imagenes:
+        raise ValueError("La cuantización int8 necesita al menos una imagen de calibración")
+    salida = salida or os.path.splitext(ruta_onnx)[0] + "_int8.onnx"
+    original = onnx.load(ruta_onnx)
+    with tempfile.TemporaryDirectory() as carpeta:
+        entrada = ruta_onnx
+        try:
+            # Inferencia de formas y fusión de nodos recomendadas antes de cuantizar
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+
+            entrada = os.path.join(carpeta, "preparado.onnx")
+            quant_pre_process(ruta_onnx, entrada)
+        except Exception as e:
+            registro.warning("Preprocesado de cuantización omitido: %s", e)
+            entrada = ruta_onnx
+        quantize_static(
+            entrada,
+            salida,
+            LectorCalibracion(imagenes, original.graph.input[0].name, imgsz),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CalibrationMethod.MinMax,
+            nodes_to_exclude=_nodos_cabeza(original) if excluir_cabeza else [],
+        )
+    # Ultralytics lee los nombres de las clases, el stride y imgsz de los metadatos del ONNX
+    cuantizado = onnx.load(salida)
+    del cuantizado.metadata_props[:]
+    cuantizado.metadata_props.extend(original.metadata_props)
+    onnx.save(cuantizado, salida)
+    return salida
+
+
+def preparar_motor(model_path, motor="pytorch", video_calibracion=None, cuadros_calibracion=64,
+                   modo_flatfield="exacto", imgsz=640):
+    '''
+    Retorna la ruta del modelo para `motor`, generando el ONNX o el int8 si faltan o son más
+    antiguos que los pesos.
+
+    Parámetros:
+        model_path (str): Ruta de best.pt (o de un .onnx ya exportado).
+        motor (str): "pytorch", "onnx" u "onnx_int8".
+        video_calibracion (str): Video del que se toman los frames de calibración del int8.
+        cuadros_calibracion (int): Frames de calibración.
+        modo_flatfield (str): Preprocesado aplicado a los frames de calibración (el mismo de la inferencia).
+        imgsz (int): Tamaño de entrada del modelo.
+
+    Retorna:
+        str: Ruta del modelo que se carga con RegistroModelos.
+    '''
+    ruta = ruta_motor(model_path, motor)
+    if motor == "pytorch" or ruta == model_path:
+        return ruta
+    if motor == "onnx":
+        return exportar_onnx(model_path, imgsz)
+    ruta_onnx = ruta_motor(model_path, "onnx")
+    if _vigente(ruta, ruta_onnx) and _vigente(ruta_onnx, model_path):
+        return ruta
+    if video_calibracion is None:
+        raise ValueError(
+            f"No existe {ruta}: la cuantización int8 necesita un video de calibración (ver preparar_motor)"
+        )
+    from backend import imflatfield
+
+    ruta_onnx = exportar_onnx(model_path, imgsz)
+    imagenes = [imflatfield(frame, modo=modo_flatfield) for frame in frames_muestra(video_calibracion, cuadros_calibracion)]
+    return cuantizar_int8(ruta_onnx, imagenes, ruta, imgsz)
+
+
+def comparar_motores(video_path, model_path, motores=MOTORES, cuadros=100, **opciones_procesador):
+    '''
+    Mide cada motor sobre los mismos frames del video frente al primero de `motores` (la referencia).
+
+    Parámetros:
+        video_path (str): Video de prueba.
+        model_path (str): Ruta de best.pt.
+        motores (tuple): Motores a comparar; los archivos deben existir (ver preparar_motor).
+        cuadros (int): Frames repartidos a lo largo del video.
+        **opciones_procesador: Argumentos de PavementProcessor (modo_flatfield, roi, tamano_mosaico, ...).
+
+    Retorna:
+        dict: Por motor: latencia media y p50 en ms por frame, frames por segundo, aceleración
+        frente a la referencia (p50), conteos por clase, concordancia por clase (fracción de
+        frames con el mismo conteo que la referencia), concordancia mínima y diferencia
+        relativa del conteo total por clase.
+    '''
+    from backend import NOMBRES_CLASES, PavementProcessor
+
+    frames = frames_muestra(video_path, cuadros)
+    referencia = None
+    reporte = {}
+    for motor in motores:
+        procesador = PavementProcessor(model_path, motor=motor, **opciones_procesador)
+        frames_proc = [procesador.preprocesar(frame) for frame in frames]
+        procesador.detectar(frames_proc[:1])  # Calentamiento
+        latencias = []
+        conteos = []
+        for frame_proc in frames_proc:
+            t0 = time.perf_counter()
+            clases, _, _ = procesador.detectar([frame_proc])[0]
+            latencias.append((time.perf_counter() - t0) * 1000)
+            conteos.append(np.bincount(clases, minlength=len(NOMBRES_CLASES))[:len(NOMBRES_CLASES)])
+        conteos = np.array(conteos)
+        latencias = np.array(latencias)
+        if referencia is None:
+            referencia = {"p50": float(np.median(latencias)), "conteos": conteos}
+        concordancia = (conteos == referencia["conteos"]).mean(axis=0)
+        totales, totales_referencia = conteos.sum(axis=0), referencia["conteos"].sum(axis=0)
+        reporte[motor] = {
+            "modelo": procesador.model_path,
+            "latencia_media_ms": float(latencias.mean()),
+            "latencia_p50_ms": float(np.median(latencias)),
+            "fps": float(1000.0 / latencias.mean()),
+            "aceleracion": referencia["p50"] / float(np.median(latencias)),
+            "conteos": {NOMBRES_CLASES[c]: int(totales[c]) for c in NOMBRES_CLASES},
+            "concordancia": {NOMBRES_CLASES[c]: float(concordancia[c]) for c in NOMBRES_CLASES},
+            "concordancia_min": float(concordancia.min()),
+            "delta_conteo": {
+                NOMBRES_CLASES[c]: float((totales[c] - totales_referencia[c]) / max(totales_referencia[c], 1))
+                for c in NOMBRES_CLASES
+            },
+        }
+    return reporte
+
+
+def elegir_motor(reporte, tolerancia=0.95):
+    '''
+    Retorna el motor más rápido cuya concordancia por clase con la referencia es al menos
+    `tolerancia`. Si ninguno la alcanza, retorna la referencia (el primer motor del reporte).
+    '''
+    if not reporte:
+        raise ValueError("El reporte de comparación está vacío")
+    aceptados = [m for m, r in reporte.items() if r["concordancia_min"] >= tolerancia]
+    if not aceptados:
+        referencia = next(iter(reporte))
+        registro.warning("Ningún motor alcanza la concordancia %s; se usa la referencia (%s)", tolerancia, referencia)
+        return referencia
+    return max(aceptados, key=lambda m: reporte[m]["aceleracion"])
+
+
+def main(argv=None):
+    from backend import RUTA_MODELO
+
+    parser = argparse.ArgumentParser(
+        description="Exporta el detector a ONNX/int8 y compara latencia y conteos frente a PyTorch."
+    )
+    parser.add_argument("video", help="Video de prueba (y de calibración del int8).")
+    parser.add_argument("-m", "--modelo", default=RUTA_MODELO, help="Ruta de los pesos (best.pt).")
+    parser.add_argument("--motores", nargs="+", default=list(MOTORES), choices=MOTORES)
+    parser.add_argument("--cuadros", type=int, default=100, help="Frames comparados.")
+    parser.add_argument("--calibracion", type=int, default=64, help="Frames de calibración del int8.")
+    parser.add_argument("--modo-flatfield", default="exacto", choices=["exacto", "rapido", "incremental"])
+    parser.add_argument("--tolerancia", type=float, default=0.95, help="Concordancia mínima por clase.")
+    parser.add_argument("-o", "--salida", default=None, help="JSON con el reporte.")
+    args = parser.parse_args(argv)
+
+    for motor in args.motores:
+        preparar_motor(args.modelo, motor, args.video, args.calibracion, args.modo_flatfield)
+    reporte = comparar_motores(
+        args.video, args.modelo, args.motores, args.cuadros, modo_flatfield=args.modo_flatfield, calentar=False,
+    )
+    for motor, r in reporte.items():
+        print(
+            f"{motor:<10} p50 {r['latencia_p50_ms']:7.1f} ms  x{r['aceleracion']:.2f}  "
+            f"concordancia mín. {r['concordancia_min']:.3f}  conteos {r['conteos']}"
+        )
+    print(f"Motor recomendado (tolerancia {args.tolerancia}): {elegir_motor(reporte, args.tolerancia)}")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
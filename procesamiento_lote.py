@@ -0,0 +1,570 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: Procesamiento por lotes sin interfaz gráfica. Recibe carpetas o patrones glob de videos, los reparte ----------------
+------------- entre un pool de procesos (cada uno con un modelo cargado una sola vez) y genera, por video, el video de salida ------------------
+------------- y el Excel de resultados, además de un resumen consolidado de todos los videos. ------------------------------------------------
+------------- Un video largo también puede dividirse en fragmentos de frames que se procesan en paralelo y se unen al final. -----------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+
+Uso:
+    python procesamiento_lote.py carpeta_videos/ "otra/*.mp4" -o salida/ -j 4
+    python procesamiento_lote.py recorrido_4h.mp4 -o salida/ -j 16 --fragmentos 16
+    python procesamiento_lote.py carpeta_videos/ -o salida/ --base detecciones.sqlite
+'''
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import pandas as pd
+
+EXTENSIONES_VIDEO = (".mp4", ".avi", ".mov", ".mkv")
+
+# Estado de cada proceso trabajador (se inicializa una vez por proceso)
+_trabajador = {}
+
+
+def buscar_videos(entradas, extensiones=EXTENSIONES_VIDEO):
+    '''
+    Expande carpetas y patrones glob en una lista ordenada de videos sin duplicados.
+
+    Parámetros:
+        entradas (list): Carpetas, archivos o patrones glob.
+        extensiones (tuple): Extensiones aceptadas al recorrer carpetas.
+
+    Retorna:
+        list: Rutas absolutas de los videos.
+    '''
+    videos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            for carpeta, _, archivos in os.walk(entrada):
+                videos.extend(
+                    os.path.join(carpeta, a) for a in archivos if a.lower().endswith(extensiones)
+                )
+        else:
+            videos.extend(glob.glob(entrada, recursive=True))
+    return sorted({os.path.abspath(v) for v in videos})
+
+
+def _nombres_salida(videos):
+    '''
+    Asigna a cada video un nombre de carpeta de salida único.
+    '''
+    usados = {}
+    nombres = []
+    for video in videos:
+        base = os.path.splitext(os.path.basename(video))[0]
+        usados[base] = usados.get(base, 0) + 1
+        nombres.append(base if usados[base] == 1 else f"{base}_{usados[base]}")
+    return nombres
+
+
+def _iniciar_trabajador(model_path, opciones_procesador, hilos_por_proceso):
+    '''
+    Inicializador de cada proceso del pool: limita los hilos internos para no saturar la CPU
+    entre procesos y carga (y calienta) el modelo una sola vez.
+    '''
+    cv2.setNumThreads(hilos_por_proceso)
+    try:
+        import torch
+        torch.set_num_threads(hilos_por_proceso)
+    except ImportError:
+        pass
+    from backend import RegistroModelos
+    from motores_inferencia import ruta_motor
+    RegistroModelos.obtener(ruta_motor(model_path, opciones_procesador.get("motor", "pytorch")), calentar=True)
+    _trabajador["model_path"] = model_path
+    _trabajador["opciones"] = opciones_procesador
+
+
+def procesar_un_video(video_path, carpeta_salida, opciones_video):
+    '''
+    Procesa un video en el proceso trabajador actual.
+
+    Parámetros:
+        video_path (str): Ruta del video de entrada.
+        carpeta_salida (str): Carpeta donde se escriben el video de salida y los reportes.
+        opciones_video (dict): Argumentos adicionales para procesar_video.
+
+    Retorna:
+        dict: Video, rutas generadas, frames, detecciones, segundos, reporte (DataFrame) y error.
+    '''
+    from backend import PavementProcessor
+
+    os.makedirs(carpeta_salida, exist_ok=True)
+    nombre = os.path.basename(carpeta_salida)
+    opciones_video = dict(opciones_video)
+    generar_video = opciones_video.pop("generar_video", True)
+    salida_video = os.path.join(carpeta_salida, f"{nombre}_procesado.mp4") if generar_video else None
+    ruta_excel = os.path.join(carpeta_salida, f"{nombre}.xlsx")
+    if opciones_video.pop("reanudar", False):
+        # Puntos de control en la carpeta del video; si hay uno de una ejecución interrumpida, se continúa
+        opciones_video["punto_control"] = os.path.join(carpeta_salida, f"{nombre}.punto_control.json")
+        opciones_video["reanudar"] = True
+
+    cap = cv2.VideoCapture(video_path)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    resumen = {"video": video_path, "salida": salida_video, "excel": ruta_excel, "frames": frames,
+               "detecciones": 0, "segundos": 0.0, "reporte": None, "error": None}
+    t0 = time.perf_counter()
+    try:
+        procesador = PavementProcessor(
+            _trabajador["model_path"], ruta_excel=ruta_excel, **_trabajador["opciones"]
+        )
+        procesador.procesar_video(video_path, salida_video, **opciones_video)
+        resumen["detecciones"] = len(procesador.detecciones)
+        resumen["reporte"] = procesador.detecciones.a_reporte().copy()
+    except Exception as e:
+        resumen["error"] = f"{type(e).__name__}: {e}"
+    resumen["segundos"] = time.perf_counter() - t0
+    return resumen
+
+
+def guardar_resumen(resumenes, carpeta_salida):
+    '''
+    Escribe el resumen consolidado (resumen.xlsx con hojas Detecciones y Videos, y resumen.csv).
+
+    Parámetros:
+        resumenes (list): Diccionarios retornados por procesar_un_video.
+        carpeta_salida (str): Carpeta raíz de salida.
+
+    Retorna:
+        str: Ruta del Excel de resumen.
+    '''
+    reportes = []
+    for r in resumenes:
+        if r["reporte"] is not None and len(r["reporte"]):
+            reporte = r["reporte"].copy()
+            reporte.insert(0, "Video", os.path.basename(r["video"]))
+            reportes.append(reporte)
+    detecciones = pd.concat(reportes, ignore_index=True) if reportes else pd.DataFrame(
+        columns=["Video", "Minuto", "Segundo", "Huecos", "Grietas", "Piel de cocodrilo"]
+    )
+
+    videos = pd.DataFrame([{
+        "Video": os.path.basename(r["video"]),
+        "Ruta": r["video"],
+        "Frames": r["frames"],
+        "Muestras con detección": r["detecciones"],
+        "Huecos": int(r["reporte"]["Huecos"].sum()) if r["reporte"] is not None else 0,
+        "Grietas": int(r["reporte"]["Grietas"].sum()) if r["reporte"] is not None else 0,
+        "Piel de cocodrilo": int(r["reporte"]["Piel de cocodrilo"].sum()) if r["reporte"] is not None else 0,
+        "Segundos": round(r["segundos"], 2),
+        "Error": r["error"] or "",
+    } for r in resumenes])
+
+    ruta_excel = os.path.join(carpeta_salida, "resumen.xlsx")
+    with pd.ExcelWriter(ruta_excel, engine="openpyxl") as writer:
+        detecciones.to_excel(writer, sheet_name="Detecciones", index=False)
+        videos.to_excel(writer, sheet_name="Videos", index=False)
+    detecciones.to_csv(os.path.join(carpeta_salida, "resumen.csv"), index=False)
+    return ruta_excel
+
+
+def procesar_lote(videos, carpeta_salida, model_path, procesos=None, opciones_procesador=None,
+                  opciones_video=None):
+    '''
+    Procesa una lista de videos en paralelo con un pool de procesos.
+
+    Parámetros:
+        videos (list): Rutas de los videos.
+        carpeta_salida (str): Carpeta raíz de salida (una subcarpeta por video).
+        model_path (str): Ruta de los pesos del modelo.
+        procesos (int): Procesos del pool. None usa la mitad de los núcleos.
+        opciones_procesador (dict): Argumentos adicionales para PavementProcessor.
+        opciones_video (dict): Argumentos adicionales para procesar_video.
+
+    Retorna:
+        list: Resumen de cada video, en el orden de `videos`.
+    '''
+    os.makedirs(carpeta_salida, exist_ok=True)
+    nucleos = os.cpu_count() or 1
+    procesos = procesos or max(1, nucleos // 2)
+    hilos_por_proceso = max(1, nucleos // procesos)
+    nombres = _nombres_salida(videos)
+
+    resumenes = [None] * len(videos)
+    frames_totales = 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=procesos,
+        initializer=_iniciar_trabajador,
+        initargs=(model_path, opciones_procesador or {}, hilos_por_proceso),
+    ) as pool:
+        futuros = {
+            pool.submit(procesar_un_video, video, os.path.join(carpeta_salida, nombre), opciones_video or {}): i
+            for i, (video, nombre) in enumerate(zip(videos, nombres))
+        }
+        for completados, futuro in enumerate(as_completed(futuros), start=1):
+            i = futuros[futuro]
+            resumen = futuro.result()
+            resumenes[i] = resumen
+            frames_totales += resumen["frames"]
+            transcurrido = time.perf_counter() - t0
+            estado = f"ERROR {resumen['error']}" if resumen["error"] else f"{resumen['detecciones']} detecciones"
+            print(
+                f"[{completados}/{len(videos)}] {os.path.basename(resumen['video'])}: {estado} "
+                f"({resumen['segundos']:.1f} s) | {frames_totales / transcurrido:.1f} frames/s, "
+                f"{completados / transcurrido * 3600:.1f} videos/h",
+                flush=True,
+            )
+
+    ruta_resumen = guardar_resumen(resumenes, carpeta_salida)
+    print(f"Resumen guardado en: {ruta_resumen}")
+    return resumenes
+
+
+def planificar_fragmentos(inicio, fin, fragmentos, paso=20):
+    '''
+    Divide el rango [inicio, fin) en hasta `fragmentos` rangos contiguos. Cada corte se mueve
+    al siguiente frame muestreado (contando la fase desde `inicio`), de modo que cada fragmento
+    empieza con una muestra y el video de salida unido es idéntico al de una sola pasada.
+
+    Parámetros:
+        inicio (int): Primer frame del intervalo.
+        fin (int): Frame final (excluido).
+        fragmentos (int): Número de fragmentos deseado.
+        paso (int): Paso de muestreo.
+
+    Retorna:
+        list: Pares (inicio, fin) de cada fragmento, en orden.
+    '''
+    cortes = [inicio]
+    for k in range(1, fragmentos):
+        objetivo = inicio + (fin - inicio) * k // fragmentos
+        corte = objetivo + (-(objetivo - inicio + 1)) % paso
+        if cortes[-1] < corte < fin:
+            cortes.append(corte)
+    cortes.append(fin)
+    return list(zip(cortes[:-1], cortes[1:]))
+
+
+def validar_fragmentado(opciones_procesador=None, opciones_video=None):
+    '''
+    Verifica que las opciones permitan dividir un video en fragmentos. El plan de fragmentos
+    supone muestreo fijo cada `paso` frames y que ningún frame depende de los anteriores. Las
+    opciones que arrastran estado entre frames (muestreo adaptativo, seguimiento, dibujo de cada
+    frame, flat-field incremental y región de interés estimada desde el horizonte) se
+    reiniciarían en cada fragmento y el resultado unido no coincidiría con una sola pasada, así
+    que se rechazan con ValueError.
+    '''
+    from backend import MuestreadorFijo
+
+    opciones_procesador = opciones_procesador or {}
+    opciones_video = opciones_video or {}
+    incompatibles = []
+    muestreador = opciones_video.get("muestreador")
+    if muestreador is not None and not (
+        isinstance(muestreador, MuestreadorFijo) and muestreador.paso == opciones_video.get("paso", 20)
+    ):
+        incompatibles.append("muestreador (solo se admite muestreo fijo cada `paso` frames)")
+    for opcion in ("seguimiento", "dibujar_cada_frame"):
+        if opciones_video.get(opcion):
+            incompatibles.append(opcion)
+    if opciones_procesador.get("modo_flatfield") == "incremental":
+        incompatibles.append('modo_flatfield="incremental"')
+    roi = opciones_procesador.get("roi")
+    if roi is not None and (roi == "horizonte" or roi.poligono is None):
+        incompatibles.append("roi estimada desde el horizonte (use un polígono fijo)")
+    if incompatibles:
+        raise ValueError("Opciones incompatibles con el procesamiento por fragmentos: " + ", ".join(incompatibles))
+
+
+def procesar_fragmento(video_path, salida_segmento, inicio, fin, origen, opciones_video, generar_video=True):
+    '''
+    Procesa un rango de frames de un video en el proceso trabajador actual. Los archivos
+    intermedios del fragmento (video y sumidero) se nombran a partir de `salida_segmento`.
+
+    Retorna:
+        AlmacenDetecciones: Detecciones del fragmento (con marcas de tiempo globales).
+    '''
+    from backend import PavementProcessor
+
+    procesador = PavementProcessor(
+        _trabajador["model_path"],
+        ruta_excel=os.path.splitext(salida_segmento)[0] + ".xlsx",
+        **_trabajador["opciones"]
+    )
+    procesador.procesar_video(
+        video_path, salida_segmento if generar_video else None, inicio_frame=inicio, fin_frame=fin, origen_frame=origen, **opciones_video
+    )
+    return procesador.detecciones
+
+
+def unir_videos(segmentos, salida):
+    '''
+    Une segmentos de video consecutivos. Usa el demuxer concat de ffmpeg sin recodificar si
+    está disponible; si no, copia los frames con OpenCV.
+
+    Parámetros:
+        segmentos (list): Rutas de los segmentos, en orden.
+        salida (str): Ruta del video unido.
+    '''
+    segmentos = [s for s in segmentos if os.path.exists(s) and os.path.getsize(s) > 0]
+    if shutil.which("ffmpeg"):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as lista:
+            for segmento in segmentos:
+                lista.write(f"file '{os.path.abspath(segmento)}'\n")
+        try:
+            subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                 "-i", lista.name, "-c", "copy", salida],
+                check=True,
+            )
+            return
+        except subprocess.CalledProcessError:
+            pass
+        finally:
+            os.remove(lista.name)
+
+    out = None
+    for segmento in segmentos:
+        cap = cv2.VideoCapture(segmento)
+        if out is None:
+            out = cv2.VideoWriter(
+                salida, cv2.VideoWriter_fourcc(*'mp4v'), int(cap.get(cv2.CAP_PROP_FPS)),
+                (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))),
+            )
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+        cap.release()
+    if out is not None:
+        out.release()
+
+
+def procesar_video_fragmentado(video_path, output_path, model_path, fragmentos=None, procesos=None,
+                               ruta_excel=None, inicio_min=0, fin_min=0, todo=True, opciones_procesador=None,
+                               opciones_video=None, pool=None):
+    '''
+    Procesa un video largo dividiéndolo en fragmentos de frames contiguos que se procesan en
+    procesos separados. Las detecciones se concatenan en orden de tiempo (las marcas de tiempo
+    son globales) y los segmentos de video se unen en `output_path`. La fase del muestreo cada
+    `paso` frames se cuenta desde el inicio del intervalo completo, así que el reporte y el video
+    unidos coinciden con los de una sola pasada. Las opciones que arrastran estado entre frames
+    no se admiten (ver validar_fragmentado).
+
+    Parámetros:
+        video_path (str): Ruta del video de entrada.
+        output_path (str): Ruta del video de salida. None genera solo el reporte.
+        model_path (str): Ruta de los pesos del modelo.
+        fragmentos (int): Número de fragmentos. None usa uno por proceso.
+        procesos (int): Procesos del pool (si no se pasa `pool`). None usa todos los núcleos.
+        ruta_excel (str): Ruta del Excel de resultados. None lo ubica junto al video de salida.
+        inicio_min, fin_min, todo: Intervalo a procesar, como en procesar_video.
+        opciones_procesador (dict): Argumentos adicionales para PavementProcessor.
+        opciones_video (dict): Argumentos adicionales para procesar_video (paso, tamano_lote, ...).
+        pool (ProcessPoolExecutor): Pool ya creado con _iniciar_trabajador (opcional).
+
+    Retorna:
+        AlmacenDetecciones: Detecciones de todo el intervalo.
+    '''
+    from almacenamiento import AlmacenDetecciones
+    from backend import calcular_intervalo
+
+    validar_fragmentado(opciones_procesador, opciones_video)
+    opciones_video = dict(opciones_video or {})
+    opciones_video.pop("generar_video", None)
+    opciones_video.pop("reanudar", None)  # Los fragmentos no guardan puntos de control
+    paso = opciones_video.get("paso", 20)
+    procesos = procesos or os.cpu_count() or 1
+    fragmentos = fragmentos or procesos
+
+    cap = cv2.VideoCapture(video_path)
+    inicio, fin = calcular_intervalo(cap, inicio_min, fin_min, todo)
+    cap.release()
+    rangos = planificar_fragmentos(inicio, fin, fragmentos, paso)
+
+    # Los segmentos van junto al video de salida (para unirlos en el mismo disco) o, si no se
+    # genera video, a la carpeta temporal del sistema; nunca junto al video de entrada
+    carpeta_segmentos = tempfile.mkdtemp(
+        prefix="fragmentos_", dir=os.path.dirname(os.path.abspath(output_path)) if output_path else None
+    )
+    segmentos = [os.path.join(carpeta_segmentos, f"segmento_{i:04d}.mp4") for i in range(len(rangos))]
+
+    propio = pool is None
+    if propio:
+        pool = ProcessPoolExecutor(
+            max_workers=procesos,
+            initializer=_iniciar_trabajador,
+            initargs=(model_path, opciones_procesador or {}, max(1, (os.cpu_count() or 1) // procesos)),
+        )
+    try:
+        futuros = [
+            pool.submit(
+                procesar_fragmento, video_path, segmento, a, b, inicio, opciones_video,
+                generar_video=output_path is not None,
+            )
+            for segmento, (a, b) in zip(segmentos, rangos)
+        ]
+        almacen = AlmacenDetecciones.unir([f.result() for f in futuros])
+    finally:
+        if propio:
+            pool.shutdown()
+
+    if output_path:
+        unir_videos(segmentos, output_path)
+    shutil.rmtree(carpeta_segmentos, ignore_errors=True)
+
+    if ruta_excel is None:
+        ruta_excel = os.path.splitext(output_path or video_path)[0] + ".xlsx"
+    almacen.a_reporte().to_excel(ruta_excel, index=False)
+    return almacen
+
+
+def main(argv=None):
+    from backend import RUTA_MODELO, RegionInteres
+    from base_detecciones import BaseDetecciones
+    from cache_inferencia import CacheInferencia
+
+    parser = argparse.ArgumentParser(
+        description="Detección de imperfecciones en pavimento sobre muchos videos, sin interfaz gráfica."
+    )
+    parser.add_argument("entradas", nargs="+", help="Carpetas, videos o patrones glob.")
+    parser.add_argument("-o", "--salida", default="salida_lote", help="Carpeta de salida.")
+    parser.add_argument("-m", "--modelo", default=RUTA_MODELO, help="Ruta de los pesos (best.pt).")
+    parser.add_argument("-j", "--procesos", type=int, default=None, help="Procesos del pool.")
+    parser.add_argument("--paso", type=int, default=20, help="Se infiere un frame de cada PASO.")
+    parser.add_argument("--tamano-lote", type=int, default=1, help="Frames por llamada al modelo.")
+    parser.add_argument("--sin-video", action="store_true", help="Solo genera los reportes.")
+    parser.add_argument(
+        "--fragmentos", type=int, default=None,
+        help="Divide cada video en N fragmentos procesados en paralelo (para videos largos).",
+    )
+    parser.add_argument("--modo-flatfield", default="exacto", choices=["exacto", "rapido", "incremental"])
+    parser.add_argument("--formato-sumidero", default="csv", choices=["csv", "jsonl", "sqlite", "parquet"])
+    parser.add_argument(
+        "--roi-horizonte", action="store_true",
+        help="Procesa solo la franja bajo el horizonte estimado en cada video.",
+    )
+    parser.add_argument(
+        "--roi-poligono", default=None,
+        help='Polígono de la calzada en fracciones del frame, por ejemplo "0.1,0.5;0.9,0.5;1,1;0,1".',
+    )
+    parser.add_argument(
+        "--recorte-inferior", type=float, default=0.0,
+        help="Fracción inferior del frame (capó) que se descarta con --roi-horizonte.",
+    )
+    parser.add_argument("--mosaico", type=int, default=None, help="Infiere en teselas de N píxeles (fuentes 4K).")
+    parser.add_argument("--solape-mosaico", type=float, default=0.2, help="Solape entre teselas.")
+    parser.add_argument(
+        "--metricas", action="store_true",
+        help="Mide el tiempo de cada etapa y guarda <video>_metricas.json junto a cada reporte.",
+    )
+    parser.add_argument(
+        "--reanudar", action="store_true",
+        help="Guarda puntos de control de cada video y continúa los que quedaron interrumpidos.",
+    )
+    parser.add_argument(
+        "--cache", default=None,
+        help="Archivo SQLite de la caché de inferencia; los frames ya inferidos no se vuelven a inferir.",
+    )
+    parser.add_argument(
+        "--base", default=None,
+        help="Archivo SQLite donde se acumulan las cajas de todos los videos (ver base_detecciones).",
+    )
+    parser.add_argument(
+        "--motor", default="pytorch", choices=["pytorch", "onnx", "onnx_int8"],
+        help="Motor de inferencia; onnx_int8 se calibra con el primer video si aún no existe.",
+    )
+    args = parser.parse_args(argv)
+
+    videos = buscar_videos(args.entradas)
+    if not videos:
+        parser.error("No se encontraron videos en las entradas indicadas.")
+    print(f"{len(videos)} videos encontrados")
+    if args.motor != "pytorch":
+        # Los modelos exportados se generan una vez aquí, no en cada proceso del pool
+        from motores_inferencia import preparar_motor
+        preparar_motor(args.modelo, args.motor, video_calibracion=videos[0], modo_flatfield=args.modo_flatfield)
+
+    opciones_procesador = {
+        "modo_flatfield": args.modo_flatfield,
+        "formato_sumidero": args.formato_sumidero,
+        "tamano_mosaico": args.mosaico,
+        "solape_mosaico": args.solape_mosaico,
+        "instrumentar": args.metricas,
+        "motor": args.motor,
+    }
+    if args.cache:
+        opciones_procesador["cache"] = CacheInferencia(args.cache)
+    if args.base:
+        opciones_procesador["base_detecciones"] = BaseDetecciones(args.base)
+    if args.roi_poligono:
+        vertices = [tuple(float(v) for v in punto.split(",")) for punto in args.roi_poligono.split(";")]
+        opciones_procesador["roi"] = RegionInteres(vertices)
+    elif args.roi_horizonte:
+        opciones_procesador["roi"] = RegionInteres(recorte_inferior=args.recorte_inferior)
+    opciones_video = {
+        "paso": args.paso, "tamano_lote": args.tamano_lote, "generar_video": not args.sin_video,
+        "reanudar": args.reanudar,
+    }
+    if args.fragmentos:
+        try:
+            validar_fragmentado(opciones_procesador, opciones_video)
+        except ValueError as e:
+            parser.error(str(e))
+        procesos = args.procesos or os.cpu_count() or 1
+        with ProcessPoolExecutor(
+            max_workers=procesos,
+            initializer=_iniciar_trabajador,
+            initargs=(args.modelo, opciones_procesador, max(1, (os.cpu_count() or 1) // procesos)),
+        ) as pool:
+            resumenes = []
+            for video, nombre in zip(videos, _nombres_salida(videos)):
+                carpeta = os.path.join(args.salida, nombre)
+                os.makedirs(carpeta, exist_ok=True)
+                cap = cv2.VideoCapture(video)
+                frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                cap.release()
+                resumen = {
+                    "video": video, "salida": None if args.sin_video else os.path.join(carpeta, f"{nombre}_procesado.mp4"),
+                    "excel": os.path.join(carpeta, f"{nombre}.xlsx"), "frames": frames,
+                    "detecciones": 0, "segundos": 0.0, "reporte": None, "error": None,
+                }
+                t0 = time.perf_counter()
+                try:
+                    almacen = procesar_video_fragmentado(
+                        video, resumen["salida"], args.modelo,
+                        fragmentos=args.fragmentos,
+                        ruta_excel=resumen["excel"],
+                        opciones_video=opciones_video,
+                        pool=pool,
+                    )
+                    resumen["detecciones"] = len(almacen)
+                    resumen["reporte"] = almacen.a_reporte().copy()
+                except Exception as e:
+                    resumen["error"] = f"{type(e).__name__}: {e}"
+                resumen["segundos"] = time.perf_counter() - t0
+                resumenes.append(resumen)
+                estado = f"ERROR {resumen['error']}" if resumen["error"] else f"{resumen['detecciones']} detecciones"
+                print(f"{os.path.basename(video)}: {estado} ({resumen['segundos']:.1f} s)", flush=True)
+        print(f"Resumen guardado en: {guardar_resumen(resumenes, args.salida)}")
+        return
+
+    procesar_lote(
+        videos,
+        args.salida,
+        args.modelo,
+        procesos=args.procesos,
+        opciones_procesador=opciones_procesador,
+        opciones_video=opciones_video,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+'''
+-----------------------------------------------------------------------------------------------------------------------------------------------
+-------------------------------------------------------- Grupo de investigación Gepar ---------------------------------------------------------
+----------------------------------------------------------- Universidad de Antioquia ----------------------------------------------------------
+------------------------------------------------------------- Medellín, Colombia --------------------------------------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+------------- Descripción: Puntos de control para reanudar procesamientos largos. Periódicamente se guarda el último frame -------------------
+------------- completado, las detecciones acumuladas y el estado del muestreo, y el video de salida se escribe en segmentos ----------------
+------------- que se cierran en cada punto de control. Tras un cierre inesperado, el procesamiento continúa desde el último -----------------
+------------- punto sin repetir el trabajo ya hecho, y al terminar los segmentos se unen en el video final. ----------------------------------
+-----------------------------------------------------------------------------------------------------------------------------------------------
+'''
+
+import glob
+import json
+import os
+import shutil
+import time
+import cv2
+from almacenamiento import AlmacenDetecciones
+
+# Versión del formato del punto de control
+VERSION_PUNTO_CONTROL = 1
+
+
+def _escribir_atomico(ruta, escribir):
+    # Escribe en un archivo temporal, lo sincroniza con el disco y lo renombra sobre `ruta`
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        escribir(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+class PuntoControlIncompatible(ValueError):
+    '''
+    El punto de control existe pero no se puede reanudar: es de otra versión del formato o de
+    otro trabajo (video, intervalo, muestreo o modo).
+    '''
+
+
+class PuntoControl:
+    '''
+    Punto de control de un procesamiento: un JSON con el estado y un archivo .npz con las
+    detecciones acumuladas. Ambos se escriben de forma atómica (archivo temporal + rename), y el
+    JSON nombra el .npz que le corresponde, de modo que un cierre a mitad de la escritura deja
+    intacto el punto de control anterior.
+
+    Atributos:
+        ruta (str): Ruta del JSON del punto de control.
+        intervalo_segundos (float): Segundos mínimos entre puntos de control.
+    '''
+
+    def __init__(self, ruta, intervalo_segundos=60.0):
+        self.ruta = ruta
+        self.intervalo_segundos = intervalo_segundos
+        self._ultimo = time.monotonic()
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(carpeta, exist_ok=True)
+
+    def vencido(self):
+        '''
+        Retorna:
+            bool: True si pasaron intervalo_segundos desde el último punto de control.
+        '''
+        return time.monotonic() - self._ultimo >= self.intervalo_segundos
+
+    def existe(self):
+        return os.path.exists(self.ruta)
+
+    def guardar(self, estado, almacen):
+        '''
+        Guarda un punto de control.
+
+        Parámetros:
+            estado (dict): Estado serializable en JSON (frame siguiente, segmentos, muestreador, ...).
+            almacen (AlmacenDetecciones): Detecciones acumuladas hasta el frame siguiente (excluido).
+        '''
+        base = os.path.splitext(self.ruta)[0]
+        ruta_detecciones = f"{base}.{estado['siguiente']}.npz"
+        _escribir_atomico(ruta_detecciones, almacen.guardar)
+        estado = dict(estado, version=VERSION_PUNTO_CONTROL, detecciones=os.path.basename(ruta_detecciones))
+        _escribir_atomico(self.ruta, lambda f: f.write(json.dumps(estado, indent=1).encode("utf-8")))
+        # Los .npz de puntos anteriores ya no se necesitan
+        for ruta in glob.glob(glob.escape(base) + ".*.npz"):
+            if ruta != ruta_detecciones:
+                os.remove(ruta)
+        self._ultimo = time.monotonic()
+
+    def cargar(self):
+        '''
+        Lee el punto de control.
+
+        Retorna:
+            tuple: (estado (dict), AlmacenDetecciones), o None si no hay punto de control.
+        '''
+        if not self.existe():
+            return None
+        with open(self.ruta, encoding="utf-8") as f:
+            estado = json.load(f)
+        if estado.get("version") != VERSION_PUNTO_CONTROL:
+            raise PuntoControlIncompatible(f"Versión de punto de control no soportada: {estado.get('version')}")
+        ruta_detecciones = os.path.join(os.path.dirname(os.path.abspath(self.ruta)), estado["detecciones"])
+        return estado, AlmacenDetecciones.cargar(ruta_detecciones)
+
+    def eliminar(self):
+        '''
+        Elimina el punto de control y sus detecciones (al terminar el procesamiento).
+        '''
+        base = os.path.splitext(self.ruta)[0]
+        for ruta in [self.ruta] + glob.glob(glob.escape(base) + ".*.npz"):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+class EscritorSegmentado:
+    '''
+    Escritor de video que reparte la salida en segmentos consecutivos. Tiene la misma interfaz
+    que cv2.VideoWriter (write y release) y además cortar(), que cierra el segmento en curso
+    para que quede completo en disco. Al final, unir() concatena los segmentos.
+
+    Atributos:
+        carpeta (str): Carpeta de los segmentos.
+        segmentos (list): Rutas de los segmentos cerrados, en orden.
+    '''
+
+    def __init__(self, carpeta, fps, tamano, segmentos=None, fourcc="mp4v"):
+        '''
+        Parámetros:
+            carpeta (str): Carpeta donde se escriben los segmentos.
+            fps (float): Cuadros por segundo del video.
+            tamano (tuple): (ancho, alto) de los frames.
+            segmentos (list): Segmentos ya cerrados (al reanudar desde un punto de control).
+            fourcc (str): Códec de los segmentos.
+        '''
+        self.carpeta = os.path.abspath(carpeta)
+        os.makedirs(self.carpeta, exist_ok=True)
+        self.fps = fps
+        self.tamano = tamano
+        self.fourcc = fourcc
+        self.segmentos = list(segmentos or [])
+        self._escritor = None
+        self._ruta_actual = None
+
+    def write(self, frame):
+        if self._escritor is None:
+            # El segmento se abre con el primer frame, así que no quedan segmentos vacíos
+            self._ruta_actual = os.path.join(self.carpeta, f"segmento_{len(self.segmentos):04d}.mp4")
+            self._escritor = cv2.VideoWriter(
+                self._ruta_actual, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.tamano
+            )
+        self._escritor.write(frame)
+
+    def cortar(self):
+        '''
+        Cierra el segmento en curso (si tiene frames).
+
+        Retorna:
+            list: Rutas de los segmentos cerrados hasta ahora.
+        '''
+        if self._escritor is not None:
+            self._escritor.release()
+            self.segmentos.append(self._ruta_actual)
+            self._escritor = None
+        return list(self.segmentos)
+
+    def release(self):
+        self.cortar()
+
+    def unir(self, salida):
+        '''
+        Concatena los segmentos cerrados en `salida` y elimina la carpeta de segmentos.
+        '''
+        from procesamiento_lote import unir_videos
+
+        self.cortar()
+        unir_videos(self.segmentos, salida)
+        shutil.rmtree(self.carpeta, ignore_errors=True)
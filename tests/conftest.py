@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repositorio (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def video_corto(tmp_path_factory):
+    '''
+    Video sintético de 4 s a 320x180 (ver benchmark.generar_video_sintetico), compartido por las pruebas.
+    '''
+    from benchmark import video_sintetico
+
+    return video_sintetico(str(tmp_path_factory.mktemp("videos")), 320, 180, 4, fps=30)
+
+
+@pytest.fixture
+def detector():
+    '''
+    Registra el detector simulado de benchmark.py sin latencia y retorna la ruta con la que se
+    crea el PavementProcessor.
+    '''
+    from benchmark import RUTA_DETECTOR_SIMULADO, registrar_detector_simulado
+
+    registrar_detector_simulado(retardo_ms=0, retardo_lote_ms=0)
+    return RUTA_DETECTOR_SIMULADO
@@ -0,0 +1,82 @@
+'''
+Sumideros de resultados: lo agregado se lee de vuelta y se exporta a Excel igual en todos los
+formatos, y el Excel del procesador tiene las mismas filas que su sumidero.
+'''
+
+import os
+
+import pandas as pd
+import pytest
+from almacenamiento import COLUMNAS_RESULTADOS, SUMIDEROS, crear_sumidero, exportar_excel_desde_sumidero
+
+FORMATOS = sorted(SUMIDEROS)
+
+
+def filas_prueba(n, desde=0):
+    return [
+        {"Minuto": i // 60, "Segundo": i % 60, "Huecos": i % 3, "Grietas": i % 2, "Piel de cocodrilo": i % 5}
+        for i in range(desde, desde + n)
+    ]
+
+
+def como_tabla(filas):
+    return pd.DataFrame(filas, columns=COLUMNAS_RESULTADOS)
+
+
+def normalizar(df):
+    return df[COLUMNAS_RESULTADOS].astype("int64").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("formato", FORMATOS)
+def test_agregar_y_exportar(formato, tmp_path):
+    ruta_base = str(tmp_path / "resultados")
+    filas = filas_prueba(120)
+    # intervalo_filas menor que el total: se sincroniza varias veces durante la escritura
+    sumidero = crear_sumidero(formato, ruta_base, intervalo_filas=7)
+    for fila in filas:
+        sumidero.agregar(fila)
+    sumidero.cerrar()
+    sumidero.cerrar()  # Cerrar dos veces es seguro
+
+    ruta_excel = str(tmp_path / "resultados.xlsx")
+    exportado = exportar_excel_desde_sumidero(formato, ruta_base, ruta_excel)
+    pd.testing.assert_frame_equal(normalizar(exportado), normalizar(como_tabla(filas)))
+    pd.testing.assert_frame_equal(normalizar(pd.read_excel(ruta_excel)), normalizar(como_tabla(filas)))
+
+
+@pytest.mark.parametrize("formato", FORMATOS)
+def test_continuar_o_reiniciar(formato, tmp_path):
+    ruta_base = str(tmp_path / "resultados")
+    primeras, siguientes = filas_prueba(10), filas_prueba(5, desde=10)
+    sumidero = crear_sumidero(formato, ruta_base)
+    for fila in primeras:
+        sumidero.agregar(fila)
+    sumidero.cerrar()
+
+    sumidero = crear_sumidero(formato, ruta_base, reiniciar=False)
+    for fila in siguientes:
+        sumidero.agregar(fila)
+    sumidero.sincronizar()
+    pd.testing.assert_frame_equal(normalizar(sumidero.leer()), normalizar(como_tabla(primeras + siguientes)))
+    sumidero.cerrar()
+
+    sumidero = crear_sumidero(formato, ruta_base)
+    sumidero.sincronizar()
+    assert len(sumidero.leer()) == 0
+    sumidero.cerrar()
+
+
+@pytest.mark.parametrize("formato", FORMATOS)
+def test_excel_del_procesador_coincide_con_el_sumidero(formato, detector, video_corto, tmp_path):
+    from backend import PavementProcessor
+
+    ruta_excel = str(tmp_path / "resultados.xlsx")
+    procesador = PavementProcessor(detector, calentar=False, formato_sumidero=formato, ruta_excel=ruta_excel)
+    procesador.procesar_video(video_corto, None, paso=5)
+    assert procesador.sumidero is None  # Cerrado al terminar la ejecución
+    assert len(procesador.detecciones)
+
+    sumidero = crear_sumidero(formato, os.path.splitext(ruta_excel)[0], reiniciar=False)
+    en_disco = sumidero.leer()
+    sumidero.cerrar()
+    pd.testing.assert_frame_equal(normalizar(en_disco), normalizar(pd.read_excel(ruta_excel)))
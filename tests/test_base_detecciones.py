@@ -0,0 +1,81 @@
+'''
+BaseDetecciones: reingresar un intervalo reemplaza lo que había sin duplicar filas, los
+segmentos preagregados se recalculan y se agrupan en múltiplos del segmento de la base, y un
+almacén con frames repetidos se rechaza.
+'''
+
+import sqlite3
+
+import numpy as np
+import pytest
+from almacenamiento import AlmacenDetecciones
+from base_detecciones import COLUMNAS_CONTEO, BaseDetecciones
+
+FPS = 30.0
+
+
+def almacen_cada(paso, desde, hasta, conteos):
+    # Una muestra cada `paso` frames con `conteos` y una caja por imperfección
+    almacen = AlmacenDetecciones()
+    clases = np.repeat(np.arange(3), conteos)
+    for frame in range(desde, hasta, paso):
+        xyxy = np.tile(np.array([[0, 0, 10, 10]], np.float32), (len(clases), 1))
+        almacen.agregar(frame, frame * 1000.0 / FPS, conteos, clases, np.full(len(clases), 0.9, np.float32), xyxy)
+    return almacen
+
+
+def filas(base, tabla):
+    with sqlite3.connect(base.ruta) as conexion:
+        return conexion.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+
+def segmentos(base, **kwargs):
+    datos = base.conteos_por_segmento(**kwargs)
+    return {float(fila.inicio_s): tuple(int(getattr(fila, c)) for c in COLUMNAS_CONTEO) for fila in datos.itertuples()}
+
+
+@pytest.fixture
+def base(tmp_path):
+    base = BaseDetecciones(str(tmp_path / "detecciones.sqlite"), segmento_s=1.0)
+    yield base
+    base.cerrar()
+
+
+def test_reingresar_intervalo_solapado_reemplaza(base, video_corto):
+    # video_corto: 4 s a 30 fps (120 frames)
+    base.ingresar(video_corto, almacen_cada(5, 0, 120, [1, 0, 2]))
+    assert filas(base, "muestras") == 24 and filas(base, "cajas") == 24 * 3
+    assert segmentos(base) == {0.0: (6, 0, 12), 1.0: (6, 0, 12), 2.0: (6, 0, 12), 3.0: (6, 0, 12)}
+
+    # Reprocesar [40, 90) dos veces: el rango se reemplaza y no se duplica
+    for _ in range(2):
+        base.ingresar(video_corto, almacen_cada(5, 40, 90, [0, 1, 0]), inicio_frame=40, fin_frame=90)
+        assert filas(base, "muestras") == 24
+        assert filas(base, "cajas") == 14 * 3 + 10
+        assert filas(base, "videos") == 1
+        # El segmento 1 mezcla muestras de fuera del rango (frames 30 y 35) con las nuevas
+        assert segmentos(base) == {0.0: (6, 0, 12), 1.0: (2, 4, 4), 2.0: (0, 6, 0), 3.0: (6, 0, 12)}
+
+    assert segmentos(base, segmento_s=2) == {0.0: (8, 4, 16), 2.0: (6, 6, 12)}
+    assert segmentos(base, segmento_s=4) == {0.0: (14, 10, 28)}
+    assert segmentos(base, desde_s=1.5, hasta_s=2.5) == {1.0: (2, 4, 4), 2.0: (0, 6, 0)}
+    assert len(base.cajas(desde_s=2, hasta_s=3)) == 6
+
+
+def test_frames_repetidos_se_rechazan(base, video_corto):
+    almacen = almacen_cada(5, 0, 60, [1, 0, 0])
+    almacen.agregar(10, 10 * 1000.0 / FPS, [1, 0, 0])
+    with pytest.raises(ValueError, match="repetidos"):
+        base.ingresar(video_corto, almacen)
+    assert filas(base, "muestras") == 0
+    # Fuera del rango ingresado el frame repetido no importa
+    base.ingresar(video_corto, almacen, inicio_frame=20, fin_frame=60)
+    assert filas(base, "muestras") == 8
+
+
+@pytest.mark.parametrize("segmento_s", [0.5, 1.5, 2.5])
+def test_segmento_debe_ser_multiplo_del_de_la_base(base, video_corto, segmento_s):
+    base.ingresar(video_corto, almacen_cada(5, 0, 120, [1, 0, 0]))
+    with pytest.raises(ValueError, match="múltiplo"):
+        base.conteos_por_segmento(segmento_s=segmento_s)
+    assert len(base.conteos_por_segmento(segmento_s=3.0)) == 2
@@ -0,0 +1,104 @@
+'''
+CacheInferencia: ida y vuelta de las cajas, recorte LRU sin tocar la clave en curso y clave
+construida con el modo de flat-field que realmente se usa.
+'''
+
+import itertools
+import types
+import numpy as np
+import pytest
+import cache_inferencia
+from backend import PavementProcessor
+from cache_inferencia import CacheInferencia
+
+
+def cajas(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return (
+        rng.integers(0, 3, n),
+        rng.random(n, dtype=np.float32),
+        rng.random((n, 4), dtype=np.float32) * 640,
+    )
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # Reloj estrictamente creciente para que el orden LRU no dependa de la resolución de time.time
+    reloj = itertools.count(1)
+    monkeypatch.setattr(cache_inferencia, "time", types.SimpleNamespace(time=lambda: float(next(reloj))))
+    cache = CacheInferencia(str(tmp_path / "cache.sqlite"), intervalo_escritura=1000)
+    yield cache
+    cache.cerrar()
+
+
+def llenar(cache, clave, frames=4, n=10):
+    cache.cargar(clave, 0, frames)
+    for indice in range(frames):
+        cache.guardar(clave, indice, cajas(n, indice))
+    cache.sincronizar()
+
+
+def test_guardar_y_cargar(cache):
+    llenar(cache, "a", frames=3)
+    leidas = cache.cargar("a", 1, 3)
+    assert sorted(leidas) == [1, 2]
+    clases, confianzas, xyxy = cajas(10, 2)
+    np.testing.assert_array_equal(leidas[2][0], clases)
+    np.testing.assert_array_equal(leidas[2][1], confianzas)
+    np.testing.assert_array_equal(leidas[2][2], xyxy)
+    # 10 cajas de 6 float32 por frame
+    assert cache.tamano() == 3 * 10 * 6 * 4
+
+
+def test_recortar_elimina_las_claves_usadas_hace_mas_tiempo(cache):
+    for clave in "abc":
+        llenar(cache, clave)
+    por_clave = cache.tamano() // 3
+    cache.cargar("a", 0, 1)  # "a" pasa a ser la más reciente; "b" es la más antigua
+    cache.limite_bytes = 2 * por_clave
+    cache.recortar()
+    assert cache.tamano() == 2 * por_clave
+    assert cache.cargar("b", 0, 4) == {}
+    assert len(cache.cargar("a", 0, 4)) == len(cache.cargar("c", 0, 4)) == 4
+
+
+def test_recortar_no_elimina_la_clave_en_curso(cache):
+    for clave in "abc":
+        llenar(cache, clave)
+    por_clave = cache.tamano() // 3
+    # La clave en curso es la más antigua y el límite no alcanza ni para ella sola
+    cache.limite_bytes = por_clave // 2
+    cache.recortar(conservar="a")
+    assert cache.tamano() == por_clave
+    assert len(cache.cargar("a", 0, 4)) == 4
+
+
+def test_recortar_escribe_las_entradas_pendientes(cache):
+    cache.cargar("a", 0, 2)
+    cache.guardar("a", 0, cajas(5))
+    cache.recortar()
+    assert len(cache.cargar("a", 0, 2)) == 1
+
+
+def test_respaldo_al_modo_exacto_cambia_la_clave(detector, video_corto, tmp_path):
+    cache = CacheInferencia(str(tmp_path / "cache.sqlite"))
+    opciones = dict(calentar=False, cache=cache, tolerancia_flatfield=-1)
+    exacto = PavementProcessor(detector, modo_flatfield="exacto", ruta_excel=str(tmp_path / "exacto.xlsx"), **opciones)
+    exacto.procesar_video(video_corto, None, paso=10)
+
+    # Con tolerancia negativa el modo rápido siempre vuelve al exacto: las detecciones se
+    # guardan con la clave del modo exacto y se reutilizan las del procesamiento anterior
+    rapido = PavementProcessor(detector, modo_flatfield="rapido", ruta_excel=str(tmp_path / "rapido.xlsx"), **opciones)
+    rapido.procesar_video(video_corto, None, paso=10)
+    assert rapido.modo_flatfield == "exacto"
+    assert rapido._clave_cache == exacto._clave_cache
+    assert rapido.estadisticas_cache["inferidos"] == 0
+    assert rapido.estadisticas_cache["aciertos"] == exacto.estadisticas_cache["inferidos"] > 0
+
+    sin_respaldo = PavementProcessor(
+        detector, modo_flatfield="rapido", calentar=False, cache=cache, tolerancia_flatfield=None,
+        ruta_excel=str(tmp_path / "sin.xlsx"),
+    )
+    sin_respaldo.procesar_video(video_corto, None, paso=10)
+    assert sin_respaldo._clave_cache != exacto._clave_cache
+    cache.cerrar()
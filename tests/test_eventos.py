@@ -0,0 +1,42 @@
+'''
+Flujo de eventos: dejar de iterar la suscripción detiene el procesamiento, también si se
+cancela antes de que el hilo termine de preparar el video.
+'''
+
+import time
+
+from backend import PavementProcessor
+from eventos import FlujoEventos
+
+
+def test_salir_del_for_detiene_el_procesamiento(detector, video_corto, tmp_path):
+    procesador = PavementProcessor(detector, calentar=False, ruta_excel=str(tmp_path / "resultados.xlsx"))
+    suscripcion = procesador.eventos(video_corto, None, paso=1, tipos=("progreso",))
+    for evento in suscripcion:
+        break
+    suscripcion._flujo.esperar(30)
+    assert not suscripcion._flujo._hilo.is_alive()
+    # 120 frames muestreados de uno en uno: solo se procesan los anteriores a la cancelación
+    assert procesador.metricas.muestras < 10
+
+
+def test_cancelar_antes_de_empezar_se_respeta(detector, video_corto, tmp_path, monkeypatch):
+    procesador = PavementProcessor(detector, calentar=False, ruta_excel=str(tmp_path / "resultados.xlsx"))
+    reiniciar = procesador._reiniciar_resultados
+
+    def preparacion_lenta():
+        # La cancelación llega mientras el hilo aún prepara el video
+        time.sleep(0.2)
+        reiniciar()
+
+    monkeypatch.setattr(procesador, "_reiniciar_resultados", preparacion_lenta)
+    flujo = FlujoEventos(procesador, video_corto, None, paso=1)
+    suscripcion = flujo.suscribir()
+    flujo.iniciar()
+    suscripcion.cerrar()
+    flujo.esperar(30)
+    assert procesador.metricas.muestras == 0 and len(procesador.detecciones) == 0
+
+    # La cancelación no se arrastra a la ejecución siguiente
+    procesador.procesar_video(video_corto, None, paso=5)
+    assert len(procesador.detecciones) > 0
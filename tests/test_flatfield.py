@@ -0,0 +1,72 @@
+'''
+Regresión del modo rápido de imflatfield: su error máximo frente a la implementación exacta
+no debe superar la tolerancia que PavementProcessor usa por defecto.
+'''
+
+import cv2
+import numpy as np
+import pytest
+from backend import error_flatfield, imflatfield
+
+# Tolerancia por defecto de PavementProcessor (tolerancia_flatfield)
+TOLERANCIA = 2
+
+
+def cuadro_sintetico(ancho, alto, semilla=0):
+    '''
+    Cuadro de pavimento fijo: textura de asfalto, línea central, huecos y grietas oscuras, con
+    iluminación no uniforme (viñeteado y sombra lateral), que es lo que corrige imflatfield.
+    '''
+    rng = np.random.default_rng(semilla)
+    asfalto = rng.normal(120, 12, (alto, ancho)).astype(np.float32)
+    asfalto = cv2.GaussianBlur(asfalto, (0, 0), 1.5)
+    cv2.line(asfalto, (ancho // 2, alto // 3), (ancho // 2, alto), 210, max(2, ancho // 200))
+    for _ in range(8):
+        centro = (int(rng.integers(0, ancho)), int(rng.integers(alto // 3, alto)))
+        cv2.ellipse(asfalto, centro, (int(rng.integers(10, 60)), int(rng.integers(5, 30))), 0, 0, 360, 40, -1)
+    for _ in range(6):
+        puntos = np.cumsum(rng.integers(-15, 16, (30, 2)), axis=0) + [rng.integers(0, ancho), rng.integers(0, alto)]
+        cv2.polylines(asfalto, [puntos.astype(np.int32)], False, 50, 2)
+    y, x = np.mgrid[0:alto, 0:ancho].astype(np.float32)
+    radio = ((x - ancho / 2) / ancho) ** 2 + ((y - alto / 2) / alto) ** 2
+    iluminacion = (1.0 - 0.9 * radio) * (0.7 + 0.3 * x / ancho)
+    gris = np.clip(asfalto * iluminacion, 0, 255).astype(np.uint8)
+    return cv2.merge([gris, gris, np.clip(gris.astype(np.int16) + 5, 0, 255).astype(np.uint8)])
+
+
+@pytest.mark.parametrize("ancho, alto", [(1280, 720), (1920, 1080)])
+def test_error_modo_rapido_dentro_de_tolerancia(ancho, alto):
+    cuadro = cuadro_sintetico(ancho, alto)
+    assert error_flatfield(cuadro) <= TOLERANCIA
+
+
+@pytest.mark.parametrize("ancho, alto", [(1280, 720), (1920, 1080)])
+def test_modo_rapido_conserva_forma_y_tipo(ancho, alto):
+    cuadro = cuadro_sintetico(ancho, alto, semilla=1)
+    salida = imflatfield(cuadro, modo="rapido")
+    assert salida.shape == cuadro.shape
+    assert salida.dtype == np.uint8
+
+
+def test_modo_exacto_por_defecto(detector):
+    from backend import PavementProcessor
+
+    procesador = PavementProcessor(detector, calentar=False)
+    assert procesador.modo_flatfield == "exacto"
+
+
+def test_modo_rapido_se_verifica_en_cada_video(detector, video_corto, tmp_path):
+    from backend import PavementProcessor
+
+    # Con tolerancia 0 la verificación falla y el video se procesa en modo exacto
+    procesador = PavementProcessor(
+        detector, modo_flatfield="rapido", tolerancia_flatfield=0, calentar=False,
+        ruta_excel=str(tmp_path / "resultados.xlsx"),
+    )
+    procesador.procesar_video(video_corto, None)
+    assert procesador.modo_flatfield == "exacto"
+
+    # El siguiente video vuelve a partir del modo configurado
+    procesador.tolerancia_flatfield = None
+    procesador.procesar_video(video_corto, None)
+    assert procesador.modo_flatfield == "rapido"
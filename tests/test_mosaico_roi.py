@@ -0,0 +1,92 @@
+'''
+Inferencia por teselas y región de interés: cobertura y solape de dividir_mosaico, supresión
+de no máximos por clase y filtrado de cajas por el centro dentro del polígono.
+'''
+
+import numpy as np
+import pytest
+from backend import RegionInteres, dividir_mosaico, supresion_no_maximos
+
+
+@pytest.mark.parametrize("alto, ancho, tamano, solape", [
+    (1080, 1920, 640, 0.2),
+    (720, 1280, 640, 0.25),
+    (1000, 1000, 640, 0.0),
+    (641, 1500, 640, 0.5),
+])
+def test_mosaico_cubre_la_imagen_con_solape(alto, ancho, tamano, solape):
+    teselas = dividir_mosaico(alto, ancho, tamano=tamano, solape=solape)
+    cubierto = np.zeros((alto, ancho), bool)
+    for x0, y0, x1, y1 in teselas:
+        assert (x1 - x0, y1 - y0) == (min(tamano, ancho), min(tamano, alto))
+        assert 0 <= x0 and 0 <= y0 and x1 <= ancho and y1 <= alto
+        cubierto[y0:y1, x0:x1] = True
+    assert cubierto.all()
+
+    # La última tesela de cada eje queda alineada con el borde y las vecinas se solapan al menos `solape`
+    inicios_x = sorted({x0 for x0, _, _, _ in teselas})
+    assert inicios_x[0] == 0 and inicios_x[-1] + tamano == ancho
+    assert all(b - a <= int(tamano * (1 - solape)) for a, b in zip(inicios_x, inicios_x[1:]))
+
+
+def test_mosaico_de_imagen_menor_que_la_tesela():
+    assert dividir_mosaico(300, 500, tamano=640) == [(0, 0, 500, 300)]
+    # Un solo eje mayor que la tesela: la segunda tesela termina en el borde
+    assert dividir_mosaico(300, 900, tamano=640, solape=0.2) == [(0, 0, 640, 300), (260, 0, 900, 300)]
+
+
+def test_supresion_no_maximos_por_clase():
+    clases = np.array([0, 0, 1, 0, 2])
+    confianzas = np.array([0.6, 0.9, 0.8, 0.5, 0.7], np.float32)
+    xyxy = np.array([
+        [0, 0, 100, 100],      # repetida de la siguiente con menos confianza
+        [5, 0, 105, 100],
+        [0, 0, 100, 100],      # misma caja, otra clase: se conserva
+        [300, 300, 350, 350],  # sin solape
+        [2, 2, 102, 102],      # otra clase
+    ], np.float32)
+    c, conf, cajas = supresion_no_maximos(clases, confianzas, xyxy, umbral_iou=0.5)
+    assert c.tolist() == [0, 1, 2, 0]
+    np.testing.assert_allclose(conf, [0.9, 0.8, 0.7, 0.5])
+    np.testing.assert_array_equal(cajas[0], xyxy[1])
+
+
+def test_supresion_no_maximos_respeta_el_umbral():
+    clases = np.array([0, 0])
+    confianzas = np.array([0.9, 0.8], np.float32)
+    # IoU = 50 / 150
+    xyxy = np.array([[0, 0, 10, 10], [5, 0, 15, 10]], np.float32)
+    assert len(supresion_no_maximos(clases, confianzas, xyxy, umbral_iou=0.5)[0]) == 2
+    assert len(supresion_no_maximos(clases, confianzas, xyxy, umbral_iou=0.3)[0]) == 1
+    # Con una sola caja no hay nada que suprimir
+    assert len(supresion_no_maximos(clases[:1], confianzas[:1], xyxy[:1])[0]) == 1
+
+
+def test_region_interes_filtra_por_centro_en_el_poligono():
+    # Triángulo con la base abajo: la esquina superior izquierda del rectángulo queda fuera
+    region = RegionInteres([(0.5, 0.2), (1.0, 1.0), (0.0, 1.0)])
+    frame = np.zeros((200, 400, 3), np.uint8)
+    assert region.resolver(frame) == (0, 40, 400, 200)
+    assert region.mascara.shape == (160, 400)
+
+    clases = np.array([0, 1, 2])
+    confianzas = np.array([0.9, 0.8, 0.7], np.float32)
+    xyxy = np.array([
+        [180, 150, 220, 190],  # centro (200, 170): dentro
+        [10, 50, 50, 70],      # centro (30, 60): dentro del rectángulo, fuera del triángulo
+        [310, 170, 350, 195],  # centro (330, 182): dentro
+    ], np.float32)
+    c, conf, cajas = region.filtrar(clases, confianzas, xyxy)
+    assert c.tolist() == [0, 2]
+    np.testing.assert_array_equal(cajas, xyxy[[0, 2]])
+
+
+def test_region_interes_en_pixeles_y_sin_poligono():
+    region = RegionInteres([(10, 20), (110, 20), (110, 80), (10, 80)], normalizado=False)
+    assert region.resolver(np.zeros((100, 200, 3), np.uint8)) == (10, 20, 111, 81)
+    # Sin polígono no hay máscara y no se filtra nada
+    sin_poligono = RegionInteres()
+    xyxy = np.array([[0, 0, 5, 5]], np.float32)
+    assert sin_poligono.filtrar(np.array([0]), np.array([0.5]), xyxy)[2] is xyxy
+    region.reiniciar()
+    assert region.rectangulo is None and region.mascara is None
@@ -0,0 +1,82 @@
+'''
+Procesamiento por fragmentos: con muestreo fijo, el reporte y el video unidos coinciden con los
+de una sola pasada, y las opciones que arrastran estado entre frames se rechazan.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+import procesamiento_lote
+from backend import MuestreadorAdaptativo, MuestreadorFijo, PavementProcessor, RegionInteres
+from procesamiento_lote import planificar_fragmentos, procesar_video_fragmentado, validar_fragmentado
+
+
+@pytest.fixture
+def trabajador(detector, monkeypatch):
+    # Los fragmentos se procesan en hilos de este proceso, con el detector simulado ya registrado
+    monkeypatch.setitem(procesamiento_lote._trabajador, "model_path", detector)
+    monkeypatch.setitem(procesamiento_lote._trabajador, "opciones", {"calentar": False})
+    return detector
+
+
+def contar_frames(ruta):
+    cap = cv2.VideoCapture(ruta)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frames
+
+
+@pytest.mark.parametrize("inicio, fin, fragmentos, paso", [(0, 120, 3, 5), (7, 200, 4, 20), (0, 10, 8, 3)])
+def test_planificar_fragmentos(inicio, fin, fragmentos, paso):
+    rangos = planificar_fragmentos(inicio, fin, fragmentos, paso)
+    assert rangos[0][0] == inicio and rangos[-1][1] == fin
+    assert all(a < b for a, b in rangos)
+    assert all(rangos[i][1] == rangos[i + 1][0] for i in range(len(rangos) - 1))
+    # Cada fragmento (salvo el primero) empieza en un frame muestreado de la pasada completa
+    assert all((a - inicio + 1) % paso == 0 for a, _ in rangos[1:])
+
+
+def test_fragmentos_coinciden_con_una_pasada(trabajador, video_corto, tmp_path):
+    unico = PavementProcessor(trabajador, calentar=False, ruta_excel=str(tmp_path / "unico.xlsx"))
+    unico.procesar_video(video_corto, str(tmp_path / "unico.mp4"), paso=5)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        almacen = procesar_video_fragmentado(
+            video_corto, str(tmp_path / "fragmentos.mp4"), trabajador, fragmentos=3,
+            ruta_excel=str(tmp_path / "fragmentos.xlsx"), opciones_video={"paso": 5}, pool=pool,
+        )
+
+    esperado, obtenido = unico.detecciones.columnas(), almacen.columnas()
+    assert len(esperado["frame"]) > 0
+    for columna in esperado:
+        np.testing.assert_array_equal(obtenido[columna], esperado[columna])
+    pd.testing.assert_frame_equal(almacen.cajas_dataframe(), unico.detecciones.cajas_dataframe())
+    pd.testing.assert_frame_equal(
+        pd.read_excel(tmp_path / "fragmentos.xlsx"), pd.read_excel(tmp_path / "unico.xlsx")
+    )
+    assert contar_frames(str(tmp_path / "fragmentos.mp4")) == contar_frames(str(tmp_path / "unico.mp4"))
+    assert not list(tmp_path.glob("fragmentos_*"))  # Los segmentos temporales se eliminan
+
+
+@pytest.mark.parametrize("opciones_procesador, opciones_video", [
+    ({}, {"muestreador": MuestreadorAdaptativo()}),
+    ({}, {"paso": 5, "muestreador": MuestreadorFijo(10)}),
+    ({}, {"seguimiento": True}),
+    ({}, {"dibujar_cada_frame": True}),
+    ({"modo_flatfield": "incremental"}, {}),
+    ({"roi": RegionInteres()}, {}),
+    ({"roi": "horizonte"}, {}),
+])
+def test_opciones_con_estado_se_rechazan(opciones_procesador, opciones_video):
+    with pytest.raises(ValueError, match="fragmentos"):
+        validar_fragmentado(opciones_procesador, opciones_video)
+
+
+def test_opciones_sin_estado_se_admiten():
+    validar_fragmentado(
+        {"modo_flatfield": "rapido", "roi": RegionInteres([(0, 0.5), (1, 0.5), (1, 1), (0, 1)])},
+        {"paso": 10, "muestreador": MuestreadorFijo(10), "tamano_lote": 4},
+    )
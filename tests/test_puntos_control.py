@@ -0,0 +1,100 @@
+'''
+Puntos de control: ida y vuelta del estado y las detecciones, rechazo de otras versiones del
+formato y reanudación de un procesamiento cancelado con el mismo resultado que sin cortes.
+'''
+
+import json
+
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+from almacenamiento import AlmacenDetecciones
+from backend import PavementProcessor
+from puntos_control import PuntoControl, PuntoControlIncompatible
+
+
+def almacen_prueba():
+    almacen = AlmacenDetecciones()
+    almacen.agregar(10, 333.0, [1, 0, 2], np.array([0, 2, 2]), np.array([0.9, 0.5, 0.7], np.float32),
+                    np.arange(12, dtype=np.float32).reshape(3, 4))
+    almacen.agregar(20, 666.0, [0, 1, 0], np.array([1]), np.array([0.8], np.float32),
+                    np.array([[5, 5, 50, 50]], np.float32))
+    return almacen
+
+
+def contar_frames(ruta):
+    cap = cv2.VideoCapture(ruta)
+    n = 0
+    while cap.read()[0]:
+        n += 1
+    cap.release()
+    return n
+
+
+def test_guardar_y_cargar(tmp_path):
+    punto = PuntoControl(str(tmp_path / "trabajo.punto_control.json"))
+    assert punto.cargar() is None
+    punto.guardar({"siguiente": 10, "segmentos": []}, AlmacenDetecciones())
+    almacen = almacen_prueba()
+    punto.guardar({"siguiente": 25, "segmentos": ["a.mp4"]}, almacen)
+
+    estado, cargado = punto.cargar()
+    assert estado["siguiente"] == 25 and estado["segmentos"] == ["a.mp4"]
+    pd.testing.assert_frame_equal(cargado.a_dataframe(), almacen.a_dataframe())
+    pd.testing.assert_frame_equal(cargado.cajas_dataframe(), almacen.cajas_dataframe())
+    # Solo queda el .npz del último punto de control
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["trabajo.punto_control.25.npz", "trabajo.punto_control.json"]
+
+    punto.eliminar()
+    assert list(tmp_path.iterdir()) == [] and punto.cargar() is None
+
+
+def test_version_distinta_es_incompatible(tmp_path):
+    ruta = tmp_path / "trabajo.punto_control.json"
+    punto = PuntoControl(str(ruta))
+    punto.guardar({"siguiente": 5}, almacen_prueba())
+    estado = json.loads(ruta.read_text(encoding="utf-8"))
+    estado["version"] += 1
+    ruta.write_text(json.dumps(estado), encoding="utf-8")
+    with pytest.raises(PuntoControlIncompatible):
+        punto.cargar()
+
+
+@pytest.mark.parametrize("opciones", [{}, {"seguimiento": True}], ids=["muestreado", "seguimiento"])
+def test_reanudar_equivale_a_procesar_sin_cortes(detector, video_corto, tmp_path, opciones):
+    completo = PavementProcessor(detector, calentar=False, ruta_excel=str(tmp_path / "completo.xlsx"))
+    completo.procesar_video(video_corto, str(tmp_path / "completo.mp4"), paso=5, **opciones)
+
+    procesador = PavementProcessor(detector, calentar=False, ruta_excel=str(tmp_path / "reanudado.xlsx"))
+    punto_control = str(tmp_path / "reanudado.punto_control.json")
+    argumentos = dict(paso=5, punto_control=punto_control, intervalo_punto_control=0, **opciones)
+    muestras = []
+
+    def cancelar_a_mitad(frame_inferido, frame, progreso, counts):
+        muestras.append(progreso)
+        if len(muestras) == 10:
+            procesador.cancelar()
+
+    procesador.procesar_video(video_corto, str(tmp_path / "reanudado.mp4"), callback=cancelar_a_mitad, **argumentos)
+    assert PuntoControl(punto_control).existe()
+    assert muestras[-1] < 100
+
+    procesador.procesar_video(video_corto, str(tmp_path / "reanudado.mp4"), reanudar=True, **argumentos)
+    assert not PuntoControl(punto_control).existe()
+    pd.testing.assert_frame_equal(procesador.detecciones.a_dataframe(), completo.detecciones.a_dataframe())
+    pd.testing.assert_frame_equal(procesador.detecciones.cajas_dataframe(), completo.detecciones.cajas_dataframe())
+    assert contar_frames(str(tmp_path / "reanudado.mp4")) == contar_frames(str(tmp_path / "completo.mp4")) > 0
+
+
+def test_reanudar_otro_trabajo_es_incompatible(detector, video_corto, tmp_path):
+    procesador = PavementProcessor(detector, calentar=False, ruta_excel=str(tmp_path / "resultados.xlsx"))
+    punto_control = str(tmp_path / "trabajo.punto_control.json")
+
+    def cancelar(*args):
+        procesador.cancelar()
+
+    procesador.procesar_video(video_corto, None, callback=cancelar, paso=5, punto_control=punto_control,
+                              intervalo_punto_control=0)
+    with pytest.raises(PuntoControlIncompatible):
+        procesador.procesar_video(video_corto, None, paso=10, punto_control=punto_control, reanudar=True)
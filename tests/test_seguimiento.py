@@ -0,0 +1,155 @@
+'''
+SeguidorDetecciones: asociación por IoU entre keyframes, expiración de pistas, propagación
+con flujo óptico y la regla de contar cada imperfección una sola vez en el reporte.
+'''
+
+import cv2
+import numpy as np
+import pytest
+from backend import PavementProcessor, SeguidorDetecciones, matriz_iou
+
+
+def textura(ancho=320, alto=240, semilla=0):
+    # Frame con textura suficiente para el flujo óptico
+    rng = np.random.default_rng(semilla)
+    gris = cv2.GaussianBlur(rng.integers(0, 255, (alto, ancho), dtype=np.uint8), (0, 0), 2)
+    return cv2.cvtColor(cv2.normalize(gris, None, 0, 255, cv2.NORM_MINMAX), cv2.COLOR_GRAY2BGR)
+
+
+def trasladar(frame, dx, dy):
+    matriz = np.float32([[1, 0, dx], [0, 1, dy]])
+    return cv2.warpAffine(frame, matriz, (frame.shape[1], frame.shape[0]), borderMode=cv2.BORDER_REFLECT)
+
+
+CAJA = np.array([[100, 80, 160, 140]], np.float32)
+
+
+def test_matriz_iou():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [100, 100, 110, 110]], np.float32)
+    iou = matriz_iou(a, b)
+    assert iou.shape == (2, 3)
+    np.testing.assert_allclose(iou[0], [1.0, 50 / 150, 0.0], rtol=1e-6)
+    np.testing.assert_allclose(iou[1], [0.0, 0.0, 0.0])
+    assert matriz_iou(a, np.empty((0, 4), np.float32)).shape == (2, 0)
+
+
+def test_misma_imperfeccion_se_cuenta_una_vez():
+    seguidor = SeguidorDetecciones()
+    frame = textura()
+    ids, nuevos = seguidor.actualizar(frame, CAJA, [0])
+    assert ids.tolist() == [1] and nuevos.tolist() == [1, 0, 0]
+    # En el siguiente keyframe la caja se movió poco (IoU alto): misma pista, nada nuevo
+    ids, nuevos = seguidor.actualizar(frame, CAJA + 5, [0])
+    assert ids.tolist() == [1] and nuevos.tolist() == [0, 0, 0]
+    assert seguidor.conteo_unico.tolist() == [1, 0, 0]
+
+
+def test_otra_clase_o_poco_solape_abre_pista_nueva():
+    seguidor = SeguidorDetecciones(umbral_iou=0.3)
+    frame = textura()
+    seguidor.actualizar(frame, CAJA, [0])
+    # Misma posición con otra clase y una caja de la misma clase lejos de la pista
+    cajas = np.concatenate([CAJA, CAJA + [150, 0, 150, 0]])
+    ids, nuevos = seguidor.actualizar(frame, cajas, [2, 0])
+    assert sorted(ids.tolist()) == [2, 3]
+    assert nuevos.tolist() == [1, 0, 1]
+    assert seguidor.conteo_unico.tolist() == [2, 0, 1]
+
+
+def test_asignacion_voraz_no_repite_pista():
+    seguidor = SeguidorDetecciones()
+    frame = textura()
+    seguidor.actualizar(frame, CAJA, [1])
+    # Dos detecciones solapan la misma pista: solo la de mayor IoU la hereda
+    ids, nuevos = seguidor.actualizar(frame, np.concatenate([CAJA + 2, CAJA + 20]), [1, 1])
+    assert ids[0] == 1 and ids[1] != 1
+    assert nuevos.tolist() == [0, 1, 0]
+
+
+@pytest.mark.parametrize("max_perdidos", [1, 2])
+def test_expiracion_de_pistas(max_perdidos):
+    frame = textura()
+    vacio = np.empty((0, 4), np.float32)
+
+    # Ausente max_perdidos keyframes: la pista sigue viva y conserva el identificador
+    seguidor = SeguidorDetecciones(max_perdidos=max_perdidos)
+    seguidor.actualizar(frame, CAJA, [0])
+    for _ in range(max_perdidos):
+        seguidor.actualizar(frame, vacio, [])
+    ids, nuevos = seguidor.actualizar(frame, CAJA, [0])
+    assert ids.tolist() == [1] and nuevos.sum() == 0
+
+    # Ausente un keyframe más: la pista se descarta y la imperfección se cuenta de nuevo
+    seguidor = SeguidorDetecciones(max_perdidos=max_perdidos)
+    seguidor.actualizar(frame, CAJA, [0])
+    for _ in range(max_perdidos + 1):
+        seguidor.actualizar(frame, vacio, [])
+    assert len(seguidor.ids) == 0
+    ids, nuevos = seguidor.actualizar(frame, CAJA, [0])
+    assert ids.tolist() == [2] and nuevos.tolist() == [1, 0, 0]
+
+
+def test_propagar_sigue_el_desplazamiento():
+    seguidor = SeguidorDetecciones()
+    frame = textura()
+    seguidor.actualizar(frame, CAJA, [0])
+    movido = trasladar(frame, 6, 4)
+    seguidor.propagar(movido)
+    np.testing.assert_allclose(seguidor.cajas[0], CAJA[0] + [6, 4, 6, 4], atol=1.0)
+    # El keyframe siguiente detecta la caja en su nueva posición: misma pista
+    ids, nuevos = seguidor.actualizar(movido, CAJA + [6, 4, 6, 4], [0])
+    assert ids.tolist() == [1] and nuevos.sum() == 0
+
+
+def test_pistas_fuera_del_cuadro_se_descartan():
+    seguidor = SeguidorDetecciones()
+    frame = textura()
+    seguidor.actualizar(frame, np.array([[300, 10, 319, 30]], np.float32), [2])
+    seguidor.cajas += (40, 0, 40, 0)  # Como si el flujo la hubiera sacado del cuadro
+    seguidor.propagar(frame)
+    seguidor.propagar(frame)
+    assert len(seguidor.cajas) == 0
+
+
+def test_estado_y_restaurar():
+    seguidor = SeguidorDetecciones()
+    frame = textura()
+    seguidor.actualizar(frame, np.concatenate([CAJA, CAJA + 100]), [0, 1])
+    restaurado = SeguidorDetecciones()
+    restaurado.restaurar(seguidor.estado())
+    ids, nuevos = restaurado.actualizar(frame, CAJA, [0])
+    assert ids.tolist() == [1] and nuevos.sum() == 0
+    assert restaurado.siguiente_id == seguidor.siguiente_id
+
+
+def test_reporte_con_seguimiento_cuenta_cada_imperfeccion_una_vez(detector, video_corto, tmp_path):
+    procesador = PavementProcessor(detector, calentar=False, ruta_excel=str(tmp_path / "resultados.xlsx"))
+    procesador.procesar_video(video_corto, None, paso=5, seguimiento=True)
+    columnas = procesador.detecciones.columnas()
+    registrados = np.column_stack([columnas[nombre] for nombre in procesador.detecciones.CLASES]).sum(axis=0)
+    # Las filas del reporte suman las imperfecciones distintas, no las detecciones por keyframe
+    assert registrados.tolist() == procesador.seguidor.conteo_unico.tolist()
+    assert registrados.sum() > 0
+
+    sin_seguimiento = PavementProcessor(detector, calentar=False, ruta_excel=str(tmp_path / "sin.xlsx"))
+    sin_seguimiento.procesar_video(video_corto, None, paso=5)
+    columnas = sin_seguimiento.detecciones.columnas()
+    assert sum(columnas[nombre].sum() for nombre in sin_seguimiento.detecciones.CLASES) >= registrados.sum()
+
+
+def test_cuadro_a_cuadro_dibuja_sobre_el_mismo_frame_que_el_modo_muestreado(detector, video_corto, tmp_path):
+    def capturar(destino):
+        def callback(frame_inferido, frame, progreso, counts):
+            destino.append(frame_inferido.copy())
+        return callback
+
+    muestreado, cuadro_a_cuadro = [], []
+    procesador = PavementProcessor(detector, calentar=False, ruta_excel=str(tmp_path / "resultados.xlsx"))
+    procesador.procesar_video(video_corto, None, callback=capturar(muestreado), paso=5)
+    procesador.procesar_video(video_corto, None, callback=capturar(cuadro_a_cuadro), paso=5,
+                           dibujar_cada_frame=True)
+    assert len(muestreado) == len(cuadro_a_cuadro) > 0
+    # Ambos modos dibujan sobre el frame preprocesado
+    for a, b in zip(muestreado, cuadro_a_cuadro):
+        np.testing.assert_array_equal(a, b)